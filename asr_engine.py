@@ -0,0 +1,270 @@
+"""
+DashScope paraformer-v2 转录任务的异步轮询引擎
+- 所有在途任务由同一个调度协程统一管理，每一轮只对到期的任务取状态
+- SDK 的同步调用（async_call / fetch）全部放入有界线程池执行，不阻塞事件循环
+- 轮询间隔依据媒体时长自适应退避，替代固定 0.5s 的轮询
+- BatchingSubmitter 将短时间内到达的多个直链合并为一个多文件任务提交，再按 file_url 把子任务结果分发回各调用方
+"""
+import asyncio
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from os import getenv
+from typing import Dict, List, Optional
+
+TERMINAL_STATUS = ("SUCCEEDED", "FAILED")
+_executor: Optional[ThreadPoolExecutor] = None
+_pollers = weakref.WeakKeyDictionary()
+_submitters = weakref.WeakKeyDictionary()
+MAX_FILES_PER_JOB = 100   # paraformer-v2 单个任务 file_urls 的上限
+
+
+def _transcription():
+    """首次使用时才导入 dashscope SDK 并设置 API Key（导入耗时较长，纯文本流程不需要）。"""
+    import dashscope
+    from dashscope.audio.asr import Transcription
+    if not dashscope.api_key:
+        dashscope.api_key = getenv("DASH_SCOPE_API_KEY")
+    return Transcription
+
+
+def _get_executor(max_workers: int = 8) -> ThreadPoolExecutor:
+    """SDK 同步调用共用的线程池（与事件循环无关，进程内只创建一次）。"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asr-poll")
+    return _executor
+
+
+class _PendingTask:
+    """调度器内部记录的一个在途转录任务。"""
+
+    def __init__(self, task_id: str, future: asyncio.Future, duration: Optional[float], label: str):
+        self.task_id = task_id
+        self.future = future
+        self.duration = duration      # 媒体时长（秒），未知时为 None
+        self.label = label
+        self.submitted_at = time.monotonic()
+        self.next_poll = self.submitted_at
+        self.polls = 0
+        self.errors = 0
+
+
+class TranscriptionPoller:
+    """统一提交与轮询 DashScope 转录任务的调度器。
+
+    Args:
+        model: ASR 模型名
+        language_hints: 语言提示（仅 paraformer-v2 支持）
+        min_interval: 最短轮询间隔（秒）
+        max_interval: 最长轮询间隔（秒）
+        realtime_factor: 预估处理耗时 = 媒体时长 × realtime_factor，用于首轮等待
+        max_errors: 单个任务连续取状态异常的容忍次数
+    """
+
+    def __init__(self, model: str = "paraformer-v2", language_hints=("zh", "en"),
+                 min_interval: float = 1.0, max_interval: float = 20.0,
+                 realtime_factor: float = 0.1, max_errors: int = 5):
+        self.model = model
+        self.language_hints = list(language_hints)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.realtime_factor = realtime_factor
+        self.max_errors = max_errors
+        self._pending: Dict[str, _PendingTask] = {}
+        self._wakeup = asyncio.Event()
+        self._scheduler: Optional[asyncio.Task] = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def _clamp(self, seconds: float) -> float:
+        return max(self.min_interval, min(self.max_interval, seconds))
+
+    def _next_interval(self, task: _PendingTask, now: float) -> float:
+        """自适应退避：已知时长时先按预估耗时等待，超出预估后按轮询次数指数退避。"""
+        elapsed = now - task.submitted_at
+        if task.duration:
+            remaining = task.duration * self.realtime_factor - elapsed
+            if remaining > self.min_interval:
+                return self._clamp(remaining / 2)
+        return self._clamp(self.min_interval * (1.5 ** task.polls))
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+    async def transcribe(self, file_urls: List[str], duration: Optional[float] = None, label: str = ""):
+        """提交一个转录任务并等待其结束，返回最终的 TranscriptionResponse。"""
+        response = await self._call(
+            _transcription().async_call,
+            model=self.model,
+            file_urls=file_urls,
+            language_hints=self.language_hints,
+        )
+        if response.status_code != HTTPStatus.OK or response.output is None:
+            print(f"[{label}] 提交转录任务失败: {getattr(response, 'message', response)}", flush=True)
+            return response
+        if response.output.task_status in TERMINAL_STATUS:
+            return response
+
+        task = _PendingTask(response.output.task_id, asyncio.get_running_loop().create_future(), duration, label)
+        task.next_poll = task.submitted_at + self._next_interval(task, task.submitted_at)
+        self._pending[task.task_id] = task
+        print(f"[{label}] 已提交转录任务 {task.task_id}，当前在途任务数: {self.in_flight}", flush=True)
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return await task.future
+
+    async def _poll_one(self, task: _PendingTask):
+        try:
+            response = await self._call(_transcription().fetch, task=task.task_id)
+        except Exception as e:
+            task.errors += 1
+            print(f"[{task.label}] 查询转录状态异常({task.errors}/{self.max_errors}): {e}", flush=True)
+            if task.errors >= self.max_errors:
+                self._pending.pop(task.task_id, None)
+                if not task.future.done():
+                    task.future.set_exception(e)
+            return
+        task.errors = 0
+        task.polls += 1
+        status = response.output.task_status if response.output is not None else None
+        if status in TERMINAL_STATUS or response.status_code != HTTPStatus.OK:
+            self._pending.pop(task.task_id, None)
+            print(f"[{task.label}] 转录任务状态: {status}，共轮询 {task.polls} 次", flush=True)
+            if not task.future.done():
+                task.future.set_result(response)
+
+    async def _run(self):
+        """调度协程：只要还有在途任务就持续运行，每轮并发查询所有到期的任务。"""
+        while self._pending:
+            now = time.monotonic()
+            due = [t for t in self._pending.values() if t.next_poll <= now]
+            if due:
+                await asyncio.gather(*(self._poll_one(t) for t in due))
+                now = time.monotonic()
+                for t in due:
+                    if t.task_id in self._pending:
+                        t.next_poll = now + self._next_interval(t, now)
+            if not self._pending:
+                break
+            delay = min(t.next_poll for t in self._pending.values()) - time.monotonic()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+
+def get_transcription_poller() -> TranscriptionPoller:
+    """获取当前事件循环对应的轮询引擎（每个事件循环一个实例）。"""
+    loop = asyncio.get_running_loop()
+    poller = _pollers.get(loop)
+    if poller is None:
+        poller = TranscriptionPoller()
+        _pollers[loop] = poller
+    return poller
+
+
+class BatchingSubmitter:
+    """把并发到达的单条直链攒批为多文件转录任务。
+
+    攒满 max_batch_size 条立即提交，否则在第一条到达后等待 linger 秒提交；
+    每个任务结束后按子任务的 file_url 将结果分发回对应的调用方。
+
+    Args:
+        poller: 负责提交与轮询的 TranscriptionPoller
+        max_batch_size: 单个任务最多包含的文件数
+        linger: 攒批等待窗口（秒）
+        job_limiter: 可选，限制同时在途的任务数（如 asyncio.Semaphore）
+    """
+
+    def __init__(self, poller: TranscriptionPoller, max_batch_size: int = 20, linger: float = 0.5, job_limiter=None):
+        self.poller = poller
+        self.max_batch_size = max(1, min(max_batch_size, MAX_FILES_PER_JOB))
+        self.linger = linger
+        self.job_limiter = job_limiter
+        self._buffer = []          # [(url, future, duration)]
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches = 0
+        self._jobs = set()         # 持有提交协程的引用，避免被提前回收
+
+    async def transcribe(self, url: str, duration: Optional[float] = None) -> Optional[list]:
+        """提交单条直链，返回该直链对应的子任务结果列表，失败返回 None。"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._buffer.append((url, future, duration))
+        if len(self._buffer) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self.flush)
+        return await future
+
+    def flush(self):
+        """立即提交当前缓冲区中的全部直链。"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._buffer:
+            batch = self._buffer[:self.max_batch_size]
+            self._buffer = self._buffer[self.max_batch_size:]
+            job = asyncio.create_task(self._submit(batch))
+            self._jobs.add(job)
+            job.add_done_callback(self._jobs.discard)
+
+    async def _submit(self, batch: list):
+        self._batches += 1
+        label = f"batch_{self._batches}"
+        # 同一直链只提交一次，结果分发给所有等待者
+        file_urls = list(dict.fromkeys(url for url, _, _ in batch))
+        durations = [d for _, _, d in batch if d]
+        print(f"[{label}] 合并 {len(batch)} 条直链为一个转录任务（去重后 {len(file_urls)} 个文件）", flush=True)
+        try:
+            if self.job_limiter is not None:
+                async with self.job_limiter:
+                    response = await self.poller.transcribe(file_urls, duration=max(durations, default=None), label=label)
+            else:
+                response = await self.poller.transcribe(file_urls, duration=max(durations, default=None), label=label)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        grouped: Dict[str, list] = {}
+        if response.status_code == HTTPStatus.OK and response.output is not None:
+            results = response.output["results"] or []
+            for i, subtask in enumerate(results):
+                key = subtask.get("file_url")
+                if key not in file_urls and len(results) == len(file_urls):
+                    key = file_urls[i]   # 未回传 file_url 时按提交顺序对应
+                grouped.setdefault(key, []).append(subtask)
+        else:
+            print(f"[{label}] 转录任务失败: {response.output}", flush=True)
+        for url, future, _ in batch:
+            if not future.done():
+                future.set_result(grouped.get(url))
+
+
+def get_batching_submitter(job_limiter=None) -> BatchingSubmitter:
+    """获取当前事件循环对应的攒批提交器，批大小与等待窗口可由环境变量配置。
+
+    - V2T_ASR_BATCH_SIZE：单个任务最多包含的文件数（默认 20，上限 100）
+    - V2T_ASR_BATCH_LINGER：攒批等待窗口秒数（默认 0.5）
+    """
+    loop = asyncio.get_running_loop()
+    submitter = _submitters.get(loop)
+    if submitter is None:
+        submitter = BatchingSubmitter(
+            get_transcription_poller(),
+            max_batch_size=int(getenv("V2T_ASR_BATCH_SIZE", "20")),
+            linger=float(getenv("V2T_ASR_BATCH_LINGER", "0.5")),
+            job_limiter=job_limiter,
+        )
+        _submitters[loop] = submitter
+    return submitter
@@ -0,0 +1,168 @@
+"""
+Markdown → 飞书文档块 的单遍流式编译器（基于 markdown-it-py）
+- 整篇文本只解析一次，线性扫描 markdown-it 的 token 流；表格、代码块、跨空行的（松散）列表按语法结构整体识别，
+  不再按空行切段后逐段用正则判断、转换
+- markdown_to_blocks(text) 是生成器，按文档顺序逐个产出飞书块 dict，可直接交给上传器；块级结构一次解析完成，
+  行内解析推迟到产出每个块时进行，首个块无需等整篇行内解析完毕
+- 行内样式保留为多个 text_run：**粗体**、*斜体*、~~删除线~~、`行内代码`、[链接](url)，相同样式的相邻片段合并
+- 块映射：
+    标题        → heading2（# 与 ## 均为二级，与原上传器一致；### 及以下依次为 heading3~heading9）
+    段落        → 文本块（软换行保留为换行）
+    无序/有序列表 → bullet / ordered 块（嵌套列表按出现顺序平铺）
+    引用        → quote 块
+    代码块      → code 块（纯文本语言）
+    分隔线      → divider 块
+    表格        → 每行一个文本块，单元格之间以 " | " 分隔（保留单元格内的行内样式）
+"""
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote
+
+from markdown_it import MarkdownIt
+
+# 关闭 core 的 inline 规则：parse 只做块级解析，行内 token 在产出对应块时再按需解析
+_md = MarkdownIt("commonmark", {"html": False}).enable(["table", "strikethrough"]).disable("inline")
+
+BLOCK_TEXT = 2
+BLOCK_HEADING1 = 3          # heading1~heading9 依次为 3~11
+BLOCK_BULLET = 12
+BLOCK_ORDERED = 13
+BLOCK_CODE = 14
+BLOCK_QUOTE = 15
+BLOCK_DIVIDER = 22
+CODE_LANGUAGE_PLAIN = 1
+
+_STYLE_TOKENS = {"strong": "bold", "em": "italic", "s": "strikethrough"}
+
+
+def text_run(content: str, **style) -> dict:
+    return {"text_run": {"content": content, "text_element_style": style}}
+
+
+def _block(block_type: int, key: str, elements: List[dict], **extra) -> dict:
+    return {"block_type": block_type, key: {"style": {}, "elements": elements, **extra}}
+
+
+def text_block(content: str, bold: bool = False) -> dict:
+    return _block(BLOCK_TEXT, "text", [text_run(content, bold=bold)])
+
+
+def heading_block(level: int, content: str, bold: bool = True) -> dict:
+    """level 为飞书标题级别（1~9）。"""
+    level = min(9, max(1, level))
+    return _block(BLOCK_HEADING1 + level - 1, f"heading{level}", [text_run(content, bold=bold)])
+
+
+def _inline_elements(content: str, env: dict) -> List[dict]:
+    """解析一段行内 Markdown 并转为 text_run 列表，相同样式的相邻片段合并。"""
+    children = []
+    _md.inline.parse(content, _md, env, children)
+    elements: List[dict] = []
+    active: Dict[str, bool] = {}
+    link: Optional[str] = None
+
+    def emit(content: str, **extra):
+        if not content:
+            return
+        style = {**active, **extra}
+        if link:
+            style["link"] = {"url": quote(link, safe="")}
+        if elements and elements[-1]["text_run"]["text_element_style"] == style:
+            elements[-1]["text_run"]["content"] += content
+        else:
+            elements.append(text_run(content, **style))
+
+    for token in children:
+        kind = token.type
+        if kind in ("text", "text_special", "html_inline"):
+            emit(token.content)
+        elif kind in ("softbreak", "hardbreak"):
+            emit("\n")
+        elif kind == "code_inline":
+            emit(token.content, inline_code=True)
+        elif kind.endswith("_open") and kind[:-5] in _STYLE_TOKENS:
+            active[_STYLE_TOKENS[kind[:-5]]] = True
+        elif kind.endswith("_close") and kind[:-6] in _STYLE_TOKENS:
+            active.pop(_STYLE_TOKENS[kind[:-6]], None)
+        elif kind == "link_open":
+            link = token.attrGet("href")
+        elif kind == "link_close":
+            link = None
+        elif kind == "image":
+            emit(token.content or token.attrGet("src") or "")
+    return elements
+
+
+def _table_row_block(cells: List[List[dict]]) -> Optional[dict]:
+    elements: List[dict] = []
+    for i, cell in enumerate(cells):
+        if i:
+            elements.append(text_run(" | "))
+        elements.extend(cell)
+    return _block(BLOCK_TEXT, "text", elements) if elements else None
+
+
+def markdown_to_blocks(text: str) -> Iterator[dict]:
+    """单遍把整篇 Markdown 编译为飞书块，按文档顺序逐个产出。"""
+    if not text or not text.strip():
+        return
+    lists: List[int] = []          # 当前所在列表的块类型栈（bullet/ordered）
+    item_first: List[bool] = []    # 各层列表项是否还未输出首段
+    quote_depth = 0
+    heading_level: Optional[int] = None
+    row: Optional[List[List[dict]]] = None
+    env: dict = {}                 # 块级解析收集的链接引用定义，行内解析时使用
+
+    for token in _md.parse(text, env):
+        kind = token.type
+        if kind == "heading_open":
+            heading_level = max(2, int(token.tag[1:]))
+        elif kind == "heading_close":
+            heading_level = None
+        elif kind in ("bullet_list_open", "ordered_list_open"):
+            lists.append(BLOCK_BULLET if kind == "bullet_list_open" else BLOCK_ORDERED)
+        elif kind in ("bullet_list_close", "ordered_list_close"):
+            lists.pop()
+        elif kind == "list_item_open":
+            item_first.append(True)
+        elif kind == "list_item_close":
+            item_first.pop()
+        elif kind == "blockquote_open":
+            quote_depth += 1
+        elif kind == "blockquote_close":
+            quote_depth -= 1
+        elif kind == "tr_open":
+            row = []
+        elif kind == "tr_close":
+            block = _table_row_block(row or [])
+            row = None
+            if block is not None:
+                yield block
+        elif kind == "inline":
+            elements = _inline_elements(token.content, env)
+            if row is not None:
+                row.append(elements)
+                continue
+            if not elements:
+                continue
+            if heading_level is not None:
+                for element in elements:
+                    element["text_run"]["text_element_style"].setdefault("bold", True)
+                yield _block(BLOCK_HEADING1 + heading_level - 1, f"heading{heading_level}", elements)
+            elif item_first and item_first[-1]:
+                item_first[-1] = False
+                block_type = lists[-1]
+                yield _block(block_type, "bullet" if block_type == BLOCK_BULLET else "ordered", elements)
+            elif quote_depth:
+                yield _block(BLOCK_QUOTE, "quote", elements)
+            else:
+                yield _block(BLOCK_TEXT, "text", elements)
+        elif kind in ("fence", "code_block"):
+            content = token.content.rstrip("\n")
+            if content:
+                yield _block(BLOCK_CODE, "code", [text_run(content)], style={"language": CODE_LANGUAGE_PLAIN})
+        elif kind == "hr":
+            yield {"block_type": BLOCK_DIVIDER, "divider": {}}
+        elif kind == "html_block":
+            content = token.content.strip()
+            if content:
+                yield text_block(content)
@@ -0,0 +1,332 @@
+"""
+飞书上传发件箱（outbox）：仿写图在本地保存后只把上传任务写入持久队列即结束，飞书写入由后台 worker 完成
+- FeishuOutbox：SQLite 队列（默认 result/feishu_outbox.sqlite，可用 MAS_FEISHU_OUTBOX_DB 修改），每条记录保存上传
+  所需的全部内容（原文、各角色正文、文件夹、增量同步运行名）及状态 pending → running → done / failed；
+  不保存 app_secret，worker 使用本进程配置的凭据，只领取同一 app_id 的任务
+- 领取任务时加租约（MAS_FEISHU_OUTBOX_LEASE 秒，默认 600）：进程在上传中途退出后，租约过期的记录由任意 worker
+  重新领取；命令行与仿写服务同时运行、共用一个队列时也不会重复上传同一条记录
+- 上传前先创建文档并把文档 ID 记入续传进度，失败（含进程退出）后重试都在同一篇文档上从最后确认写入的块之后继续；
+  失败按指数退避（MAS_FEISHU_OUTBOX_RETRY_BASE 秒起，默认 30，最长 1 小时）重试，最多 MAS_FEISHU_OUTBOX_MAX_ATTEMPTS 次（默认 8）
+- OutboxWorker 以 MAS_FEISHU_OUTBOX_CONCURRENCY（默认 2）个并发上传排空队列，请求速率仍受 "feishu" 限流器约束；
+  仿写主程序与仿写服务启动时在后台运行 worker，上次运行遗留的任务也会一并上传
+
+单独排空队列（如进程退出后补传）：
+    python feishu_outbox.py
+    python feishu_outbox.py --retry-failed
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from os import getenv
+from typing import Dict, List, Optional
+
+OUTBOX_DB = getenv("MAS_FEISHU_OUTBOX_DB") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "result", "feishu_outbox.sqlite")
+OUTBOX_CONCURRENCY = int(getenv("MAS_FEISHU_OUTBOX_CONCURRENCY", "2"))
+OUTBOX_MAX_ATTEMPTS = int(getenv("MAS_FEISHU_OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_LEASE = float(getenv("MAS_FEISHU_OUTBOX_LEASE", "600"))
+OUTBOX_POLL = float(getenv("MAS_FEISHU_OUTBOX_POLL", "2"))
+OUTBOX_RETRY_BASE = float(getenv("MAS_FEISHU_OUTBOX_RETRY_BASE", "30"))
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _backoff(attempts: int) -> float:
+    return min(3600.0, OUTBOX_RETRY_BASE * 2 ** max(0, attempts - 1))
+
+
+class FeishuOutbox:
+    """上传任务的持久队列，可被多个线程/进程同时使用。"""
+
+    def __init__(self, path: str = OUTBOX_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS uploads (
+                id TEXT PRIMARY KEY, app_id TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL, lease_until REAL NOT NULL DEFAULT 0,
+                progress TEXT, document_id TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_due ON uploads (app_id, status, next_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            conn = self._connect()
+            rowcount = conn.execute(sql, params).rowcount
+            conn.commit()
+        return rowcount
+
+    def enqueue(self, app_id: str, payload: Dict, key: Optional[str] = None) -> str:
+        """写入一条上传任务；key 相同的任务只保留第一条（同一次运行的保存节点重放时不会重复上传）。"""
+        key = key or uuid.uuid4().hex
+        now = time.time()
+        self._execute("INSERT OR IGNORE INTO uploads (id, app_id, payload, status, next_at, created_at, updated_at) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (key, app_id, json.dumps(payload, ensure_ascii=False), STATUS_PENDING, now, now, now))
+        return key
+
+    def claim(self, app_id: str, limit: int, lease: float = OUTBOX_LEASE) -> List[Dict]:
+        """领取最多 limit 条到期的任务（含租约已过期的 running 任务）并加租约。"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        due = "app_id=? AND ((status=? AND next_at<=?) OR (status=? AND lease_until<=?))"
+        params = (app_id, STATUS_PENDING, now, STATUS_RUNNING, now)
+        claimed = []
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(f"SELECT id, payload, progress, attempts FROM uploads WHERE {due} "
+                                "ORDER BY created_at LIMIT ?", params + (limit,)).fetchall()
+            for key, payload, progress, attempts in rows:
+                # 条件更新：其他进程先领取了同一条时 rowcount 为 0
+                if conn.execute(f"UPDATE uploads SET status=?, lease_until=?, attempts=attempts+1, updated_at=? "
+                                f"WHERE id=? AND {due}",
+                                (STATUS_RUNNING, now + lease, now, key) + params).rowcount:
+                    claimed.append({"id": key, "payload": json.loads(payload),
+                                    "progress": json.loads(progress) if progress else None, "attempts": attempts + 1})
+            conn.commit()
+        return claimed
+
+    def renew(self, keys: List[str], lease: float = OUTBOX_LEASE):
+        """延长仍在上传的任务的租约，避免长时间的上传被其他 worker 当作已中断而重复领取。"""
+        if keys:
+            self._execute(f"UPDATE uploads SET lease_until=? WHERE status=? AND id IN ({','.join('?' * len(keys))})",
+                          (time.time() + lease, STATUS_RUNNING, *keys))
+
+    def save_progress(self, key: str, progress: Optional[Dict]):
+        self._execute("UPDATE uploads SET progress=?, updated_at=? WHERE id=?",
+                      (json.dumps(progress) if progress else None, time.time(), key))
+
+    def complete(self, key: str, document_id: Optional[str]):
+        self._execute("UPDATE uploads SET status=?, document_id=?, error=NULL, updated_at=? WHERE id=?",
+                      (STATUS_DONE, document_id, time.time(), key))
+
+    def fail(self, key: str, error: str, attempts: int, max_attempts: int = OUTBOX_MAX_ATTEMPTS) -> bool:
+        """记录一次失败：未达上限时按退避时间重新排队并返回 True，否则标记为 failed。"""
+        retry = attempts < max_attempts
+        now = time.time()
+        self._execute("UPDATE uploads SET status=?, error=?, next_at=?, lease_until=0, updated_at=? WHERE id=?",
+                      (STATUS_PENDING if retry else STATUS_FAILED, error[:2000], now + _backoff(attempts), now, key))
+        return retry
+
+    def release(self, key: str):
+        """worker 被停止时交还正在上传的任务：立即可被重新领取，本次不计入尝试次数。"""
+        now = time.time()
+        self._execute("UPDATE uploads SET status=?, attempts=MAX(0, attempts-1), next_at=?, lease_until=0, updated_at=? "
+                      "WHERE id=? AND status=?", (STATUS_PENDING, now, now, key, STATUS_RUNNING))
+
+    def retry_failed(self, app_id: Optional[str] = None) -> int:
+        """把已放弃的任务重新排队（尝试次数清零）。"""
+        now = time.time()
+        sql = "UPDATE uploads SET status=?, attempts=0, next_at=?, updated_at=? WHERE status=?"
+        params = (STATUS_PENDING, now, now, STATUS_FAILED)
+        if app_id:
+            sql, params = sql + " AND app_id=?", params + (app_id,)
+        return self._execute(sql, params)
+
+    def due_count(self, app_id: str) -> int:
+        """当前即可领取的任务数（不含等待退避的任务）。"""
+        now = time.time()
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM uploads WHERE app_id=? AND ((status=? AND next_at<=?) OR (status=? AND lease_until<=?))",
+                (app_id, STATUS_PENDING, now, STATUS_RUNNING, now)).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM uploads GROUP BY status").fetchall()
+        return dict(rows)
+
+
+_outbox: Optional[FeishuOutbox] = None
+
+
+def get_outbox() -> FeishuOutbox:
+    """进程内共享的发件箱实例，按环境变量配置。"""
+    global _outbox
+    if _outbox is None:
+        _outbox = FeishuOutbox(OUTBOX_DB)
+    return _outbox
+
+
+class OutboxWorker:
+    """排空发件箱的后台 worker：并发上传、失败退避重试、停止时交还未完成的任务。
+
+    Args:
+        app_id / app_secret: 飞书应用凭据，只领取该 app_id 的任务
+        outbox: 发件箱，默认 get_outbox()
+        concurrency: 同时上传的任务数
+        max_attempts: 单条任务的最大尝试次数
+        base_url: 飞书接口地址，默认取 FEISHU_BASE_URL
+    """
+
+    def __init__(self, app_id: str, app_secret: str, outbox: Optional[FeishuOutbox] = None,
+                 concurrency: int = OUTBOX_CONCURRENCY, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 poll_interval: float = OUTBOX_POLL, lease: float = OUTBOX_LEASE, base_url: Optional[str] = None):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.outbox = outbox or get_outbox()
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.base_url = base_url
+        self.uploaded = 0
+        self.failed = 0
+        self._draining = False
+        self._task: Optional[asyncio.Task] = None
+
+    def auth(self):
+        """先以应用身份上传，令牌被拒或无权限时在同一篇文档上切换为用户身份（见 feishu_token.AuthChain）。"""
+        from feishu_token import AuthChain, TenantAuth, UserAuth, get_token_manager
+        tokens = get_token_manager(self.app_id, self.app_secret)
+        # 环境变量中的 user_access_token 只在首次出现时写入管理器，授权码只在需要用户身份时换取一次
+        tokens.seed_user_token(os.environ.get("FEISHU_USER_ACCESS_TOKEN", "").strip())
+        return AuthChain(TenantAuth(tokens), UserAuth(tokens, code=os.environ.get("FEISHU_CODE", "").strip()))
+
+    async def _upload(self, record: Dict) -> Dict:
+        from feishu_uploader import AsyncFeishuUploader, UploadProgress
+        payload = record["payload"]
+        uploader = AsyncFeishuUploader(self.auth(), base_url=self.base_url)
+        args = (payload["folder_token"], payload["theme"], payload["origin_article"], payload["roles"], payload["contents"])
+        if payload.get("sync_run"):
+            # 同步模式的文档 ID 与已写入的段记在 feishu_sync 的记录中，重试时从那里继续
+            from feishu_sync import sync_imitate_document
+            return await sync_imitate_document(uploader, payload["sync_run"], *args)
+        progress = record["progress"]
+        if not (progress and progress.get("document_id")):
+            # 先记下文档 ID：之后无论失败还是进程退出，重试都在这篇文档上续传而不是另建一篇
+            progress = UploadProgress(await uploader.create_document(payload["folder_token"], payload["theme"])).to_dict()
+            self.outbox.save_progress(record["id"], progress)
+            record["progress"] = progress
+
+        def on_progress(latest: Dict):
+            # 每个写请求确认后立即落盘：被取消或进程退出后重试只写尚未确认的块，不会重复写入
+            record["progress"] = latest
+            self.outbox.save_progress(record["id"], latest)
+
+        return await uploader.upload_imitate(*args, progress=progress, on_progress=on_progress)
+
+    async def _process(self, record: Dict):
+        try:
+            result = await self._upload(record)
+        except asyncio.CancelledError:
+            if record["progress"]:
+                self.outbox.save_progress(record["id"], record["progress"])
+            self.outbox.release(record["id"])
+            raise
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        if result.get("success"):
+            self.uploaded += 1
+            self.outbox.complete(record["id"], result.get("document_id"))
+            print(f"[outbox] 已上传至飞书: {record['payload']['theme']}（文档 {result.get('document_id')}）", flush=True)
+            return
+        if result.get("progress"):
+            self.outbox.save_progress(record["id"], result["progress"])
+        attempts = record["attempts"]
+        retry = self.outbox.fail(record["id"], result.get("error") or "unknown error", attempts, self.max_attempts)
+        if retry:
+            print(f"[outbox] 上传失败（第 {attempts} 次），{_backoff(attempts):.0f} 秒后重试: {result.get('error')}", flush=True)
+        else:
+            self.failed += 1
+            print(f"[outbox] 上传失败 {attempts} 次，已放弃（可用 python feishu_outbox.py --retry-failed 重新排队）: "
+                  f"{result.get('error')}", flush=True)
+            self._auth_hint()
+
+    def _auth_hint(self):
+        from feishu_token import get_auth_code_url, get_token_manager
+        if not get_token_manager(self.app_id, self.app_secret).has_user_token():
+            REDIRECT_URI = "https://open.feishu.cn/api-explorer/loading"
+            auth_url = get_auth_code_url(self.app_id, REDIRECT_URI, state="state123")
+            print(f"[AUTH] 如需以用户身份上传，请在浏览器打开以下链接完成授权，并在回调后获取 code：\n{auth_url}")
+            print("[AUTH] 完成后以环境变量 FEISHU_CODE=... 重新启动，或直接提供 FEISHU_USER_ACCESS_TOKEN。")
+
+    async def run(self, until_idle: bool = False):
+        """持续领取并上传任务；until_idle 为 True（或 stop 要求排空）时，没有可领取的任务且上传都结束后返回。"""
+        running: Dict[asyncio.Task, str] = {}
+        renewed_at = time.monotonic()
+        try:
+            while True:
+                if running and time.monotonic() - renewed_at > self.lease / 3:
+                    self.outbox.renew(list(running.values()), self.lease)
+                    renewed_at = time.monotonic()
+                for record in self.outbox.claim(self.app_id, self.concurrency - len(running), self.lease):
+                    task = asyncio.create_task(self._process(record))
+                    running[task] = record["id"]
+                    task.add_done_callback(lambda t: running.pop(t, None))
+                if not running and (until_idle or self._draining) and not self.outbox.due_count(self.app_id):
+                    return
+                if running:
+                    await asyncio.wait(list(running), timeout=min(self.poll_interval, self.lease / 3),
+                                       return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            for task in list(running):
+                task.cancel()
+            await asyncio.gather(*list(running), return_exceptions=True)
+
+    def start(self) -> "OutboxWorker":
+        """在当前事件循环中后台运行。"""
+        self._task = asyncio.create_task(self.run())
+        return self
+
+    async def stop(self, drain_timeout: float = 0):
+        """停止后台运行；drain_timeout > 0 时先等待队列中可立即上传的任务完成（最多等待该秒数）。
+
+        超时或被停止时正在上传的任务交还队列，下次启动（或 python feishu_outbox.py）时续传。
+        """
+        if self._task is None:
+            return
+        if drain_timeout > 0:
+            self._draining = True
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"[outbox] {drain_timeout:.0f} 秒内未上传完，剩余任务保留在队列中，下次启动时继续", flush=True)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+async def _main():
+    import argparse
+    from dotenv import load_dotenv
+    from feishu_uploader import aclose_http_client
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="排空飞书上传发件箱")
+    parser.add_argument("--retry-failed", action="store_true", help="先把已放弃的任务重新排队")
+    parser.add_argument("--concurrency", type=int, default=OUTBOX_CONCURRENCY)
+    args = parser.parse_args()
+    app_id, app_secret = getenv("FEISHU_APP_ID"), getenv("FEISHU_APP_SECRET")
+    if not (app_id and app_secret):
+        print("未配置 FEISHU_APP_ID / FEISHU_APP_SECRET")
+        return
+    outbox = get_outbox()
+    if args.retry_failed:
+        print(f"重新排队 {outbox.retry_failed(app_id)} 个已放弃的任务")
+    worker = OutboxWorker(app_id, app_secret, outbox, concurrency=args.concurrency)
+    try:
+        await worker.run(until_idle=True)
+    finally:
+        await aclose_http_client()
+    print(f"本次上传 {worker.uploaded} 个，放弃 {worker.failed} 个；队列状态: {outbox.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,281 @@
+"""
+飞书仿写文档的幂等增量同步
+- 同一篇原文（source：原文的 SHA-1）与同一个运行名（run）始终对应同一篇飞书文档；FeishuSyncStore 在本地 SQLite
+  中记录文档 ID 以及各段（原始文章、各角色）标题块与正文子块的 block_id 和内容哈希
+- 再次同步时按段比较哈希：内容未变的段不发请求；新增的段按位置插入（相邻的合并为一次创建嵌套块请求）；
+  已去掉的段整段删除（batch_delete）；内容变化的段只处理变化的子块——去掉首尾相同的子块后，中间部分若与旧块
+  一一对应且块类型、样式相同，用批量更新块（batch_update）改写文字，否则删除旧块并在原位置插入新块
+- 常见的“多加一个角色”“改了一段话”只需 1~2 个请求，不再每次新建文档并整篇重写
+- 新建文档后立即记下文档 ID，此后每个写请求成功后都更新记录：写入中途失败（含进程退出）时记录与文档实际内容
+  一致，下次同步（如发件箱重试）在同一篇文档上从已确认的位置继续，不会另建文档
+- 内容未变时不发任何请求（因此也不会察觉文档已被手动删除）；有变化而请求返回“不存在”、且再次查询确认文档已删除时
+  才丢弃记录并重新创建，网络、5xx 等临时错误不会丢弃记录
+
+环境变量：
+- MAS_FEISHU_SYNC_DB：同步记录数据库路径（默认 result/feishu_sync.sqlite）
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from os import getenv
+from typing import Dict, List, Optional, Tuple
+
+from feishu_uploader import AsyncFeishuUploader, FeishuAPIError, build_document_tree
+
+ORIGIN_SECTION = "原始文章"
+DOCUMENT_GONE_CODES = {1770002, 1770003}   # 文档/块不存在、已删除
+
+
+def _hash(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _payload(block: dict) -> Optional[dict]:
+    return next((v for v in block.values() if isinstance(v, dict) and "elements" in v), None)
+
+
+def _shape(block: dict) -> Optional[str]:
+    """除文字外的块结构（类型、样式）的哈希；没有文字内容的块（如分隔线）返回 None，只能整块替换。"""
+    payload = _payload(block)
+    if payload is None:
+        return None
+    return _hash({k: ({pk: pv for pk, pv in v.items() if pk != "elements"} if v is payload else v)
+                  for k, v in block.items()})
+
+
+def source_key(origin_article: str) -> str:
+    return hashlib.sha1(origin_article.strip().encode("utf-8")).hexdigest()
+
+
+class FeishuSyncStore:
+    """(source, run) → 飞书文档 ID 与各段记录；path 为 None 时不保存任何记录。"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS feishu_docs (
+                source TEXT NOT NULL, run TEXT NOT NULL, document_id TEXT NOT NULL, sections TEXT NOT NULL,
+                updated_at REAL NOT NULL, PRIMARY KEY (source, run))""")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, source: str, run: str) -> Optional[Tuple[str, List[Dict]]]:
+        if self.path is None:
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT document_id, sections FROM feishu_docs WHERE source=? AND run=?", (source, run)).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def put(self, source: str, run: str, document_id: str, sections: List[Dict]):
+        if self.path is None:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO feishu_docs (source, run, document_id, sections, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (source, run, document_id, json.dumps(sections, ensure_ascii=False), time.time()))
+            conn.commit()
+
+    def forget(self, source: str, run: str):
+        if self.path is None:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM feishu_docs WHERE source=? AND run=?", (source, run))
+            conn.commit()
+
+
+_store: Optional[FeishuSyncStore] = None
+
+
+def get_sync_store() -> FeishuSyncStore:
+    """进程内共享的同步记录，按环境变量配置。"""
+    global _store
+    if _store is None:
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result", "feishu_sync.sqlite")
+        _store = FeishuSyncStore(getenv("MAS_FEISHU_SYNC_DB") or default_path)
+    return _store
+
+
+def _child_records(children: List[dict], block_ids: List[str]) -> List[Dict]:
+    return [{"hash": _hash(c), "shape": _shape(c), "block_id": b} for c, b in zip(children, block_ids)]
+
+
+def _section_record(key: str, node: Tuple[dict, List[dict]], created: Tuple[str, List[str]]) -> Dict:
+    """已创建的段的记录；子块只创建了一部分（中途失败）时哈希留空，下次同步补齐缺少的子块。"""
+    heading, children = node
+    block_id, child_ids = created
+    return {"key": key, "hash": _hash(node) if len(child_ids) == len(children) else "",
+            "heading_hash": _hash(heading), "block_id": block_id,
+            "children": _child_records(children[:len(child_ids)], child_ids)}
+
+
+async def _patch_section(uploader: AsyncFeishuUploader, document_id: str, current: List[Dict], i: int,
+                         key: str, node: Tuple[dict, List[dict]], save):
+    """只改写第 i 段中变化的子块；每个请求成功后更新 current[i] 并保存，中途失败时记录与文档一致。"""
+    heading, children = node
+    old = current[i]
+    old_children = old["children"]
+    hashes = [_hash(c) for c in children]
+    prefix = 0
+    while prefix < min(len(old_children), len(children)) and old_children[prefix]["hash"] == hashes[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(old_children), len(children)) - prefix
+           and old_children[-1 - suffix]["hash"] == hashes[-1 - suffix]):
+        suffix += 1
+    old_mid = old_children[prefix:len(old_children) - suffix]
+    new_mid = children[prefix:len(children) - suffix]
+    head, tail = old_children[:prefix], old_children[len(old_children) - suffix:]
+
+    updates = []
+    if _hash(heading) != old["heading_hash"]:
+        updates.append((old["block_id"], _payload(heading)["elements"]))
+    in_place = len(old_mid) == len(new_mid) and all(
+        o["shape"] is not None and o["shape"] == _shape(n) for o, n in zip(old_mid, new_mid))
+    if in_place:
+        updates.extend((o["block_id"], _payload(n)["elements"]) for o, n in zip(old_mid, new_mid))
+        await uploader.update_text_elements(document_id, updates)
+        mid = _child_records(new_mid, [o["block_id"] for o in old_mid])
+    else:
+        if updates:
+            await uploader.update_text_elements(document_id, updates)
+            current[i] = {**old, "hash": "", "heading_hash": _hash(heading)}
+            save()
+        if old_mid:
+            await uploader.delete_children(document_id, old["block_id"], prefix, prefix + len(old_mid))
+            current[i] = {**current[i], "hash": "", "children": head + tail}
+            save()
+        created: List[Tuple[str, List[str]]] = []
+        try:
+            if new_mid:
+                await uploader.create_descendants(document_id, old["block_id"], [(c, []) for c in new_mid],
+                                                  index=prefix, created=created)
+        finally:
+            mid = _child_records(new_mid, [block_id for block_id, _ in created])
+            if len(mid) < len(new_mid):
+                current[i] = {**current[i], "hash": "", "children": head + mid + tail}
+                save()
+    current[i] = {"key": key, "hash": _hash(node), "heading_hash": _hash(heading), "block_id": old["block_id"],
+                  "children": head + mid + tail}
+    save()
+
+
+async def _patch_document(uploader: AsyncFeishuUploader, document_id: str, current: List[Dict],
+                          wanted: List[Tuple[str, Tuple[dict, List[dict]]]], save):
+    """把文档从记录的段 current 就地改为 wanted [(段名, 块树)]；每个请求成功后调用 save() 保存记录，
+    中途失败时已保存的记录与文档实际内容一致，下次同步从那里继续。"""
+    wanted_keys = [key for key, _ in wanted]
+    # 删除不再存在的段：从后往前，相邻的合并为一次请求
+    i = len(current) - 1
+    while i >= 0:
+        if current[i]["key"] in wanted_keys:
+            i -= 1
+            continue
+        end = i + 1
+        while i >= 0 and current[i]["key"] not in wanted_keys:
+            i -= 1
+        await uploader.delete_children(document_id, document_id, i + 1, end)
+        del current[i + 1:end]
+        save()
+    # 保留段的先后顺序变了（如角色顺序调整）时无法原地修补，清空后整篇重写
+    kept = {s["key"] for s in current}
+    if [s["key"] for s in current] != [key for key in wanted_keys if key in kept]:
+        await uploader.delete_children(document_id, document_id, 0, len(current))
+        current.clear()
+        kept = set()
+        save()
+    # 按新顺序逐段：已有的段比较哈希后修补，连续的新段在对应位置一次插入
+    i = 0
+    while i < len(wanted):
+        key, node = wanted[i]
+        if i < len(current) and current[i]["key"] == key:
+            if current[i]["hash"] != _hash(node):
+                await _patch_section(uploader, document_id, current, i, key, node, save)
+            i += 1
+            continue
+        j = i
+        while j < len(wanted) and wanted[j][0] not in kept:
+            j += 1
+        created: List[Tuple[str, List[str]]] = []
+        try:
+            await uploader.create_descendants(document_id, document_id, [n for _, n in wanted[i:j]],
+                                              index=i, created=created)
+        finally:
+            current[i:i] = [_section_record(k, n, c) for (k, n), c in zip(wanted[i:j], created)]
+            kept.update(k for k, _ in wanted[i:i + len(created)])
+            if created:
+                save()
+        i = j
+
+
+async def _document_gone(uploader: AsyncFeishuUploader, document_id: str) -> bool:
+    """确认文档是否已不存在（已删除）；其他错误（网络、5xx、无权限等）不视为文档不存在。"""
+    try:
+        await uploader.request("GET", f"/docx/v1/documents/{document_id}")
+    except FeishuAPIError as e:
+        return e.status == 404 or e.code in DOCUMENT_GONE_CODES
+    return False
+
+
+async def sync_imitate_document(uploader: AsyncFeishuUploader, run: str, folder_token: str, theme: str,
+                                origin_article: str, roles: List[str], imitate_contents: List[str],
+                                store: Optional[FeishuSyncStore] = None) -> Dict:
+    """把仿写结果同步到 (原文, run) 对应的飞书文档：首次创建，之后只修补变化的段与块。
+
+    返回值与 AsyncFeishuUploader.upload_imitate 相同，另含 mode（created / patched / unchanged）与本次请求数。
+    """
+    store = store or get_sync_store()
+    source = source_key(origin_article)
+    sections = build_document_tree(origin_article, roles, imitate_contents)
+    keys = [ORIGIN_SECTION] + [role.strip() for role in roles[:len(sections) - 1]]
+    wanted = list(zip(keys, sections))
+    record = store.get(source, run)
+    before = uploader.requests
+    document_id, current, mode = None, [], "patched"
+
+    def save():
+        store.put(source, run, document_id, current)
+
+    async def create():
+        nonlocal document_id, current, mode
+        # 先记下文档 ID：之后写入失败时重试都在这篇文档上按记录继续，不再另建文档
+        document_id, current, mode = await uploader.create_document(folder_token, theme), [], "created"
+        save()
+
+    try:
+        if record is None:
+            await create()
+        else:
+            document_id, current = record
+        try:
+            await _patch_document(uploader, document_id, current, wanted, save)
+        except FeishuAPIError as e:
+            # 只有确认文档已被删除时才丢弃记录重建；网络、5xx 等临时错误保留记录，下次从已确认的位置继续
+            if mode == "created" or (e.status != 404 and e.code not in DOCUMENT_GONE_CODES) \
+                    or not await _document_gone(uploader, document_id):
+                raise
+            print(f"飞书文档 {document_id} 已不存在，重新创建", flush=True)
+            store.forget(source, run)
+            await create()
+            await _patch_document(uploader, document_id, current, wanted, save)
+    except Exception as e:
+        print(f"飞书同步异常: {e}", flush=True)
+        return {"success": False, "document_id": document_id, "error": str(e)}
+    if mode == "patched" and uploader.requests == before:
+        mode = "unchanged"
+    requests = uploader.requests - before
+    print(f"飞书同步完成（{uploader.auth.name}，{mode}）：文档 {document_id}，{requests} 次请求", flush=True)
+    return {"success": True, "document_id": document_id, "title": theme, "auth": uploader.auth.name,
+            "mode": mode, "requests": requests, "message": "仿写文档同步成功"}
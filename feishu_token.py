@@ -0,0 +1,375 @@
+"""
+飞书访问令牌管理
+- 每个应用（app_id）共享一个 TokenManager（get_token_manager），缓存 tenant_access_token 与 user_access_token
+  及其过期时间；上传时直接取缓存，不再每次上传都新建 lark.Client 请求一次令牌
+- 后台定时器在过期前 MAS_FEISHU_TOKEN_REFRESH_MARGIN 秒（默认 1500；飞书在剩余有效期不足 30 分钟时才签发新令牌）
+  主动刷新，刷新失败 30 秒后重试，期间旧令牌仍可使用；上传路径上既不等待令牌请求，也不会先失败一次再刷新
+- 并发刷新去重：同一令牌同一时刻只有一个刷新请求，其余调用方在锁内复查缓存后直接复用结果；
+  异步接口（atenant_token / auser_token）命中缓存时不切换线程
+- user_access_token 由调用方提供（环境变量或授权码换取的结果）：带 refresh_token 与有效期时同样提前刷新；
+  只有 access_token 时视为长期有效，鉴权失败后只能 force_refresh（无 refresh_token 时抛出 FeishuTokenError）
+- 鉴权策略（供 feishu_uploader.AsyncFeishuUploader 使用）：StaticAuth 固定令牌、TenantAuth、UserAuth，
+  AuthChain 按顺序组合多个策略——当前令牌被拒时先强制刷新一次，仍被拒或无法刷新时切换到下一个策略，
+  上传在同一篇文档上从失败的请求处继续
+- 用户授权（OAuth）相关的辅助函数：get_auth_code_url、get_user_access_token、refresh_user_access_token
+"""
+import asyncio
+import base64
+import threading
+import time
+import urllib.parse
+from os import getenv
+from typing import Dict, Optional, Set, Tuple, Union
+
+import requests
+
+FEISHU_AUTH_BASE_URL = getenv("FEISHU_BASE_URL", "https://open.feishu.cn/open-apis")
+REFRESH_MARGIN = float(getenv("MAS_FEISHU_TOKEN_REFRESH_MARGIN", "1500"))
+MIN_VALID_SECONDS = 60.0       # 剩余有效期不足该值的缓存令牌视为过期，调用方同步刷新
+RETRY_DELAY = 30.0             # 后台刷新失败后的重试间隔，也是两次后台刷新的最小间隔
+
+
+class FeishuTokenError(RuntimeError):
+    pass
+
+
+class _Token:
+    __slots__ = ("value", "expire_at", "refresh_token")
+
+    def __init__(self, value: str, expire_at: Optional[float] = None, refresh_token: str = ""):
+        self.value = value
+        self.expire_at = expire_at
+        self.refresh_token = refresh_token
+
+    def valid(self, now: float) -> bool:
+        return bool(self.value) and (self.expire_at is None or self.expire_at - now > MIN_VALID_SECONDS)
+
+
+class TokenManager:
+    """单个飞书应用的令牌缓存与后台刷新。
+
+    Args:
+        app_id: 飞书应用的 AppID
+        app_secret: 飞书应用的 AppSecret
+        base_url: 开放平台接口地址，默认取 FEISHU_BASE_URL
+        refresh_margin: 距过期多少秒时后台刷新
+    """
+
+    def __init__(self, app_id: str, app_secret: str, base_url: Optional[str] = None,
+                 refresh_margin: float = REFRESH_MARGIN):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = (base_url or FEISHU_AUTH_BASE_URL).rstrip("/")
+        self.refresh_margin = refresh_margin
+        self.fetches = 0               # 实际发出的令牌请求数
+        self._tokens: Dict[str, _Token] = {}
+        self._locks = {"tenant": threading.Lock(), "user": threading.Lock()}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._seen_user_tokens: Set[str] = set()
+        self._closed = False
+
+    # ---- 同步接口（requests 上传器与线程中使用） ----
+    def tenant_token(self, force_refresh: bool = False) -> str:
+        return self._get("tenant", force_refresh)
+
+    def user_token(self, force_refresh: bool = False) -> str:
+        return self._get("user", force_refresh)
+
+    def has_user_token(self) -> bool:
+        return "user" in self._tokens
+
+    def seed_user_token(self, access_token: str, refresh_token: str = "", expires_in: Optional[float] = None):
+        """用外部提供的 user_access_token 初始化缓存。
+
+        同一个令牌重复传入（如每次上传都读取同一环境变量）时忽略，不会覆盖由它刷新得到的新令牌。
+        """
+        if not access_token or access_token in self._seen_user_tokens:
+            return
+        expire_at = time.time() + float(expires_in) if expires_in else None
+        with self._locks["user"]:
+            self._store("user", _Token(access_token, expire_at, refresh_token))
+
+    def seed_user_token_data(self, data: dict):
+        """用授权码换取/刷新接口返回的 data（access_token、refresh_token、expires_in）初始化缓存。"""
+        self.seed_user_token(data.get("access_token", ""), data.get("refresh_token", ""),
+                             data.get("expires_in") or data.get("expire"))
+
+    # ---- 异步接口（命中缓存时直接返回） ----
+    async def atenant_token(self, force_refresh: bool = False) -> str:
+        token = self._tokens.get("tenant")
+        if not force_refresh and token is not None and token.valid(time.time()):
+            return token.value
+        return await asyncio.to_thread(self.tenant_token, force_refresh)
+
+    async def auser_token(self, force_refresh: bool = False) -> str:
+        token = self._tokens.get("user")
+        if not force_refresh and token is not None and token.valid(time.time()):
+            return token.value
+        return await asyncio.to_thread(self.user_token, force_refresh)
+
+    def close(self):
+        """取消后台刷新定时器。"""
+        self._closed = True
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    # ---- 内部实现 ----
+    def _get(self, kind: str, force_refresh: bool) -> str:
+        seen = self._tokens.get(kind)
+        if not force_refresh and seen is not None and seen.valid(time.time()):
+            return seen.value
+        with self._locks[kind]:
+            current = self._tokens.get(kind)
+            # 等锁期间其他调用方已经刷新过：非强制时缓存有效即可，强制刷新时只要令牌已更换也直接复用
+            if current is not None and current.valid(time.time()) and (not force_refresh or current is not seen):
+                return current.value
+            return self._refresh_locked(kind).value
+
+    def _refresh_locked(self, kind: str) -> _Token:
+        now = time.time()
+        if kind == "tenant":
+            body = self._post("/auth/v3/tenant_access_token/internal",
+                              {"app_id": self.app_id, "app_secret": self.app_secret})
+            token = _Token(body.get("tenant_access_token", ""), now + float(body.get("expire", 7200)))
+        else:
+            current = self._tokens.get("user")
+            if current is None or not current.refresh_token:
+                raise FeishuTokenError("user_access_token 已失效且没有 refresh_token，需要重新授权")
+            data = self._post("/authen/v1/refresh_access_token",
+                              {"grant_type": "refresh_token", "refresh_token": current.refresh_token,
+                               "client_id": self.app_id, "client_secret": self.app_secret}).get("data", {})
+            expires_in = data.get("expires_in") or data.get("expire")
+            token = _Token(data.get("access_token", ""), now + float(expires_in) if expires_in else None,
+                           data.get("refresh_token") or current.refresh_token)
+        if not token.value:
+            raise FeishuTokenError(f"获取 {kind} access_token 失败：响应中没有令牌")
+        self._store(kind, token)
+        return token
+
+    def _post(self, path: str, payload: dict) -> dict:
+        self.fetches += 1
+        resp = requests.post(self.base_url + path, json=payload, timeout=10)
+        if resp.status_code != 200:
+            raise FeishuTokenError(f"请求 {path} HTTP 失败: {resp.status_code}, {resp.text[:200]}")
+        body = resp.json()
+        if body.get("code") != 0:
+            raise FeishuTokenError(f"请求 {path} 失败: {body}")
+        return body
+
+    def _store(self, kind: str, token: _Token):
+        self._tokens[kind] = token
+        if kind == "user":
+            self._seen_user_tokens.add(token.value)
+        self._schedule(kind, token, None)
+
+    def _schedule(self, kind: str, token: _Token, delay: Optional[float]):
+        old = self._timers.pop(kind, None)
+        if old is not None:
+            old.cancel()
+        if self._closed or token.expire_at is None or (kind == "user" and not token.refresh_token):
+            return
+        if delay is None:
+            delay = max(RETRY_DELAY, token.expire_at - self.refresh_margin - time.time())
+        timer = threading.Timer(delay, self._background_refresh, args=(kind, token))
+        timer.daemon = True
+        self._timers[kind] = timer
+        timer.start()
+
+    def _background_refresh(self, kind: str, token: _Token):
+        with self._locks[kind]:
+            if self._closed or self._tokens.get(kind) is not token:
+                return   # 已被其他调用方刷新
+            try:
+                self._refresh_locked(kind)
+            except Exception as e:
+                print(f"飞书 {kind} 令牌后台刷新失败，{RETRY_DELAY:.0f}s 后重试: {e}", flush=True)
+                if token.valid(time.time()):
+                    self._schedule(kind, token, RETRY_DELAY)
+
+
+_managers: Dict[Tuple[str, str], TokenManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(app_id: str, app_secret: str) -> TokenManager:
+    """按应用共享的令牌管理器。"""
+    key = (app_id or "", app_secret or "")
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = TokenManager(*key)
+        return manager
+
+
+class StaticAuth:
+    """固定令牌，不可刷新（调用方直接给出 access_token 时使用）。"""
+
+    def __init__(self, access_token: str, name: str = "static"):
+        self.access_token = access_token
+        self.name = name
+
+    async def token(self) -> str:
+        if not self.access_token:
+            raise FeishuTokenError(f"{self.name}: 没有可用的 access_token")
+        return self.access_token
+
+    async def refresh(self) -> str:
+        raise FeishuTokenError(f"{self.name}: 令牌被拒绝且无法刷新")
+
+
+class TenantAuth:
+    """以应用身份（tenant_access_token）访问。"""
+
+    name = "tenant"
+
+    def __init__(self, tokens: TokenManager):
+        self.tokens = tokens
+
+    async def token(self) -> str:
+        return await self.tokens.atenant_token()
+
+    async def refresh(self) -> str:
+        return await self.tokens.atenant_token(force_refresh=True)
+
+
+class UserAuth:
+    """以用户身份（user_access_token）访问。
+
+    Args:
+        tokens: 令牌管理器，已持有 user_access_token 时直接使用
+        code: 可选的授权码，管理器中没有用户令牌时才换取一次（授权码只能使用一次）
+    """
+
+    name = "user"
+
+    def __init__(self, tokens: TokenManager, code: str = ""):
+        self.tokens = tokens
+        self.code = code
+
+    async def token(self) -> str:
+        if not self.tokens.has_user_token() and self.code:
+            code, self.code = self.code, ""
+            data = await asyncio.to_thread(get_user_access_token, self.tokens.app_id, self.tokens.app_secret, code)
+            self.tokens.seed_user_token_data(data)
+        if not self.tokens.has_user_token():
+            raise FeishuTokenError("缺少 user_access_token/FEISHU_CODE")
+        return await self.tokens.auser_token()
+
+    async def refresh(self) -> str:
+        return await self.tokens.auser_token(force_refresh=True)
+
+
+AuthStrategy = Union[StaticAuth, TenantAuth, UserAuth]
+
+
+class AuthChain:
+    """按顺序尝试的鉴权策略组合。
+
+    当前策略取不到令牌、或令牌被拒后强制刷新一次仍被拒时，切换到下一个策略；全部用尽时抛出 FeishuTokenError。
+    “刷新一次”按次计：刷新后的令牌被接受（accepted）后，下一次过期仍可再刷新。
+    """
+
+    def __init__(self, *strategies: AuthStrategy):
+        if not strategies:
+            raise ValueError("AuthChain 至少需要一个鉴权策略")
+        self.strategies = list(strategies)
+        self._index = 0
+        self._refreshed = False
+        self.errors = []
+
+    @property
+    def name(self) -> str:
+        return self.strategies[self._index].name
+
+    def _advance(self, error: Exception):
+        self.errors.append(f"{self.name}: {error}")
+        if self._index + 1 >= len(self.strategies):
+            raise FeishuTokenError("所有鉴权方式均失败：" + "；".join(self.errors)) from error
+        self._index += 1
+        self._refreshed = False
+        print(f"飞书鉴权切换为 {self.name}（{error}）", flush=True)
+
+    async def token(self) -> str:
+        while True:
+            try:
+                return await self.strategies[self._index].token()
+            except Exception as e:
+                self._advance(e)
+
+    async def refresh(self) -> str:
+        """当前令牌被服务端拒绝时调用，返回下一次请求使用的令牌。"""
+        if not self._refreshed:
+            self._refreshed = True
+            try:
+                return await self.strategies[self._index].refresh()
+            except Exception as e:
+                self._advance(e)
+        else:
+            self._advance(FeishuTokenError("刷新后的令牌仍被拒绝"))
+        return await self.token()
+
+    def accepted(self):
+        """当前令牌的请求成功后调用：此后令牌再次过期时仍先刷新一次，而不是直接切换身份。"""
+        self._refreshed = False
+
+    async def fallback(self, error: Exception) -> str:
+        """当前身份无权限（刷新令牌也无济于事）时直接切换到下一个策略。"""
+        self._advance(error)
+        return await self.token()
+
+
+def as_auth(auth) -> "AuthChain":
+    """把 access_token 字符串、单个策略或 AuthChain 统一为 AuthChain。"""
+    if isinstance(auth, AuthChain):
+        return auth
+    if isinstance(auth, str):
+        return AuthChain(StaticAuth(auth))
+    return AuthChain(auth)
+
+
+def get_auth_code_url(app_id: str, redirect_uri: str, state: str = "") -> str:
+    """构造获取授权码的页面 URL（用户同意后将跳转到 redirect_uri 并携带 code 与 state）。"""
+    params = {"app_id": app_id, "redirect_uri": redirect_uri, "response_type": "code", "state": state or ""}
+    return f"{FEISHU_AUTH_BASE_URL}/authen/v1/authorize?" + urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+
+
+def get_user_access_token(app_id: str, app_secret: str, code: str) -> dict:
+    """使用授权码换取 user_access_token，返回飞书的 data 字段（access_token、refresh_token、expires_in 等）。
+
+    依次尝试 client_id/client_secret 放在请求体、app_id/app_secret 放在请求体、Basic 头 三种传参方式。
+    """
+    url = f"{FEISHU_AUTH_BASE_URL}/authen/v1/access_token"
+    basic = base64.b64encode(f"{app_id}:{app_secret}".encode("utf-8")).decode("utf-8")
+    attempts = [
+        ({"grant_type": "authorization_code", "code": code, "client_id": app_id, "client_secret": app_secret}, None),
+        ({"grant_type": "authorization_code", "code": code, "app_id": app_id, "app_secret": app_secret}, None),
+        ({"grant_type": "authorization_code", "code": code}, {"Authorization": f"Basic {basic}"}),
+    ]
+    last_body = None
+    for i, (payload, headers) in enumerate(attempts):
+        resp = requests.post(url, json=payload, headers=headers, timeout=10)
+        try:
+            last_body = resp.json()
+        except ValueError:
+            last_body = {"status": resp.status_code, "text": resp.text[:200]}
+        if resp.status_code == 200 and last_body.get("code") == 0:
+            return last_body.get("data", {})
+        # 首选方式明确失败（而不是缺少应用凭据）时不再尝试其他方式
+        if i == 0 and resp.status_code == 200 and last_body.get("code") not in {20025} \
+                and "missing app id" not in str(last_body) and "app secret" not in str(last_body):
+            raise FeishuTokenError(f"获取 user_access_token 失败: {last_body}请检查 code 是否一次性且未过期，或应用是否开启网页应用授权")
+    raise FeishuTokenError(f"获取 user_access_token 失败: {last_body}")
+
+
+def refresh_user_access_token(app_id: str, app_secret: str, refresh_token: str) -> dict:
+    """使用 refresh_token 刷新 user_access_token，返回飞书的 data 字段（新的 access_token、refresh_token 等）。"""
+    resp = requests.post(f"{FEISHU_AUTH_BASE_URL}/authen/v1/refresh_access_token",
+                         json={"grant_type": "refresh_token", "refresh_token": refresh_token,
+                               "client_id": app_id, "client_secret": app_secret}, timeout=10)
+    if resp.status_code != 200:
+        raise FeishuTokenError(f"刷新 user_access_token HTTP 失败: {resp.status_code}, {resp.text}")
+    body = resp.json()
+    if body.get("code") != 0:
+        raise FeishuTokenError(f"刷新 user_access_token 失败: {body}")
+    return body.get("data", {})
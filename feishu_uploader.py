@@ -0,0 +1,363 @@
+"""
+飞书仿写文档上传核心（tenant / user 两种身份共用）
+- 异步实现，由飞书上传发件箱的后台 worker（feishu_outbox）直接 await，不阻塞事件循环；同步调用方（feishu4MAS_copy_tenant /
+  feishu4MAS_copy_user 中保留的旧接口、脚本）经 upload_imitate_blocking 使用同一实现
+- 同一事件循环共享一个 httpx.AsyncClient（keep-alive，安装 h2 时启用 HTTP/2），不再每个请求新建连接
+- 限流交给 limiters 注册表中的 "feishu" 限流器（默认 3 QPS、3 个在途请求，对应飞书文档块接口的频率限制，
+  可用 MAS_LIMIT_FEISHU_RPS 等环境变量调整）；遇到 HTTP 429 或频控错误码时按 Retry-After / x-ogw-ratelimit-reset
+  等待后重试，5xx 与网络错误按指数退避重试，不再在每个分片后固定 sleep
+- 写块类请求（创建子块/嵌套块、删除、批量更新）每次逻辑调用生成一个 client_token 并在重试间复用，写入已生效但
+  响应丢失（读超时、5xx）时重发不会重复写入；创建文档接口不支持 client_token，只在连接阶段错误与频控时重试
+- 上传方式：在本地把整篇文档构建成树（“原始文章”/各角色标题块，正文作为其子块），通过飞书“创建嵌套块”接口
+  （/blocks/{block_id}/descendant，单次最多 1000 个块）一次提交；超过上限时按段打包成尽量少的请求顺序提交，
+  一篇常规文档只需 创建文档 + 1 次写入 两个请求
+- 正文由 feishu_markdown.markdown_to_blocks 单遍转换为飞书块（保留列表/表格/代码块结构与行内样式）
+- 鉴权可插拔（见 feishu_token）：auth 可以是 access_token 字符串、TenantAuth / UserAuth 或按顺序回退的 AuthChain；
+  每次请求前从策略取（已缓存、提前刷新的）令牌，令牌被拒时先刷新、仍被拒或无权限时切换到下一个策略，
+  并在同一篇文档上重发失败的那次请求，不再换身份后从头新建文档
+- 写入进度记录在 UploadProgress 中（文档 ID、已确认写入的段数及超大段内已写入的子块数）；所有鉴权方式都失败时
+  返回值带上进度，传回 upload_imitate(progress=...) 即可在原文档上从最后确认的块之后续传
+- 环境变量 FEISHU_BASE_URL 可把接口地址指向本地假服务（见 scripts/bench_feishu_upload.py）
+"""
+import asyncio
+import random
+import uuid
+import weakref
+from os import getenv
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from feishu_markdown import heading_block, markdown_to_blocks
+from feishu_token import AuthChain, FeishuTokenError, as_auth
+from limiters import get_limiter
+
+FEISHU_BASE_URL = getenv("FEISHU_BASE_URL", "https://open.feishu.cn/open-apis")
+MAX_CHILDREN_PER_REQUEST = 50          # 创建子块接口单次最多 50 个块
+MAX_DESCENDANTS_PER_REQUEST = 1000     # 创建嵌套块接口单次最多 1000 个块
+MAX_UPDATES_PER_REQUEST = 200          # 批量更新块接口单次最多 200 个块
+RATE_LIMIT_CODES = {99991400}          # 飞书频控错误码
+AUTH_ERROR_CODES = {99991661, 99991663, 99991664, 99991668}   # 令牌无效/过期
+PERMISSION_ERROR_CODES = {99991672, 99991679, 1770032}         # 当前身份无权限（换身份而不是刷新令牌）
+
+_http_clients = weakref.WeakKeyDictionary()
+try:
+    import h2  # noqa: F401  安装了 h2 才能启用 HTTP/2
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """当前事件循环共享的飞书接口连接池。"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=httpx.Timeout(30, connect=10),
+            limits=httpx.Limits(max_connections=int(getenv("FEISHU_HTTP_MAX_CONNECTIONS", "10")),
+                                max_keepalive_connections=5, keepalive_expiry=30),
+        )
+        _http_clients[loop] = client
+    return client
+
+
+async def aclose_http_client():
+    """关闭当前事件循环的飞书连接池（在事件循环结束前调用）。"""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class FeishuAPIError(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None, body: Optional[dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.body = body or {}
+
+    @property
+    def code(self) -> Optional[int]:
+        return self.body.get("code")
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    for header in ("Retry-After", "x-ogw-ratelimit-reset"):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+    return None
+
+
+class UploadProgress:
+    """一次上传已确认写入的位置：sections_done 个段已完整写入；正在分批写入的超大段记录其块 ID 与已写入的子块数。"""
+
+    def __init__(self, document_id: Optional[str] = None, sections_done: int = 0,
+                 section_block_id: Optional[str] = None, children_done: int = 0):
+        self.document_id = document_id
+        self.sections_done = sections_done
+        self.section_block_id = section_block_id
+        self.children_done = children_done
+
+    def to_dict(self) -> Dict:
+        return {"document_id": self.document_id, "sections_done": self.sections_done,
+                "section_block_id": self.section_block_id, "children_done": self.children_done}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "UploadProgress":
+        return cls(**(data or {}))
+
+
+class AsyncFeishuUploader:
+    """飞书文档的异步写入客户端。
+
+    Args:
+        auth: access_token 字符串、单个鉴权策略或 AuthChain（见 feishu_token）
+        max_retries: 频控/5xx/网络错误的最大重试次数（鉴权切换不计入）
+        base_url: 接口地址，默认取 FEISHU_BASE_URL
+    """
+
+    def __init__(self, auth, max_retries: int = 5, base_url: Optional[str] = None):
+        self.auth: AuthChain = as_auth(auth)
+        self.max_retries = max_retries
+        self.base_url = (base_url or FEISHU_BASE_URL).rstrip("/")
+        self.limiter = get_limiter("feishu")
+        self.requests = 0
+        self.retries = 0
+        self.reauths = 0
+
+    async def request(self, method: str, path: str, json: Optional[dict] = None,
+                      params: Optional[dict] = None) -> dict:
+        """发送一次飞书接口请求并返回 data 字段，频控与临时错误自动重试，令牌被拒时刷新或切换身份后重发。
+
+        写请求只有带 client_token（飞书按其去重）时才在 5xx / 读超时后重发；不带的只重试请求未送达
+        （连接阶段错误）或被拒绝（频控、鉴权）的情况，避免重复创建。
+        """
+        replay_safe = method == "GET" or bool(params and params.get("client_token"))
+        attempt = 0
+        while True:
+            delay = min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+            access_token = await self.auth.token()
+            try:
+                async with self.limiter.slot():
+                    self.requests += 1
+                    response = await _get_http_client().request(
+                        method, self.base_url + path, json=json, params=params,
+                        headers={"Authorization": f"Bearer {access_token}"})
+            except httpx.TransportError as e:
+                error = FeishuAPIError(f"{method} {path} 网络错误: {e}")
+                if not replay_safe and not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+                    raise error from e
+            else:
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                code = body.get("code")
+                if response.status_code == 200 and code == 0:
+                    self.auth.accepted()
+                    return body.get("data", {})
+                error = FeishuAPIError(f"{method} {path} 失败: HTTP {response.status_code} {body or response.text[:200]}",
+                                       response.status_code, body)
+                if response.status_code == 429 or code in RATE_LIMIT_CODES:
+                    delay = _retry_after(response) or delay
+                elif response.status_code in (401, 403) or code in AUTH_ERROR_CODES | PERMISSION_ERROR_CODES:
+                    try:
+                        if response.status_code == 403 or code in PERMISSION_ERROR_CODES:
+                            await self.auth.fallback(error)
+                        else:
+                            await self.auth.refresh()
+                    except FeishuTokenError as e:
+                        raise error from e
+                    self.reauths += 1
+                    continue
+                elif response.status_code < 500 or not replay_safe:
+                    raise error
+            if attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def create_document(self, folder_token: str, title: str) -> str:
+        data = await self.request("POST", "/docx/v1/documents", json={"folder_token": folder_token, "title": title})
+        document_id = data["document"]["document_id"]
+        print(f"文档创建成功，document_id: {document_id}", flush=True)
+        return document_id
+
+    async def create_children(self, document_id: str, parent_block_id: str, children: List[dict]) -> List[str]:
+        """在父块下按顺序追加子块（每次最多 50 个，分片之间顺序提交），返回创建出的 block_id 列表。"""
+        created = []
+        path = f"/docx/v1/documents/{document_id}/blocks/{parent_block_id}/children"
+        for i in range(0, len(children), MAX_CHILDREN_PER_REQUEST):
+            data = await self.request("POST", path, json={"children": children[i:i + MAX_CHILDREN_PER_REQUEST], "index": -1},
+                                      params={"client_token": str(uuid.uuid4())})
+            created.extend(block.get("block_id", "") for block in data.get("children", []))
+        return created
+
+    async def _post_descendants(self, document_id: str, parent_block_id: str, nodes: List[Tuple[dict, List[dict]]],
+                                index: int = -1) -> List[Tuple[str, List[str]]]:
+        """一次请求在父块的 index 位置（-1 为末尾）创建 [(块, [子块...])]，返回各顶层块及其子块的 block_id。"""
+        children_id, descendants, temp_children = [], [], []
+        for i, (block, children) in enumerate(nodes):
+            temp_id = f"tmp{i}"
+            child_ids = [f"tmp{i}_{j}" for j in range(len(children))]
+            children_id.append(temp_id)
+            temp_children.append(child_ids)
+            descendants.append({**block, "block_id": temp_id, "children": child_ids})
+            descendants.extend({**child, "block_id": child_id, "children": []} for child_id, child in zip(child_ids, children))
+        data = await self.request("POST", f"/docx/v1/documents/{document_id}/blocks/{parent_block_id}/descendant",
+                                  json={"index": index, "children_id": children_id, "descendants": descendants},
+                                  params={"client_token": str(uuid.uuid4())})
+        relations = {r["temporary_block_id"]: r["block_id"] for r in data.get("block_id_relations", [])}
+        return [(relations.get(temp_id, ""), [relations.get(c, "") for c in child_ids])
+                for temp_id, child_ids in zip(children_id, temp_children)]
+
+    async def create_descendants(self, document_id: str, parent_block_id: str, nodes: List[Tuple[dict, List[dict]]],
+                                 progress: Optional[UploadProgress] = None, index: int = -1,
+                                 created: Optional[List[Tuple[str, List[str]]]] = None,
+                                 on_progress: Optional[Callable[[Dict], None]] = None) -> List[Tuple[str, List[str]]]:
+        """在父块下按顺序创建带子块的块树，按 1000 块的上限打包成尽量少的请求，返回本次创建的各顶层块及其子块的 block_id。
+
+        单个段落树超过上限时，先连同前 999 个子块创建，剩余子块再分批追加到该块下。
+        index 为插入位置（-1 为追加到末尾），分多个请求时依次后移。
+        传入 created 列表时结果就地追加到其中，中途失败时调用方仍能知道已确认创建的块。
+        传入 progress 时跳过其中已确认写入的段（及超大段内已写入的子块），每个请求成功后更新进度；
+        on_progress 在每次更新后以 progress.to_dict() 调用，供调用方随时落盘（进程中途退出也不丢进度）。
+        """
+        progress = progress or UploadProgress(document_id)
+        created = [] if created is None else created
+        batch, batch_size = [], 0
+
+        def confirmed():
+            if on_progress is not None:
+                on_progress(progress.to_dict())
+
+        async def flush():
+            nonlocal batch, batch_size, index
+            if batch:
+                created.extend(await self._post_descendants(document_id, parent_block_id, batch, index))
+                progress.sections_done += len(batch)
+                if index >= 0:
+                    index += len(batch)
+                batch, batch_size = [], 0
+                confirmed()
+
+        for position in range(progress.sections_done, len(nodes)):
+            block, children = nodes[position]
+            size = 1 + len(children)
+            if size > MAX_DESCENDANTS_PER_REQUEST or progress.section_block_id:
+                await flush()
+                if not progress.section_block_id:
+                    head = children[:MAX_DESCENDANTS_PER_REQUEST - 1]
+                    [(block_id, child_ids)] = await self._post_descendants(document_id, parent_block_id, [(block, head)], index)
+                    created.append((block_id, child_ids))
+                    progress.section_block_id, progress.children_done = block_id, len(head)
+                    if index >= 0:
+                        index += 1
+                    confirmed()
+                while progress.children_done < len(children):
+                    chunk = children[progress.children_done:progress.children_done + MAX_DESCENDANTS_PER_REQUEST]
+                    chunk_ids = await self._post_descendants(document_id, progress.section_block_id, [(c, []) for c in chunk])
+                    if created and created[-1][0] == progress.section_block_id:
+                        created[-1][1].extend(block_id for block_id, _ in chunk_ids)
+                    progress.children_done += len(chunk)
+                    if progress.children_done < len(children):
+                        confirmed()
+                progress.sections_done += 1
+                progress.section_block_id, progress.children_done = None, 0
+                confirmed()
+                continue
+            if batch_size + size > MAX_DESCENDANTS_PER_REQUEST:
+                await flush()
+            batch.append((block, children))
+            batch_size += size
+        await flush()
+        return created
+
+    async def delete_children(self, document_id: str, parent_block_id: str, start: int, end: int):
+        """删除父块下 [start, end) 位置的子块（连同其子孙块），一次请求。"""
+        if end > start:
+            await self.request("DELETE", f"/docx/v1/documents/{document_id}/blocks/{parent_block_id}/children/batch_delete",
+                               json={"start_index": start, "end_index": end},
+                               params={"client_token": str(uuid.uuid4())})
+
+    async def update_text_elements(self, document_id: str, updates: List[Tuple[str, List[dict]]]):
+        """批量改写块的文字内容 [(block_id, elements)]，每次最多 200 个块。"""
+        for i in range(0, len(updates), MAX_UPDATES_PER_REQUEST):
+            await self.request("PATCH", f"/docx/v1/documents/{document_id}/blocks/batch_update", json={"requests": [
+                {"block_id": block_id, "update_text_elements": {"elements": elements}}
+                for block_id, elements in updates[i:i + MAX_UPDATES_PER_REQUEST]]},
+                params={"client_token": str(uuid.uuid4())})
+
+    async def upload_imitate(self, folder_token: str, theme: str, origin_article: str,
+                             roles: List[str], imitate_contents: List[str],
+                             progress: Optional[Dict] = None,
+                             on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """创建文档并写入原文与各角色仿写内容。
+
+        progress 为上次失败时返回的进度，传入后不再新建文档，从最后确认写入的块之后继续。
+        失败时返回值中的 progress 可用于续传；on_progress 见 create_descendants，每个写请求确认后调用。
+        """
+        sections = build_document_tree(origin_article, roles, imitate_contents)
+        state = UploadProgress.from_dict(progress)
+        try:
+            if state.sections_done or state.section_block_id:
+                print(f"在已有文档 {state.document_id} 上续传：已写入 {state.sections_done}/{len(sections)} 段", flush=True)
+            elif not state.document_id:
+                state.document_id = await self.create_document(folder_token, theme)
+            await self.create_descendants(state.document_id, state.document_id, sections, state,
+                                          on_progress=on_progress)
+        except Exception as e:
+            print(f"添加内容异常: {e}", flush=True)
+            return {"success": False, "document_id": state.document_id, "error": str(e), "progress": state.to_dict()}
+        print(f"飞书上传完成（{self.auth.name}）：{self.requests} 次请求，{self.retries} 次重试，{self.reauths} 次鉴权切换/刷新", flush=True)
+        return {"success": True, "document_id": state.document_id, "title": theme, "auth": self.auth.name,
+                "message": "仿写文档创建并上传成功"}
+
+
+def build_document_tree(origin_article: str, roles: List[str], imitate_contents: List[str]) -> List[Tuple[dict, List[dict]]]:
+    """仿写文档的块树：[(“原始文章”二级标题, 原文块), (“<角色>仿写文章”一级标题, 正文块), ...]。"""
+    sections = [(heading_block(2, "原始文章"), list(markdown_to_blocks(origin_article)))]
+    for role, content in zip(roles, imitate_contents):
+        sections.append((heading_block(1, f"{role.strip()}仿写文章"), list(markdown_to_blocks(content))))
+    return sections
+
+
+async def upload_imitate_async(folder_token: str, theme: str, origin_article: str, roles: List[str],
+                               imitate_contents: List[str], auth, base_url: Optional[str] = None,
+                               progress: Optional[Dict] = None) -> Dict:
+    """便捷函数：异步创建仿写文档并上传全部内容（auth 见 AsyncFeishuUploader）。"""
+    uploader = AsyncFeishuUploader(auth, base_url=base_url)
+    return await uploader.upload_imitate(folder_token, theme, origin_article, roles, imitate_contents, progress)
+
+
+def upload_imitate_blocking(folder_token: str, theme: str, origin_article: str, roles: List[str],
+                            imitate_contents: List[str], auth, base_url: Optional[str] = None,
+                            progress: Optional[Dict] = None) -> Dict:
+    """同步调用方使用：在新的事件循环中完成上传并关闭该循环的连接池（不能在运行中的事件循环里调用）。"""
+    async def run():
+        try:
+            return await upload_imitate_async(folder_token, theme, origin_article, roles, imitate_contents,
+                                              auth, base_url, progress)
+        finally:
+            await aclose_http_client()
+    return asyncio.run(run())
+
+
+class BlockingImitateUploader:
+    """同步接口的薄封装（feishu4MAS_copy_tenant / feishu4MAS_copy_user 的 FeishuImitateUploaderSimple）：
+    子类通过 auth() 给出鉴权策略，create_imitate_document 在新的事件循环中调用上传核心。"""
+
+    base_url: Optional[str] = None
+
+    def auth(self):
+        raise NotImplementedError
+
+    def create_imitate_document(self, folder_token, theme, origin_article, roles, imitate_contents,
+                                progress: Optional[Dict] = None) -> Dict:
+        return upload_imitate_blocking(folder_token, theme, origin_article, roles, imitate_contents,
+                                       self.auth(), self.base_url, progress)
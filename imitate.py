@@ -11,82 +11,108 @@ load_dotenv()
 app_id = getenv("FEISHU_APP_ID")
 app_secret = getenv("FEISHU_APP_SECRET")
 folder_token = getenv("FEISHU_FOLDER_TOKEN")
-from langsmith import traceable
+feishu_sync_run = getenv("MAS_FEISHU_SYNC_RUN", "")   #非空时飞书上传走增量同步，同一原文 + 运行名复用同一篇文档
+#v2t（链接解析/ASR）、文本总结、飞书 SDK 均在对应节点内按需导入，缩短纯文本仿写的启动时间
+#langgraph 与 langsmith（合计约 0.7s）也在首次编译图、首次执行被追踪的节点时才导入
 import re
 import sys
 import asyncio
+import functools
 import uuid
+import hashlib
 import json
-from collections import defaultdict
-from langchain_openai import ChatOpenAI
+from contextlib import asynccontextmanager
 from langchain_core.prompts import ChatPromptTemplate,MessagesPlaceholder
-from langgraph.graph import StateGraph,START,END
-from langgraph.prebuilt import create_react_agent
-from langgraph.graph.message import add_messages
-from langgraph.graph.message import MessagesState
 from langchain_core.messages import AIMessageChunk, BaseMessage,HumanMessage,SystemMessage,ToolMessage,AIMessage
 from typing_extensions import TypedDict,Annotated,Any,Literal
 from datetime import datetime
-from langgraph.types import Command,Send
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, RunnablePassthrough, ensure_config
 from operator import or_, add
-from v2t import main_v2t_no_summary
 from template_list import role_list
-from langchain_core.callbacks import UsageMetadataCallbackHandler
-from text_summary import main_summarize
-from feishu4MAS_copy_user import upload_imitate_to_feishu_simple1, get_user_access_token, get_auth_code_url
-from feishu4MAS_copy_tenant import get_refresh_app_access_token,upload_imitate_to_feishu_simple2
-callback = UsageMetadataCallbackHandler()
-sem = asyncio.Semaphore(8)
-config = RunnableConfig(
-    recursion_limit=200,                        # ✅ 放在顶层
-    configurable={"thread_id": str(uuid.uuid4())},
-    callbacks=[callback]
-)
+from limiters import add_limiter_arguments, configure_from_args
+from model_configs import MODEL_CONFIGS, MODEL_ALIASES, get_model_limiter
+from stream_hub import get_stream_hub, start_stream_server
+from usage_tracker import RunUsageTracker, format_by_step
+
+
+def traceable(name: str):
+    """langsmith.traceable 的延迟版本：被装饰的协程首次执行时才导入 langsmith 并包装。"""
+    def decorator(func):
+        traced = None
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            nonlocal traced
+            if traced is None:
+                from langsmith import traceable as langsmith_traceable
+                traced = langsmith_traceable(name=name)(func)
+            return await traced(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_messages(left, right):
+    """messages 字段的合并函数，调用时才导入 langgraph 的 add_messages（定义状态不需要加载 langgraph）。"""
+    from langgraph.graph.message import add_messages as merge_messages
+    return merge_messages(left, right)
+
+
+def new_run_config(thread_id: str | None = None, callbacks: list | None = None) -> RunnableConfig:
+    """每次运行独立的 config：独立的 thread_id 与用量统计回调 RunUsageTracker，并发/批量运行之间的用量互不混淆。"""
+    thread_id = thread_id or str(uuid.uuid4())
+    return RunnableConfig(
+        recursion_limit=200,                        # ✅ 放在顶层
+        configurable={"thread_id": thread_id},
+        callbacks=[RunUsageTracker(run_id=thread_id), *(callbacks or [])]
+    )
 time_now = datetime.now().strftime("%Y-%m-%d %H:%M")
 
-dashscope_model = ChatOpenAI(
-    model_name="qwen-plus-latest",
-    temperature=1,
-    api_key=getenv("DASH_SCOPE_API_KEY"),
-    base_url=getenv("DASH_SCOPE_BASE_URL"),
-    streaming=True,
-    timeout=60,
-    max_retries=10,
-    stream_usage=True
-)
-correct_model = ChatOpenAI(
-    model_name="google/gemini-2.5-flash-lite",
-    temperature=0.5,
-    api_key=getenv("OPENROUTER_API_KEY"),
-    base_url=getenv("OPENROUTER_BASE_URL"),
-    streaming=False,
-    timeout=60,
-    max_retries=10,
-    stream_usage=True
-)
-openrouter1 = ChatOpenAI(
-    model_name="google/gemini-2.5-flash-lite",
-    temperature=1,
-    api_key=getenv("OPENROUTER_API_KEY"),
-    base_url=getenv("OPENROUTER_BASE_URL"),
-    streaming=True,
-    timeout=60,
-    max_retries=10,
-    stream_usage=True
-)
-summarize_model = ChatOpenAI(
-    model_name="google/gemini-2.5-flash-lite",
-    temperature=1,
-    api_key=getenv("OPENROUTER_API_KEY"),
-    base_url=getenv("OPENROUTER_BASE_URL"),
-    streaming=True,
-    timeout=60,
-    max_retries=10,
-    stream_usage=True
-)
-v2t_model = correct_model
-imitate_model = openrouter1
+#模型客户端按 model_configs.MODEL_CONFIGS 创建；ChatOpenAI（含 openai SDK）导入较慢，首次调用 get_model 时才创建
+_models = {}
+
+
+def get_model(name: str):
+    """按名称获取（并缓存）ChatOpenAI 客户端，v2t/imitate 为 correct/openrouter1 的别名。"""
+    name = MODEL_ALIASES.get(name, name)
+    if name not in _models:
+        from langchain_openai import ChatOpenAI
+        cfg = MODEL_CONFIGS[name]
+        _models[name] = ChatOpenAI(
+            model_name=cfg["model_name"],
+            temperature=cfg["temperature"],
+            api_key=getenv(cfg.get("api_key_env", "OPENROUTER_API_KEY")),
+            base_url=getenv(cfg.get("base_url_env", "OPENROUTER_BASE_URL")),
+            streaming=cfg["streaming"],
+            timeout=60,
+            max_retries=10,
+            stream_usage=True
+        )
+    return _models[name]
+
+
+def model_supports_prompt_cache(name: str) -> bool:
+    """模型是否使用 cache_control 标注可缓存的前缀，设置环境变量 MAS_PROMPT_CACHE=0 可全局关闭。"""
+    if getenv("MAS_PROMPT_CACHE", "1") == "0":
+        return False
+    return bool(MODEL_CONFIGS[MODEL_ALIASES.get(name, name)].get("prompt_cache"))
+
+
+def cache_usage_report(usage_metadata: dict) -> dict:
+    """按模型汇总输入 token 中命中提供方前缀缓存的部分：{模型: {input_tokens, cache_read, cache_creation, cache_hit_ratio}}。"""
+    report = {}
+    for model_name, usage in (usage_metadata or {}).items():
+        details = usage.get("input_token_details") or {}
+        input_tokens = usage.get("input_tokens", 0)
+        cache_read = details.get("cache_read", 0) or 0
+        report[model_name] = {
+            "input_tokens": input_tokens,
+            "cache_read": cache_read,
+            "cache_creation": details.get("cache_creation", 0) or 0,
+            "cache_hit_ratio": round(cache_read / input_tokens, 4) if input_tokens else 0.0,
+        }
+    return report
+
+
 def _remove_surrogates_from_str(text: str) -> str:
     """Remove lone surrogate code points to avoid UTF-8 encode errors."""
     if not isinstance(text, str):
@@ -110,43 +136,72 @@ def read_multiline(prompt="请输入多行文章，结束请输入单独一行 /
     combined = "\n".join(lines)
     return _remove_surrogates_from_str(combined)
 
-async def open_tcp_sink(port: int):
-    reader, writer = await asyncio.open_connection("127.0.0.1", port)
-    return writer 
 
-#用于更新状态和流式打印LLM输出的函数，只用于仿写
-async def collect_state_and_stream_print_imitate(agent, state, stream_mode=("messages",), writer: asyncio.StreamWriter | None = None):
-    full_messages = state["messages"]
-    new_messages = []
-    buf, printed_header = [], False
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
 
-    async def _emit(text: str):
-        if writer is None:
-            pass
-            # print(text, end="", flush=True)
-        else:
-            try:
-                writer.write(text.encode("utf-8"))
-                await writer.drain()
-            except ConnectionResetError:
-                # 对端（nc）关掉了也别让任务崩
-                pass
+def approx_tokens(text) -> int:
+    """粗略估算 token 数：中日文字符约 1 token/字，其余约 4 字符/token。"""
+    text = text if isinstance(text, str) else str(text)
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
 
-    async for kind, payload in agent.astream(state, stream_mode=list(stream_mode)):
-        if kind == "messages":
-            piece = payload[0].content
+#多步骤模板之间的历史压缩：状态中的 messages 只包含各步骤产出的草稿，后一步只需要最新草稿
+STEP_HISTORY_TOKENS = int(getenv("MAS_STEP_HISTORY_TOKENS", "12000"))   # 每步转发的历史 token 预算
+STEP_HISTORY_DRAFTS = int(getenv("MAS_STEP_HISTORY_DRAFTS", "1"))       # 每步最多转发的草稿数
+
+def compact_history(messages:list, max_tokens:int=None, max_drafts:int=None, exclude_latest:bool=False) -> list:
+    """按 token 预算从最新往前保留草稿消息，最新一条草稿始终保留（不截断正文）。
+
+    exclude_latest：最新草稿已作为 final_text 单独放入提示词时（小A开头优化步骤），从历史中去掉它避免重复发送。
+    """
+    max_tokens = STEP_HISTORY_TOKENS if max_tokens is None else max_tokens
+    max_drafts = STEP_HISTORY_DRAFTS if max_drafts is None else max_drafts
+    if exclude_latest:
+        messages, max_drafts = messages[:-1], max_drafts - 1
+    kept, used = [], 0
+    for message in reversed(messages):
+        if len(kept) >= max_drafts:
+            break
+        cost = approx_tokens(message.content)
+        if kept and used + cost > max_tokens:
+            break
+        kept.append(message)
+        used += cost
+    return kept[::-1]
+
+def _estimate_step_tokens(state) -> int:
+    """粗略估算单步的 token 消耗（输入 + 与输入等长的输出），用于 LLM 令牌桶限速。"""
+    if state["messages"]:
+        input_tokens = sum(approx_tokens(m.content) for m in compact_history(state["messages"]))
+    else:
+        input_tokens = approx_tokens(state.get("article") or "")
+    return 2 * input_tokens
+
+#单个仿写步骤的流式调用：直接对预构建的 prompt | llm 链 astream，返回 (原消息 + 本步 AIMessage, 本步全文)
+#token 以 (角色, 步骤) 为标签发布到 StreamHub，由 SSE 服务合并成帧后推送；没有订阅者时 publish 直接返回
+async def stream_imitate_step(step_chain, state, stream_tag: tuple | None = None, limiter=None, fair_key=None):
+    full_messages = state["messages"]
+    buf = []
+    hub = get_stream_hub()
+
+    #每次 LLM 调用向提供方限流器申请名额；名额紧张时按 fair_key（角色名）轮转分配，批量模式下多篇文章 × 多角色统一排队
+    limiter = limiter or get_model_limiter("imitate")
+    #角色与步骤写入 metadata，供 RunUsageTracker 按（角色, 步骤）统计用量与延迟
+    metadata = {"mas_role": stream_tag[0], "mas_step": stream_tag[1]} if stream_tag is not None else {}
+    async with limiter.slot(tokens=_estimate_step_tokens(state), key=fair_key):
+        async for chunk in step_chain.astream(state, {"metadata": {**ensure_config().get("metadata", {}), **metadata}}):
+            piece = chunk.content
             if piece:
-                if not printed_header:
-                    await _emit("\n========== Ai Message ==========\n")
-                    printed_header = True
-                await _emit(piece)
+                if stream_tag is not None:
+                    hub.publish(*stream_tag, piece)
                 buf.append(piece)
+    if stream_tag is not None:
+        hub.end_step(*stream_tag)
 
-    await _emit("\n")
     text_format = "".join(buf)
     if buf:
-        new_messages.append(AIMessage(content=text_format))
-    return full_messages + new_messages, text_format
+        return full_messages + [AIMessage(content=text_format)], text_format
+    return full_messages, text_format
 #用于工具调用的流式打印
 async def collect_state_and_stream_print(agent, state, stream_mode=("messages","updates")):
     """同时打印工具调用信息 + 流式 tokens；并按到达顺序写回 AI/Tool 消息。"""
@@ -291,131 +346,151 @@ def strip_markdown_fences(text: str) -> str:
     return ''.join(out)
 
 #仿写
-class imitate_state(MessagesState):
+#各状态与 MessagesState 等价（messages 字段以 add_messages 合并），直接继承 TypedDict 以免导入 langgraph
+class imitate_state(TypedDict):
     user_input:str
     video_url:str
     article:str
     summary:dict
-    app_id:str
-    app_secret:str
+    app_id:str #飞书应用 ID；app_secret 不进入状态（检查点会把状态落盘），上传时从模块配置读取
     folder_token:str
+    feishu_sync:str #增量同步的运行名：非空时同一原文与运行名对应同一篇飞书文档，重跑只修补变化的段
     template_choose_list:list[dict]
-    role_graph_list:Annotated[list[StateGraph],add]
+    role_graph_list:Annotated[list[tuple[str,str]],add] #[(角色名, 模板哈希)]，对应 _role_graph_cache 中已编译的角色子图
     messages:Annotated[list[BaseMessage],add_messages]
     each_role_text:Annotated[dict[str,str],or_] #{"角色1":"正文","角色2":"正文"}
 
-class each_role_state(MessagesState):
+class each_role_state(TypedDict):
             role_name:str
+            article:str
             messages:Annotated[list[BaseMessage],add_messages]
             final_text:dict[str,str]
 
-class each_node_state(MessagesState):
+class each_node_state(TypedDict):
                 role_name:str
+                article:str
                 messages:Annotated[list[BaseMessage],add_messages]
                 final_text:dict[str,str]
-                writer:asyncio.StreamWriter
 
-async def create_role_imitate_graph(state:imitate_state):
-    """create the imitate graph dynamically for the role"""
+#已编译的角色子图缓存：{(角色名, 模板哈希): CompiledStateGraph}
+#模板是静态的，子图只需编译一次，原文与中间结果都通过 state 传入，可在多篇文章之间复用
+_role_graph_cache = {}
+
+def role_graph_key(role_dict:dict) -> tuple[str,str]:
+    """角色子图的缓存键：(角色名, 模板内容哈希)，模板改动后自动生成新的子图。"""
+    template_json = json.dumps(role_dict["template"], ensure_ascii=False, sort_keys=True)
+    return (role_dict["name"], hashlib.sha1(template_json.encode("utf-8")).hexdigest()[:16])
+
+def build_step_chain(template_value:str, step:int):
+    """构建单个模板步骤的 prompt | llm 链（每个步骤只构建一次，随角色子图一起缓存）。
+
+    第一步：system 模板 + 原始文案；后续步骤：历史消息 + 当前模板；step 为 None 时为小A的开头优化步骤。
+    静态的角色模板固定放在最前面、文章等动态内容放在其后，使请求前缀在不同文章之间保持一致，
+    支持的提供方上再对模板内容块标注 cache_control，让数千字的角色模板命中前缀缓存。
+    后续步骤转发的历史先经 compact_history 压缩为最新草稿（受 token 预算约束），提示词长度不随步骤数线性增长。
+    角色模板在每一步都作为字面消息传入，其中的花括号原样发送、不会被当作模板变量；
+    只有代码中写定的文章/待优化文案占位符（{article}、{final_text}）才是模板变量。
+    """
+    if step == 0:
+        if model_supports_prompt_cache("imitate"):
+            system_message = SystemMessage(content=[{"type": "text", "text": template_value, "cache_control": {"type": "ephemeral"}}])
+        else:
+            system_message = SystemMessage(content=template_value)
+        prompt = ChatPromptTemplate.from_messages([
+            system_message,
+            ("user", "<原始文案>\n{article}\n</原始文案>")
+        ])
+    elif step is None:
+        history = RunnablePassthrough.assign(messages=lambda state: compact_history(state["messages"], exclude_latest=True))
+        prompt = history | ChatPromptTemplate.from_messages([
+            MessagesPlaceholder("messages"),
+            ("user", """\n\n<待优化文案>\n{final_text}\n</待优化文案>\n
+                    以上就是需要优化开头部分的文案，请直接以markdown格式输出优化完成后的全部文案，不要改变文案其他部分的结构和内容
+                    """)
+        ])
+    else:
+        history = RunnablePassthrough.assign(messages=lambda state: compact_history(state["messages"]))
+        prompt = history | ChatPromptTemplate.from_messages([
+            MessagesPlaceholder("messages"),
+            HumanMessage(content=template_value)])
+    return prompt | get_model("imitate")
+
+def build_role_graph(role_dict:dict):
+    """为一个角色按模板步骤构建并编译子图（不访问任何文章内容）。"""
+    #每个模板步骤预先构建好 prompt | llm 链，节点执行时直接流式调用，不再为单次无工具调用创建 ReAct 代理
+    step_chains = [build_step_chain(template_item, i) for i, template_item in enumerate(role_dict["template"])]
+    if role_dict["name"]=="小A":
+        step_chains.append(build_step_chain("", None))
+    node_list=[]
+    for step, step_chain in enumerate(step_chains, start=1):
+        async def each_node_imitate_node(state:each_node_state, step_chain=step_chain, step=step):
+            """imitate the text to specific style"""
+            AI_messages,text_format = await stream_imitate_step(step_chain,state,stream_tag=(role_dict["name"],step),fair_key=role_dict["name"])
+            return {"messages":AI_messages,"final_text":text_format}
+        node_list.append(each_node_imitate_node)
+    #实例化graph_builder
+    from langgraph.graph import StateGraph,START,END
+    role_graph_builder = StateGraph(each_role_state)
+    #将node_list中的每一个node添加到graph_builder中，并设置START_edge和END_edge,以及每个节点之间的edge
+    for i, node in enumerate(node_list):
+        role_graph_builder.add_node(f"imitate_{role_dict['name']}_node{i+1}",node)
+    role_graph_builder.add_edge(START,f"imitate_{role_dict['name']}_node1")
+    for i in range(len(node_list)-1):
+        role_graph_builder.add_edge(f"imitate_{role_dict['name']}_node{i+1}",f"imitate_{role_dict['name']}_node{i+2}")
+    role_graph_builder.add_edge(f"imitate_{role_dict['name']}_node{len(node_list)}",END)
+    #编译graph
+    return role_graph_builder.compile()
+
+def get_role_graph(role_dict:dict):
+    """返回角色对应的已编译子图，首次使用时构建并缓存。"""
+    key = role_graph_key(role_dict)
+    role_graph = _role_graph_cache.get(key)
+    if role_graph is None:
+        role_graph = build_role_graph(role_dict)
+        _role_graph_cache[key] = role_graph
+    return role_graph
 
+async def create_role_imitate_graph(state:imitate_state):
+    """prepare (or reuse) the compiled imitate graph for each role"""
+    #遍历template_choose_list中的每一个角色，取出（或首次编译）对应的子图，state 中只记录缓存键
     role_graph_list = []
-    article=state["article"]
-    #为每一个角色依据name和template创建一个imitate_graph
-    #遍历role_choose_list中的每一个角色取出name和template，创建一个imitate_graph
-    #role_dict是role_choose_list中的每一个角色，每个角色包含name和template(list)
     for role_dict in state["template_choose_list"]:
-        #为template中的每一个template创建一个imitate_node,然后将其组合为完整的graph并编译它
-        node_list=[]
-        for i, template_item in enumerate(role_dict["template"]):
-            
-            if i==0:
-                #对于第一步需要将原始文案交进去，然后进行仿写
-                async def each_node_imitate_node(state:each_node_state, template_value=template_item):
-                    """imitate the text to specific style"""
-                    prompt = ChatPromptTemplate.from_messages([
-                        ("system", template_value),
-                        ("user", f"<原始文案>\n{article}\n</原始文案>")
-                    ])
-                    imitate_agent = create_react_agent(
-                        model = imitate_model,
-                        tools=[],
-                        prompt = prompt
-                    )
-                    AI_messages,text_format = await collect_state_and_stream_print_imitate(imitate_agent,state,stream_mode=["messages"],writer=None)
-                    return {"messages":AI_messages,"final_text":text_format}
-                node_list.append(each_node_imitate_node)
-            else:
-                async def each_node_imitate_node(state:each_node_state, template_value=template_item):
-                    """imitate the text to specific style"""
-                    prompt = ChatPromptTemplate.from_messages([
-                        MessagesPlaceholder("messages"),
-                        ("user", template_value)])
-                    agent=create_react_agent(
-                        model = imitate_model,
-                        tools=[],
-                        prompt = prompt
-                    )
-                    AI_messages,text_format = await collect_state_and_stream_print_imitate(agent,state,stream_mode=["messages"],writer=None)
-                    return {"messages":AI_messages,"final_text":text_format}
-                node_list.append(each_node_imitate_node)
-        if role_dict["name"]=="小A":
-            async def each_node_imitate_node(state:each_node_state):
-                """imitate the text to specific style"""
-                prompt = ChatPromptTemplate.from_messages([
-                        MessagesPlaceholder("messages"),
-                        ("user", f"""\n\n<待优化文案>\n{state['final_text']}\n</待优化文案>\n
-                        以上就是需要优化开头部分的文案，请直接以markdown格式输出优化完成后的全部文案，不要改变文案其他部分的结构和内容
-                        """)
-                        ])
-                agent=create_react_agent(
-                        model = imitate_model,
-                        tools=[],
-                        prompt = prompt
-                    )
-                AI_messages,text_format = await collect_state_and_stream_print_imitate(agent,state,stream_mode=["messages"],writer=None)
-                return {"messages":AI_messages,"final_text":text_format}
-            node_list.append(each_node_imitate_node)
-        #实例化graph_builder
-        role_graph_builder = StateGraph(each_role_state)
-        #将node_list中的每一个node添加到graph_builder中，并设置START_edge和END_edge,以及每个节点之间的edge
-        for i, node in enumerate(node_list):
-            role_graph_builder.add_node(f"imitate_{role_dict['name']}_node{i+1}",node)
-        role_graph_builder.add_edge(START,f"imitate_{role_dict['name']}_node1")
-        for i in range(len(node_list)-1):
-            role_graph_builder.add_edge(f"imitate_{role_dict['name']}_node{i+1}",f"imitate_{role_dict['name']}_node{i+2}")
-        role_graph_builder.add_edge(f"imitate_{role_dict['name']}_node{len(node_list)}",END)
-        #编译graph
-        role_graph = role_graph_builder.compile()
-        #将graph添加到role_graph_list中
-        role_graph_list.append(role_graph)
-    #返回role_graph_list
+        get_role_graph(role_dict)
+        role_graph_list.append(role_graph_key(role_dict))
     return {"role_graph_list":role_graph_list}
 
+def fan_out_roles(state:imitate_state):
+    """每个角色作为一个独立的 Send 任务执行，检查点按任务分别保存，某个角色失败后续跑只重做该角色"""
+    from langgraph.types import Send
+    return [Send("imitate_node",{"article":state["article"],"role":role_dict}) for role_dict in state["template_choose_list"]]
+
+class role_task_state(TypedDict):
+    article:str
+    role:dict
+
 #仿写
 @traceable(name = "imitate_node")
-async def imitate_node(state:imitate_state):
+async def imitate_node(state:role_task_state):
+    """imitate the text to specific style"""
+    #并发由 LLM 调用级别的提供方限流器控制（见 stream_imitate_step），这里不再整体占用信号量
     time_start = time.time()
-    
-    async with sem:
-        """imitate the text to specific style"""
-        task_list = []
-        for role_graph in state["role_graph_list"]:
-            task_list.append(role_graph.ainvoke(state,config))
-        result_list = await asyncio.gather(*task_list)
-        result = {"each_role_text":defaultdict(str)}
-        #gather顺序和template_choose_list顺序一致
-        for i, role in enumerate(state["template_choose_list"]):
-            role_key = role["name"] if isinstance(role, dict) and "name" in role else str(role)
-            result["each_role_text"][role_key] = result_list[i]["final_text"]
-        time_end = time.time()
-        print(f"程序运行时间：{time_end - time_start}秒")
-        return result
+    role_dict = state["role"]
+    role_graph = get_role_graph(role_dict)
+    #不显式传 config：子图沿用当前运行的 config（回调、recursion_limit、检查点），服务模式下各任务的用量互不混淆；
+    #启用检查点时子图的每一步保存在本任务的命名空间下，续跑时从失败的步骤继续
+    result = await role_graph.ainvoke({"article":state["article"],"role_name":role_dict["name"],"messages":[]})
+    time_end = time.time()
+    print(f"{role_dict['name']} 仿写运行时间：{time_end - time_start}秒")
+    #each_role_text 以 or_ 合并，各 Send 任务的写入按发出顺序生效，与 template_choose_list 顺序一致
+    return {"each_role_text":{role_dict["name"]:result["final_text"]}}
 
 @traceable(name = "imitate_v2t_node")
 async def imitate_v2t_node(state:imitate_state):
     """transfer vieo link to text including correct"""
+    from langgraph.types import Command
+    from v2t import main_v2t_no_summary
     #将输入的视频链接转文字
-    v2t_text_list = await main_v2t_no_summary(v2t_model,[state["video_url"]])
+    v2t_text_list = await main_v2t_no_summary(get_model("v2t"),[state["video_url"]])
     # 回退策略：若无有效结果，走 text_fanout_node，以原始输入继续流程
     if not v2t_text_list:
         raise RuntimeError("没有有效的转录结果")
@@ -424,8 +499,9 @@ async def imitate_v2t_node(state:imitate_state):
 
 async def summarize_node(state:imitate_state):
     """summarize the text to specific style"""
+    from text_summary import main_summarize
     text = state["article"]
-    summarize_result=await main_summarize(summarize_model,text)
+    summarize_result=await main_summarize(get_model("summarize"),text)
     return {"summary":summarize_result}
 async def text_fanout_node(state:imitate_state):
     """fan out to summarize and create graph for plain text path"""
@@ -434,6 +510,7 @@ async def text_fanout_node(state:imitate_state):
 @traceable(name = "select_node")
 async def select_node(state:imitate_state):
     """select the node to run"""
+    from langgraph.types import Command
     #如果是链接形式就尝试转文字
     if "https" in state["user_input"] or "http" in state["user_input"]:
         return Command(goto="imitate_v2t_node",update={"video_url":state["user_input"]})
@@ -442,8 +519,18 @@ async def select_node(state:imitate_state):
         return Command(goto="text_fanout_node",update={"article":state["user_input"]})
 
 
-def save_to_local(state:imitate_state):
+def usage_tracker_from(config: RunnableConfig | None = None) -> RunUsageTracker | None:
+    """当前运行的用量统计回调（new_run_config 中创建），config 中没有时返回 None。"""
+    callbacks = (config or {}).get("callbacks")
+    for handler in getattr(callbacks, "handlers", callbacks) or []:
+        if isinstance(handler, RunUsageTracker):
+            return handler
+    return None
+
+def save_to_local(state:imitate_state, config:RunnableConfig = None):
     """save the text to local as txt and md"""
+    tracker = usage_tracker_from(config)
+    usage_metadata = tracker.usage_metadata if tracker else {}
     time_now = datetime.now().strftime("%Y-%m-%d %H:%M")
     title=state["article"][:10]
     floder_dir = os.path.dirname(os.path.abspath(__file__))
@@ -458,116 +545,181 @@ def save_to_local(state:imitate_state):
         for role,text in state["each_role_text"].items():
             text = strip_markdown_fences(text)
             f.write(f"\n# {role}仿写文案:\n{text}\n")
-        if callback.usage_metadata:
+        if usage_metadata:
             f.write(f"\n# token使用量:\n")
-            for key,value in callback.usage_metadata.items():
+            for key,value in usage_metadata.items():
                 f.write(f"{key}:  \n{value}\n")
+            for key,value in cache_usage_report(usage_metadata).items():
+                f.write(f"{key} 前缀缓存命中:  \n{value['cache_read']}/{value['input_tokens']} 输入token（{value['cache_hit_ratio']:.1%}）\n")
             f.write("\n")
     print(f"保存到本地:\t{title}_{time_now}")
-
+    enqueue_feishu_upload(state, config)
     return {}
 
-@traceable(name = "upload2feishu_node")
-async def upload2feishu_node(state:imitate_state):
-    """upload the text to feishu"""
-    roles=[]
-    articles=[]
-    origin_article = state["article"]
-    theme = state["article"][:10]
-    app_id = state["app_id"]
-    app_secret = state["app_secret"]
-    folder_token = state["folder_token"]
-    if app_id !="" and app_secret !="" and folder_token !="":
-        #将state中的each_role_text中的每个角色的title和final_text上传到飞书
-        print("开始将仿写结果上传至飞书")
-        for role,text in state["each_role_text"].items():
-            roles.append(role)
-            articles.append(text)
-            #将title和article上传到飞书
-        async def upload_to_feishu_user(app_id, app_secret, folder_token, theme, origin_article, roles, articles) -> str:
-            # 优先从环境变量读取 user_access_token；否则用 FEISHU_CODE 换取；仍缺失则打印授权 URL 并中止
-            REDIRECT_URI = "https://open.feishu.cn/api-explorer/loading"
-            user_access_token = os.environ.get("FEISHU_USER_ACCESS_TOKEN", "").strip()
-            if not user_access_token:
-                code = os.environ.get("FEISHU_CODE", "").strip()
-                if code:
-                    token_data = get_user_access_token(app_id, app_secret, code)
-                    user_access_token = token_data.get("access_token", "")
-            if not user_access_token:
-                auth_url = get_auth_code_url(app_id, REDIRECT_URI, state="state123")
-                print(f"[AUTH] 请在浏览器打开以下链接完成授权，并在回调后获取 code：\n{auth_url}")
-                print("[AUTH] 完成后以环境变量 FEISHU_CODE=... 再次运行，或直接提供 FEISHU_USER_ACCESS_TOKEN。")
-                raise RuntimeError("缺少 user_access_token/FEISHU_CODE，已输出授权链接")
-
-            upload_imitate_to_feishu_simple1(
-                folder_token=folder_token,
-                theme=theme,
-                origin_article=origin_article,
-                roles=roles,
-                imitate_contents=articles,
-                app_id=app_id,
-                app_secret=app_secret,
-                user_access_token=user_access_token
-            )
-            print("已成功上传至飞书")
-        async def upload_to_feishu_tenant(app_id, app_secret, folder_token, theme, origin_article, roles, articles) -> str:
-            tenant_access_token = get_refresh_app_access_token(app_id, app_secret)
-            upload_imitate_to_feishu_simple2(
-                folder_token=folder_token,
-                theme=theme,
-                origin_article=origin_article,
-                roles=roles,
-                imitate_contents=articles,
-                app_id=app_id,
-                app_secret=app_secret,
-                tenant_access_token=tenant_access_token
-            )
-            print("已成功上传至飞书")
+def prefetch_feishu_token():
+    """配置了飞书凭据时在后台预取 tenant_access_token，仿写结束后上传直接命中缓存；返回预取任务（调用方需持有引用）"""
+    if not (app_id and app_secret and folder_token):
+        return None
+    from feishu_token import get_token_manager
+    async def warm():
         try:
-            await upload_to_feishu_tenant(app_id, app_secret, folder_token, theme, origin_article, roles, articles)
+            await get_token_manager(app_id, app_secret).atenant_token()
         except Exception as e:
-            print(f"上传失败: {e}")
-            print("尝试使用user_access_token上传")
-            try:
-                await upload_to_feishu_user(state["app_id"], state["app_secret"], folder_token, theme, origin_article, roles, articles)
-            except Exception as e:
-                print(f"上传失败: {e}")
-                print("上传失败")
-        #将state中的each_role_text中的每个角色的final_text上传到飞书
+            print(f"预取飞书令牌失败（上传时会重新获取）: {e}", flush=True)
+    return asyncio.create_task(warm())
+
+def enqueue_feishu_upload(state:imitate_state, config:RunnableConfig = None):
+    """配置了飞书凭据时把本次仿写结果写入飞书上传发件箱（feishu_outbox），由后台 worker 上传，图不等待飞书写入"""
+    if not (state.get("app_id") and state.get("folder_token") and app_secret):
+        return None
+    from feishu_outbox import get_outbox
+    roles = list(state["each_role_text"].keys())
+    payload = {"folder_token":state["folder_token"],"theme":state["article"][:10],"origin_article":state["article"],
+               "roles":roles,"contents":[state["each_role_text"][role] for role in roles],"sync_run":state.get("feishu_sync","")}
+    #以 thread_id 作为任务键：从检查点续跑时保存节点重放也只排队一次
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    key = get_outbox().enqueue(state["app_id"], payload, thread_id)
+    print(f"已加入飞书上传队列（{key}），后台上传")
+    return key
+
+#命令行运行结束前最多等待后台飞书上传的秒数，未传完的任务留在发件箱，下次启动或 python feishu_outbox.py 时继续
+OUTBOX_DRAIN_TIMEOUT = float(getenv("MAS_FEISHU_OUTBOX_DRAIN_TIMEOUT", "120"))
+
+def start_feishu_outbox():
+    """配置了飞书凭据时在后台启动发件箱 worker（含之前运行遗留的上传任务）；返回 worker，未配置时返回 None"""
+    if not (app_id and app_secret and folder_token):
+        return None
+    from feishu_outbox import OutboxWorker
+    return OutboxWorker(app_id, app_secret).start()
+
+def usage_node(state:imitate_state, config:RunnableConfig = None):
+    """打印本次运行的用量与延迟（按角色/步骤），并把完整报告以 JSON 保存到仿写结果旁"""
+    tracker = usage_tracker_from(config)
+    if tracker is None or not tracker.calls:
+        return {}
+    report = tracker.report()
+    report["prompt_cache"] = cache_usage_report(tracker.usage_metadata)
+    for key,value in tracker.usage_metadata.items():
+        print(f"{key}:\n{value}\n")
+    for key,value in report["prompt_cache"].items():
+        print(f"{key} 前缀缓存命中: {value['cache_read']}/{value['input_tokens']} 输入token（{value['cache_hit_ratio']:.1%}）")
+    print("各步骤用量与耗时（按耗时降序）：")
+    for line in format_by_step(report):
+        print(line)
+    print(f"总耗时 {report['duration_s']:.2f}s")
+    if state.get("article"):
+        time_now = datetime.now().strftime("%Y-%m-%d %H:%M")
+        output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),"result","imitate_result")
+        os.makedirs(output_dir,exist_ok=True)
+        with open(os.path.join(output_dir,f"{state['article'][:10]}_{time_now}_usage.json"),"w",encoding="utf-8") as f:
+            json.dump(report,f,ensure_ascii=False,indent=2)
     return {}
 
-def usage_node(state:imitate_state):
-    if callback.usage_metadata:
-        for key,value in callback.usage_metadata.items():
-            print(f"{key}:\n{value}\n")
-        callback.usage_metadata.clear()
-    return {}
+_imitate_graph_builder = None
+_imitate_graph = None
+
+def get_imitate_graph_builder():
+    """主图的 StateGraph（首次调用时构建，此时才导入 langgraph）。"""
+    global _imitate_graph_builder
+    if _imitate_graph_builder is not None:
+        return _imitate_graph_builder
+    from langgraph.graph import StateGraph,START,END
+    imitate_graph_builder = StateGraph(imitate_state)
+    imitate_graph_builder.add_node("select_node",select_node)
+    imitate_graph_builder.add_node("create_role_imitate_graph",create_role_imitate_graph)
+    imitate_graph_builder.add_node("imitate_v2t_node",imitate_v2t_node)
+    imitate_graph_builder.add_node("imitate_node",imitate_node)
+    imitate_graph_builder.add_node("summarize_node",summarize_node)
+    imitate_graph_builder.add_node("text_fanout_node",text_fanout_node)
+    imitate_graph_builder.add_node("save_to_local",save_to_local)
+    imitate_graph_builder.add_node("usage_node",usage_node)
+    imitate_graph_builder.add_edge(START,"select_node")
+    imitate_graph_builder.add_edge("imitate_v2t_node","create_role_imitate_graph")
+    imitate_graph_builder.add_edge("imitate_v2t_node","summarize_node")
+    imitate_graph_builder.add_edge("text_fanout_node","create_role_imitate_graph")
+    imitate_graph_builder.add_edge("text_fanout_node","summarize_node")
+    imitate_graph_builder.add_conditional_edges("create_role_imitate_graph",fan_out_roles,["imitate_node"])
+    imitate_graph_builder.add_edge("imitate_node","save_to_local")
+    #飞书上传不在图内：save_to_local 只把上传任务写入发件箱，本地保存完成即可结束
+    #总结分支与仿写分支都完成后再统计，用量报告只输出一次且包含全部调用
+    imitate_graph_builder.add_edge(["summarize_node","save_to_local"],"usage_node")
+    imitate_graph_builder.add_edge("usage_node",END)
+    _imitate_graph_builder = imitate_graph_builder
+    return imitate_graph_builder
+
+def get_imitate_graph():
+    """不带检查点的已编译主图，首次使用时编译并在进程内复用。"""
+    global _imitate_graph
+    if _imitate_graph is None:
+        _imitate_graph = get_imitate_graph_builder().compile()
+    return _imitate_graph
+
+#本地检查点：默认保存在 result/checkpoints.sqlite，可用环境变量 MAS_CHECKPOINT_DB 指定
+CHECKPOINT_DB = getenv("MAS_CHECKPOINT_DB") or os.path.join(os.path.dirname(os.path.abspath(__file__)),"result","checkpoints.sqlite")
+
+@asynccontextmanager
+async def open_checkpointer(path:str | None = CHECKPOINT_DB):
+    """打开 SQLite 检查点存储（需要 langgraph-checkpoint-sqlite），path 为空或未安装时返回 None。"""
+    if not path:
+        yield None
+        return
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        print("未安装 langgraph-checkpoint-sqlite，本次运行不保存检查点", flush=True)
+        yield None
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(path) as checkpointer:
+        yield checkpointer
+
+def compile_imitate_graph(checkpointer=None):
+    """带检查点的主图；角色子图不单独指定检查点，运行时继承主图的检查点，各自的每一步保存在所属 Send 任务的命名空间下。"""
+    if checkpointer is None:
+        return get_imitate_graph()
+    return get_imitate_graph_builder().compile(checkpointer=checkpointer)
+
+
+async def resume_run(graph, thread_id:str):
+    """从检查点续跑：已完成的节点（含转文字、已完成的角色及其已完成的步骤）不再重新计算。"""
+    run_config = new_run_config(thread_id)
+    snapshot = await graph.aget_state(run_config)
+    if not snapshot.values:
+        print(f"没有找到 thread_id={thread_id} 的检查点")
+        return None
+    if not snapshot.next:
+        print(f"thread_id={thread_id} 已运行完成，无需续跑")
+        return snapshot.values
+    print(f"从检查点续跑 thread_id={thread_id}，待执行节点: {', '.join(snapshot.next)}")
+    return await graph.ainvoke(None,run_config)
+
+async def main(stream_port: int | None = None, resume: str | None = None, checkpoint_db: str | None = CHECKPOINT_DB,
+               sync_run: str = feishu_sync_run):
+    stream_server = await start_stream_server(port=stream_port) if stream_port else None
+    token_task = prefetch_feishu_token()   # 持有任务引用，避免预取任务被回收
+    outbox_worker = start_feishu_outbox()
+    async with open_checkpointer(checkpoint_db) as checkpointer:
+        #在线程中编译主图（首次导入 langgraph），与等待用户输入重叠，启动后立即显示提示
+        graph_task = asyncio.create_task(asyncio.to_thread(compile_imitate_graph, checkpointer))
+        await asyncio.sleep(0)   #让编译任务先提交到线程池，之后读取输入的 input() 会阻塞事件循环
+        try:
+            if resume:
+                if checkpointer is None:
+                    print("未启用检查点，无法续跑")
+                else:
+                    await resume_run(await graph_task,resume)
+            else:
+                await run_interactive(graph_task,checkpointer is not None,sync_run)
+        finally:
+            if outbox_worker is not None:
+                print("等待后台飞书上传完成…", flush=True)
+                await outbox_worker.stop(drain_timeout=OUTBOX_DRAIN_TIMEOUT)
+            if stream_server is not None:
+                await stream_server.stop()
+    sys.exit(0)
 
-imitate_graph_builder = StateGraph(imitate_state)
-imitate_graph_builder.add_node("select_node",select_node)
-imitate_graph_builder.add_node("create_role_imitate_graph",create_role_imitate_graph)
-imitate_graph_builder.add_node("imitate_v2t_node",imitate_v2t_node)
-imitate_graph_builder.add_node("imitate_node",imitate_node)
-imitate_graph_builder.add_node("summarize_node",summarize_node)
-imitate_graph_builder.add_node("text_fanout_node",text_fanout_node)
-imitate_graph_builder.add_node("save_to_local",save_to_local)
-imitate_graph_builder.add_node("upload2feishu_node",upload2feishu_node)
-imitate_graph_builder.add_node("usage_node",usage_node)
-imitate_graph_builder.add_edge(START,"select_node")
-imitate_graph_builder.add_edge("imitate_v2t_node","create_role_imitate_graph")
-imitate_graph_builder.add_edge("imitate_v2t_node","summarize_node")
-imitate_graph_builder.add_edge("text_fanout_node","create_role_imitate_graph")
-imitate_graph_builder.add_edge("text_fanout_node","summarize_node")
-imitate_graph_builder.add_edge("summarize_node","usage_node")
-imitate_graph_builder.add_edge("create_role_imitate_graph","imitate_node")
-imitate_graph_builder.add_edge("imitate_node","save_to_local")
-imitate_graph_builder.add_edge("save_to_local","upload2feishu_node")
-imitate_graph_builder.add_edge("upload2feishu_node","usage_node")
-imitate_graph_builder.add_edge("usage_node",END)
-imitate_graph = imitate_graph_builder.compile()
-
-
-async def main():
+async def run_interactive(graph_task, checkpointed:bool = False, sync_run:str = ""):
+    """读取模板选择与输入后运行主图；graph_task 为正在编译主图的任务，读取输入期间在后台完成。"""
     role=" ".join([f"({i+1}:{role_list[i]['name']})" for i in range(len(role_list))])
     while True:
         template_choose=input(f"请选择模板{role}\t**默认模板全选(如需全选直接回车)**:\n输入示例：123,12,23,13,1,2,3\n")
@@ -583,10 +735,26 @@ async def main():
     for role in template_choose_list:
         print(f"""已选择*{role["name"]}*模板""")
     user_input = read_multiline("请输入链接或者文章内容（可含空行），结束请输入 /end ：\n 退出请输入quit")
-    imitate_state = {"user_input":user_input,"messages":[],"template_choose_list":template_choose_list,"app_id":app_id,"app_secret":app_secret,"folder_token":folder_token}
-    result = await imitate_graph.ainvoke(imitate_state,config)
-    imitate_state=result
-    sys.exit(0)
+    imitate_state = {"user_input":user_input,"messages":[],"template_choose_list":template_choose_list,"app_id":app_id,"folder_token":folder_token,"feishu_sync":sync_run}
+    run_config = new_run_config()
+    if checkpointed:
+        thread_id = run_config["configurable"]["thread_id"]
+        print(f"本次运行 thread_id: {thread_id}，中断后可用 --resume {thread_id} 续跑")
+    graph = await graph_task
+    return await graph.ainvoke(imitate_state,run_config)
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    parser = argparse.ArgumentParser(description="多角色仿写")
+    parser.add_argument("--stream-port", type=int, default=int(getenv("MAS_STREAM_PORT", "0")) or None,
+                        help="启动本地 SSE 流式输出服务的端口（GET /stream），也可用环境变量 MAS_STREAM_PORT")
+    parser.add_argument("--resume", metavar="THREAD_ID", help="从检查点续跑指定 thread_id 的运行")
+    parser.add_argument("--checkpoint-db", default=CHECKPOINT_DB, help="SQLite 检查点文件路径（也可用环境变量 MAS_CHECKPOINT_DB）")
+    parser.add_argument("--no-checkpoint", action="store_true", help="不保存检查点")
+    parser.add_argument("--feishu-sync", metavar="RUN", default=feishu_sync_run,
+                        help="飞书增量同步的运行名：同一原文与运行名重跑时只修补变化的段（也可用环境变量 MAS_FEISHU_SYNC_RUN）")
+    add_limiter_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    asyncio.run(main(stream_port=args.stream_port, resume=args.resume, checkpoint_db=None if args.no_checkpoint else args.checkpoint_db,
+                     sync_run=args.feishu_sync))
 
@@ -0,0 +1,232 @@
+"""
+批量仿写入口：一个进程、一个事件循环内处理 多篇文章/视频链接 × 多个角色
+- 清单支持 JSONL 与 CSV：
+    JSONL 每行 {"id": "可选", "input": "文章正文或视频链接", "roles": "可选，如 \"123\" 或 [\"小A\", \"小Lin\"]"}
+    CSV 表头需包含 input 列，可选 id、roles 列（roles 写法同上，名称之间用逗号分隔）
+- 链接先经 v2t 转文字（ASR 任务跨来源攒批、共享 ASR 限流），随后每个（文章, 角色）组合各自作为一个任务调度，
+  所有仿写步骤共享全局 LLM 限流器（见 limiters.py）
+- 每完成一个文章解析或一个（文章, 角色）仿写即向输出 JSONL 追加一行（仿写记录带该组合按步骤的用量与延迟），
+  中途中断不丢已完成的结果；整批的用量汇总写在输出文件旁的 <输出名>_usage.json；
+  --skip-done 可跳过输出文件中已完成的组合，便于断点续跑
+
+用法：
+    python imitate_batch.py sources.jsonl --roles 123 --llm-max-inflight 10
+    python imitate_batch.py sources.csv --output result/batch/today.jsonl --skip-done
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import imitate
+from limiters import add_limiter_arguments, configure_from_args, registry
+from stream_hub import start_stream_server
+from template_list import role_list
+from usage_tracker import RunUsageTracker, format_by_step
+
+
+def load_manifest(path: str) -> List[Dict]:
+    """读取 JSONL/CSV 清单，返回 [{"id","input","roles"}]，缺省 id 按行号生成。"""
+    sources = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for i, row in enumerate(rows, start=1):
+        text = (row.get("input") or "").strip()
+        if not text:
+            print(f"清单第 {i} 条缺少 input，已跳过", flush=True)
+            continue
+        sources.append({"id": str(row.get("id") or i), "input": text, "roles": row.get("roles")})
+    return sources
+
+
+def parse_roles(spec, default: Optional[List[Dict]] = None) -> List[Dict]:
+    """解析角色选择：空值使用默认角色；"123" 按序号选择（同交互模式）；名称列表或逗号分隔的名称按名称选择。"""
+    if not spec:
+        return default or role_list
+    if isinstance(spec, int) and not isinstance(spec, bool):
+        spec = str(spec)   # JSON 里写成数字的序号，如 "roles": 123
+    if not isinstance(spec, (str, list)):
+        raise ValueError(f"角色选择应为序号字符串、逗号分隔的名称或名称列表，收到 {type(spec).__name__}")
+    if isinstance(spec, str):
+        spec = spec.strip()
+        if spec.isdigit():
+            invalid = sorted({i for i in spec if not 1 <= int(i) <= len(role_list)})
+            if invalid:
+                raise ValueError(f"角色序号超出范围: {', '.join(invalid)}（可选 1~{len(role_list)}）")
+            return [role_list[int(i) - 1] for i in spec]
+        spec = [name.strip() for name in spec.replace("，", ",").split(",") if name.strip()]
+    by_name = {role["name"]: role for role in role_list}
+    missing = [str(name) for name in spec if not isinstance(name, str) or name not in by_name]
+    if missing:
+        raise ValueError(f"未知角色: {', '.join(missing)}")
+    return [by_name[name] for name in spec]
+
+
+class JsonlSink:
+    """结果输出：每条记录写一行并立即 flush。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: Dict):
+        record.setdefault("time", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def load_done(path: str) -> Set[Tuple[str, str]]:
+    """输出文件中已成功完成的（来源 id, 角色）组合。"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue   # 中断时可能写了半行
+            if record.get("type") == "imitation" and not record.get("error"):
+                done.add((record["id"], record["role"]))
+    return done
+
+
+def is_link(text: str) -> bool:
+    """与单篇流程的 select_node 判断一致：含 http 即视为链接。"""
+    return "http" in text
+
+
+async def resolve_article(source: Dict) -> str:
+    """文章直接返回；链接走 v2t 转文字。"""
+    text = source["input"]
+    if is_link(text):
+        from v2t import main_v2t_no_summary
+        results = await main_v2t_no_summary(imitate.get_model("v2t"), [text])
+        if not results:
+            raise RuntimeError("没有有效的转录结果")
+        return results[0].get("text", "")
+    return text
+
+
+async def imitate_one_role(article: str, role: Dict, batch_usage: Optional[RunUsageTracker] = None) -> Tuple[str, Dict]:
+    """仿写单个角色，返回（正文, 该组合的用量与延迟报告）；batch_usage 同时汇总整批的用量。"""
+    role_graph = imitate.get_role_graph(role)
+    config = imitate.new_run_config(callbacks=[batch_usage] if batch_usage else None)
+    result = await role_graph.ainvoke({"article": article, "role_name": role["name"], "messages": []}, config)
+    return result["final_text"], imitate.usage_tracker_from(config).report(include_calls=False)
+
+
+async def run_source(source: Dict, roles: List[Dict], sink: JsonlSink, done: Set[Tuple[str, str]],
+                     source_sem: asyncio.Semaphore, stats: Dict, batch_usage: Optional[RunUsageTracker] = None):
+    pending_roles = [role for role in roles if (source["id"], role["name"]) not in done]
+    if not pending_roles:
+        stats["skipped"] += len(roles)
+        return
+    stats["skipped"] += len(roles) - len(pending_roles)
+    async with source_sem:
+        start = time.time()
+        try:
+            article = await resolve_article(source)
+        except Exception as e:
+            print(f"[{source['id']}] 解析失败: {e}", flush=True)
+            sink.write({"type": "article", "id": source["id"], "input": source["input"], "error": str(e)})
+            stats["failed"] += len(pending_roles)
+            return
+        sink.write({"type": "article", "id": source["id"], "input": source["input"], "article": article,
+                    "elapsed_s": round(time.time() - start, 2)})
+
+        async def _one(role: Dict):
+            role_start = time.time()
+            record = {"type": "imitation", "id": source["id"], "role": role["name"]}
+            try:
+                record["text"], record["usage"] = await imitate_one_role(article, role, batch_usage)
+                stats["succeeded"] += 1
+            except Exception as e:
+                record["error"] = str(e)
+                stats["failed"] += 1
+                print(f"[{source['id']}/{role['name']}] 仿写失败: {e}", flush=True)
+            record["elapsed_s"] = round(time.time() - role_start, 2)
+            sink.write(record)
+            print(f"[{source['id']}/{role['name']}] 完成（{stats['succeeded'] + stats['failed']}/{stats['total']}）"
+                  f" 限流状态: {registry.snapshot()}", flush=True)
+
+        await asyncio.gather(*(_one(role) for role in pending_roles))
+
+
+async def main_batch(manifest: str, output: Optional[str] = None, roles_spec=None,
+                     max_sources: int = 8, skip_done: bool = False, stream_port: Optional[int] = None) -> Dict:
+    """批量仿写主流程，返回统计信息。
+
+    Args:
+        manifest: JSONL/CSV 清单路径
+        output: 输出 JSONL 路径，默认 result/imitate_batch/batch_<时间>.jsonl
+        roles_spec: 清单未指定 roles 时使用的默认角色选择
+        max_sources: 同时处理的来源数上限（限制内存与转写并发，LLM 调用另受全局限流）
+        skip_done: 跳过输出文件中已成功完成的（来源, 角色）组合
+        stream_port: 设置后启动本地 SSE 流式输出服务（见 stream_hub.py）
+    """
+    sources = load_manifest(manifest)
+    default_roles = parse_roles(roles_spec)
+    if output is None:
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result", "imitate_batch",
+                              f"batch_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.jsonl")
+    done = load_done(output) if skip_done else set()
+    plan = [(source, parse_roles(source["roles"], default_roles)) for source in sources]
+    stats = {"total": sum(len(roles) for _, roles in plan), "succeeded": 0, "failed": 0, "skipped": 0}
+    print(f"批量仿写：{len(sources)} 个来源，共 {stats['total']} 个（来源, 角色）组合，输出到 {output}", flush=True)
+
+    sink = JsonlSink(output)
+    stream_server = await start_stream_server(port=stream_port) if stream_port else None
+    source_sem = asyncio.Semaphore(max_sources)
+    batch_usage = RunUsageTracker(run_id=os.path.basename(output))
+    start = time.time()
+    try:
+        await asyncio.gather(*(run_source(source, roles, sink, done, source_sem, stats, batch_usage)
+                               for source, roles in plan))
+    finally:
+        sink.close()
+        if stream_server is not None:
+            await stream_server.stop()
+        if any(is_link(source["input"]) for source in sources):
+            from v2t import aclose_http_client
+            await aclose_http_client()
+    stats["elapsed_s"] = round(time.time() - start, 2)
+    stats["prompt_cache"] = imitate.cache_usage_report(batch_usage.usage_metadata)
+    print(f"批量仿写完成: {stats}", flush=True)
+    # 整批按（角色, 步骤）汇总的用量与延迟，写在输出 JSONL 旁
+    report = batch_usage.report(include_calls=False)
+    report["prompt_cache"] = stats["prompt_cache"]
+    for line in format_by_step(report):
+        print(line, flush=True)
+    with open(os.path.splitext(output)[0] + "_usage.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量仿写：清单中的 文章/链接 × 角色")
+    parser.add_argument("manifest", help="JSONL 或 CSV 清单路径")
+    parser.add_argument("--output", help="输出 JSONL 路径（默认 result/imitate_batch/batch_<时间>.jsonl）")
+    parser.add_argument("--roles", help="默认角色选择，如 123 或 小A,小Lin（清单中的 roles 优先）")
+    parser.add_argument("--max-sources", type=int, default=8, help="同时处理的来源数上限")
+    parser.add_argument("--skip-done", action="store_true", help="跳过输出文件中已成功完成的组合")
+    parser.add_argument("--stream-port", type=int, help="启动本地 SSE 流式输出服务的端口（GET /stream）")
+    add_limiter_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    try:
+        asyncio.run(main_batch(args.manifest, output=args.output, roles_spec=args.roles,
+                               max_sources=args.max_sources, skip_done=args.skip_done, stream_port=args.stream_port))
+    except ValueError as e:   # 角色选择或清单内容有误
+        parser.error(str(e))
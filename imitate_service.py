@@ -0,0 +1,240 @@
+"""
+常驻仿写服务：一个进程内持续接收仿写请求，避免每篇文章都付出 Python / LangChain 冷启动的开销
+- 任务先进入有界内存队列，队列满时提交接口返回 429，由前端稍后重试
+- 固定数量的 worker 协程从队列取任务执行主图的 ainvoke；ChatOpenAI 客户端（imitate._models）
+  与编译好的主图/角色子图在进程内复用，LLM 调用仍受全局限流器约束（见 limiters.py）
+- 每个任务使用独立的 RunnableConfig（thread_id 即任务 ID、独立的 RunUsageTracker），并通过 stream_hub.current_run
+  给流式帧打上任务 ID，多个任务并发时各自的输出与用量互不混淆
+- 已结束的任务最多保留 --keep-jobs 个，超出后按结束顺序淘汰
+- upload 为 true 的任务在本地保存后即结束，飞书上传由发件箱 worker 在后台完成（见 feishu_outbox.py）
+
+接口：
+    POST /jobs                 {"input": "文章正文或视频链接", "roles": "可选，如 \"123\" 或 [\"小A\"]", "upload": false,
+                                "sync_run": "可选，飞书增量同步的运行名（默认取 MAS_FEISHU_SYNC_RUN）"}
+                               -> 202 {"job_id": "...", "status": "queued", "position": 队列中的位置}
+    GET  /jobs/{job_id}        任务状态、时间戳与错误信息
+    GET  /jobs/{job_id}/stream 该任务的 SSE 流式输出（事件格式见 stream_hub.py）
+    GET  /jobs/{job_id}/result 仿写结果、原文与用量/延迟报告（见 usage_tracker.py；任务未完成时返回 409）
+    GET  /health               队列长度、各状态任务数、限流器、流式订阅与飞书上传发件箱情况
+
+用法：
+    python imitate_service.py --port 8080 --workers 2 --queue-size 32
+本地联调可配合 scripts/fake_openai_server.py，把 OPENROUTER_BASE_URL 指向假服务即可，无需真实密钥。
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from os import getenv
+from typing import Dict, Optional
+
+from aiohttp import web
+
+import imitate
+from imitate_batch import parse_roles
+from limiters import add_limiter_arguments, configure_from_args, registry
+from stream_hub import current_run, get_stream_hub, sse_response
+
+
+class Job:
+    """单个仿写任务的状态：queued -> running -> succeeded / failed。"""
+
+    def __init__(self, user_input: str, roles: list, upload: bool = False, sync_run: str = ""):
+        self.id = uuid.uuid4().hex
+        self.user_input = user_input
+        self.roles = roles
+        self.upload = upload
+        self.sync_run = sync_run
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.result: Optional[Dict] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.config = None
+        self.usage = None
+
+    def info(self) -> Dict:
+        return {"job_id": self.id, "status": self.status, "error": self.error,
+                "roles": [role["name"] for role in self.roles], "created_at": self.created_at,
+                "started_at": self.started_at, "finished_at": self.finished_at}
+
+    def initial_state(self) -> Dict:
+        # 仅在请求上传时填入飞书应用与目录，其余任务的 save_to_local 不会把结果写入飞书上传发件箱；
+        # app_secret 不放进状态（检查点会落盘），上传 worker 从 imitate 的模块配置读取
+        feishu = (imitate.app_id, imitate.folder_token) if self.upload else ("", "")
+        return {"user_input": self.user_input, "messages": [], "template_choose_list": self.roles,
+                "app_id": feishu[0] or "", "folder_token": feishu[1] or "",
+                "feishu_sync": self.sync_run}
+
+
+class ImitateService:
+    """任务队列 + worker 池 + HTTP 接口。
+
+    Args:
+        workers: 同时执行的任务数（单个任务内各角色仍并发，LLM 调用另受全局限流）
+        queue_size: 排队任务数上限，超出时拒绝提交
+        keep_jobs: 保留的已结束任务数上限
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 32, keep_jobs: int = 200):
+        self.workers = workers
+        self.keep_jobs = keep_jobs
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._tasks = []
+        self._runner = None
+        self._token_task = None
+        self._outbox_worker = None
+
+    def submit(self, user_input: str, roles_spec=None, upload: bool = False, sync_run: Optional[str] = None) -> Job:
+        job = Job(user_input, parse_roles(roles_spec), upload,
+                  imitate.feishu_sync_run if sync_run is None else sync_run)
+        self.queue.put_nowait(job)   # 队列已满时抛出 asyncio.QueueFull
+        self.jobs[job.id] = job
+        return job
+
+    async def _execute(self, job: Job):
+        job.status, job.started_at = "running", time.time()
+        # 开始执行时才创建 config，用量报告中的耗时不含排队时间
+        job.config = imitate.new_run_config(job.id)
+        job.usage = imitate.usage_tracker_from(job.config)
+        current_run.set(job.id)
+        try:
+            state = await imitate.get_imitate_graph().ainvoke(job.initial_state(), job.config)
+            job.result = {"each_role_text": state.get("each_role_text", {}), "article": state.get("article", ""),
+                          "usage": job.usage.report(),
+                          "prompt_cache": imitate.cache_usage_report(job.usage.usage_metadata)}
+            job.status = "succeeded"
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            print(f"[{job.id}] 仿写失败: {e}", flush=True)
+        finally:
+            job.finished_at = time.time()
+            self._retire(job)
+        print(f"[{job.id}] {job.status}，耗时 {job.finished_at - job.started_at:.2f}s", flush=True)
+
+    def _retire(self, job: Job):
+        self._finished[job.id] = None
+        while len(self._finished) > self.keep_jobs:
+            old_id, _ = self._finished.popitem(last=False)
+            self.jobs.pop(old_id, None)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                # 每个任务在独立的上下文中运行，current_run 不会串到下一个任务
+                await asyncio.create_task(self._execute(job))
+            finally:
+                self.queue.task_done()
+
+    def _get_job(self, request) -> Job:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text="job not found")
+        return job
+
+    async def handle_submit(self, request):
+        try:
+            body = await request.json()
+        except Exception:
+            raise web.HTTPBadRequest(text="body must be JSON")
+        user_input = (body.get("input") or "").strip()
+        if not user_input:
+            raise web.HTTPBadRequest(text="input is required")
+        try:
+            job = self.submit(user_input, body.get("roles"), bool(body.get("upload")), body.get("sync_run"))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        except asyncio.QueueFull:
+            return web.json_response({"error": "queue full"}, status=429, headers={"Retry-After": "5"})
+        return web.json_response({"job_id": job.id, "status": job.status, "position": self.queue.qsize()}, status=202)
+
+    async def handle_status(self, request):
+        return web.json_response(self._get_job(request).info())
+
+    async def handle_stream(self, request):
+        job = self._get_job(request)
+        return await sse_response(request, get_stream_hub(), role=request.query.get("role") or None, run=job.id)
+
+    async def handle_result(self, request):
+        job = self._get_job(request)
+        if job.status == "failed":
+            return web.json_response({**job.info()}, status=500)
+        if job.status != "succeeded":
+            return web.json_response({**job.info()}, status=409)
+        return web.json_response({**job.info(), **job.result})
+
+    async def handle_health(self, request):
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        outbox = None
+        if self._outbox_worker is not None:
+            outbox = {**self._outbox_worker.outbox.stats(), "uploaded": self._outbox_worker.uploaded}
+        return web.json_response({"ok": True, "queued": self.queue.qsize(), "workers": self.workers, "jobs": counts,
+                                  "limiters": registry.snapshot(), "stream": get_stream_hub().stats(),
+                                  "feishu_outbox": outbox})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/jobs", self.handle_submit)
+        app.router.add_get("/jobs/{job_id}", self.handle_status)
+        app.router.add_get("/jobs/{job_id}/stream", self.handle_stream)
+        app.router.add_get("/jobs/{job_id}/result", self.handle_result)
+        app.router.add_get("/health", self.handle_health)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        # 预先编译主图与各角色子图、创建仿写客户端、预取飞书令牌，首个请求不再承担初始化开销
+        imitate.get_model("imitate")
+        imitate.get_imitate_graph()
+        for role in imitate.role_list:
+            imitate.get_role_graph(role)
+        self._token_task = imitate.prefetch_feishu_token()
+        self._outbox_worker = imitate.start_feishu_outbox()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f"仿写服务已启动: http://{host}:{port}（worker {self.workers} 个，队列上限 {self.queue.maxsize}）", flush=True)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._outbox_worker is not None:
+            await self._outbox_worker.stop()   # 正在上传的任务交还发件箱，下次启动时续传
+            self._outbox_worker = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(host: str, port: int, workers: int, queue_size: int, keep_jobs: int):
+    service = ImitateService(workers=workers, queue_size=queue_size, keep_jobs=keep_jobs)
+    await service.start(host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="常驻仿写服务（任务队列 + HTTP 接口）")
+    parser.add_argument("--host", default=getenv("MAS_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(getenv("MAS_SERVICE_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=2, help="同时执行的任务数")
+    parser.add_argument("--queue-size", type=int, default=32, help="排队任务数上限，超出时返回 429")
+    parser.add_argument("--keep-jobs", type=int, default=200, help="保留的已结束任务数上限")
+    add_limiter_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue_size, args.keep_jobs))
+    except KeyboardInterrupt:
+        print("仿写服务已停止", flush=True)
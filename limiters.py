@@ -0,0 +1,225 @@
+"""
+按后端区分的并发/限流器注册表
+- ASR 侧：限制同时在途的转录任务数（max_in_flight）
+- LLM 侧：在 max_in_flight 之外再叠加令牌桶限速，按每秒请求数（rps）与每分钟 token 数（tpm）限流
+- 飞书侧：文档写入接口按 3 QPS 限流（见 feishu_uploader.py）
+- 限流器不在导入时绑定事件循环，等待队列在使用时于当前事件循环中创建
+- 等待者可按 key（如角色名）分队列，名额释放时在各队列之间轮转分配，避免某个角色的连续请求饿死其他角色
+- 名称形如 "llm:openrouter" 的限流器按提供方独立限流，未单独配置的项继承 "llm" 的配置
+- snapshot() 暴露各限流器的在途数与排队数，便于监控
+
+配置优先级：代码/命令行显式配置 > 环境变量 > 默认值。环境变量按限流器名称大写拼接：
+    MAS_LIMIT_<NAME>_MAX_INFLIGHT / MAS_LIMIT_<NAME>_RPS / MAS_LIMIT_<NAME>_TPM / MAS_LIMIT_<NAME>_BURST
+例如 MAS_LIMIT_LLM_MAX_INFLIGHT=8、MAS_LIMIT_LLM_TPM=200000、MAS_LIMIT_ASR_MAX_INFLIGHT=5、
+MAS_LIMIT_LLM_OPENROUTER_MAX_INFLIGHT=10（名称中的 ":" 替换为 "_"）
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from os import getenv
+from typing import Dict, Optional
+
+DEFAULT_LIMITS = {
+    "asr": {"max_in_flight": 5},
+    "llm": {"max_in_flight": 8},
+    "feishu": {"max_in_flight": 3, "rps": 3, "burst": 1},   # 飞书文档块接口的频率限制，按固定间隔发出不突发
+}
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数，capacity 为桶容量（允许的突发量）。
+
+    取令牌时先扣减，余额为负则按欠额等待，多个等待者自然按到达顺序排队。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take(self, amount: float = 1):
+        self._refill()
+        self._level -= min(amount, self.capacity)
+        if self._level < 0:
+            await asyncio.sleep(-self._level / self.rate)
+
+
+class Limiter:
+    """单个后端的限流器，用法：async with limiter.slot(tokens=预估token数, key=公平调度键): ...
+
+    名额用满时等待者按 key 分队列，释放名额时在各 key 之间轮转，同一 key 内先到先得。
+
+    Args:
+        name: 限流器名称
+        max_in_flight: 最大在途请求数，None 表示不限
+        rps: 每秒请求数上限，None 表示不限
+        tpm: 每分钟 token 数上限，None 表示不限
+        burst: rps 令牌桶的容量（允许的突发请求数），默认与 rps 相同
+    """
+
+    def __init__(self, name: str, max_in_flight: Optional[int] = None,
+                 rps: Optional[float] = None, tpm: Optional[float] = None, burst: Optional[float] = None):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.rps = rps
+        self.tpm = tpm
+        self._request_bucket = TokenBucket(rps, max(1.0, burst or rps)) if rps else None
+        self._token_bucket = TokenBucket(tpm / 60.0, tpm) if tpm else None
+        self._queues: "OrderedDict[object, deque]" = OrderedDict()   # key -> 等待者队列，顺序即轮转顺序
+        self.in_flight = 0
+        self.waiting = 0
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, tokens: float = 0, key=None):
+        self.waiting += 1
+        try:
+            if self.max_in_flight and (self.in_flight >= self.max_in_flight or self._queues):
+                # 释放时直接把名额交给轮转到的等待者，in_flight 不变
+                waiter = asyncio.get_running_loop().create_future()
+                self._queues.setdefault(key, deque()).append(waiter)
+                try:
+                    await waiter
+                except BaseException:
+                    if waiter.done() and not waiter.cancelled():
+                        self.release()
+                    else:
+                        self._discard(key, waiter)
+                    raise
+            else:
+                self.in_flight += 1
+        finally:
+            self.waiting -= 1
+        try:
+            if self._request_bucket is not None:
+                await self._request_bucket.take(1)
+            if self._token_bucket is not None and tokens:
+                await self._token_bucket.take(tokens)
+        except BaseException:
+            self.release()
+            raise
+
+    def _discard(self, key, waiter):
+        queue = self._queues.get(key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[key]
+
+    def release(self):
+        while self._queues:
+            # 取轮转顺序中第一个 key 的队首，该 key 若仍有等待者则移到末尾
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if not waiter.done():
+                waiter.set_result(None)   # 名额直接移交，in_flight 不变
+                return
+        self.in_flight -= 1
+
+    def slot(self, tokens: float = 0, key=None):
+        return _Slot(self, tokens, key)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "waiting": self.waiting, "max_in_flight": self.max_in_flight,
+                "rps": self.rps, "tpm": self.tpm,
+                "waiting_by_key": {str(k): len(q) for k, q in self._queues.items()}}
+
+
+class _Slot:
+    def __init__(self, limiter: Limiter, tokens: float, key=None):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.key = key
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.tokens, self.key)
+        return self.limiter
+
+    async def __aexit__(self, *exc):
+        self.limiter.release()
+
+
+class LimiterRegistry:
+    """按名称管理限流器，首次获取时按 显式配置 > 环境变量 > 默认值 创建。"""
+
+    def __init__(self):
+        self._limiters: Dict[str, Limiter] = {}
+        self._overrides: Dict[str, dict] = {}
+
+    def configure(self, name: str, **limits):
+        """显式配置某个限流器（值为 None 的项忽略），已创建的实例会被替换。"""
+        self._overrides.setdefault(name, {}).update({k: v for k, v in limits.items() if v is not None})
+        # 派生的提供方限流器（如 llm:openrouter）同样需要按新配置重建
+        for existing in [n for n in self._limiters if n == name or n.startswith(name + ":")]:
+            self._limiters.pop(existing, None)
+
+    def _resolve_limits(self, name: str) -> dict:
+        # "llm:openrouter" 先继承 "llm" 的 默认值/环境变量/显式配置，再叠加自身的配置
+        names = [name.split(":")[0], name] if ":" in name else [name]
+        limits = {}
+        for item in names:
+            limits.update(DEFAULT_LIMITS.get(item, {}))
+            prefix = f"MAS_LIMIT_{item.upper().replace(':', '_')}_"
+            for key, env_key, cast in (("max_in_flight", "MAX_INFLIGHT", int), ("rps", "RPS", float),
+                                       ("tpm", "TPM", float), ("burst", "BURST", float)):
+                value = getenv(prefix + env_key)
+                if value:
+                    limits[key] = cast(value)
+            limits.update(self._overrides.get(item, {}))
+        return limits
+
+    def get(self, name: str) -> Limiter:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = Limiter(name, **self._resolve_limits(name))
+            self._limiters[name] = limiter
+        return limiter
+
+    def snapshot(self) -> Dict[str, dict]:
+        """各限流器当前的在途数与排队数。"""
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+registry = LimiterRegistry()
+
+
+def get_limiter(name: str) -> Limiter:
+    return registry.get(name)
+
+
+def add_limiter_arguments(parser):
+    """为 argparse 命令行添加 ASR/LLM 限流参数。"""
+    parser.add_argument("--asr-max-inflight", type=int, help="同时在途的转录任务数上限")
+    parser.add_argument("--llm-max-inflight", type=int, help="同时在途的 LLM 请求数上限")
+    parser.add_argument("--llm-rps", type=float, help="LLM 每秒请求数上限")
+    parser.add_argument("--llm-tpm", type=float, help="LLM 每分钟 token 数上限")
+    parser.add_argument("--provider-max-inflight", action="append", default=[], metavar="PROVIDER=N",
+                        help="单个 LLM 提供方的在途请求数上限，可重复，如 openrouter=8")
+    return parser
+
+
+def configure_from_args(args):
+    """把 add_limiter_arguments 解析出的参数写入全局注册表。"""
+    registry.configure("asr", max_in_flight=args.asr_max_inflight)
+    registry.configure("llm", max_in_flight=args.llm_max_inflight, rps=args.llm_rps, tpm=args.llm_tpm)
+    for item in getattr(args, "provider_max_inflight", None) or []:
+        provider, _, value = item.partition("=")
+        registry.configure(f"llm:{provider.strip()}", max_in_flight=int(value))
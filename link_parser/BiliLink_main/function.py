@@ -103,6 +103,7 @@ async def BiliAnalysis(BV, p=1):
         'BV': BV,
         'page': p + 1,
         'url': VideoInfo['data']['durl'][0]['url'],
+        'duration': VideoInfo['data']['durl'][0].get('length', 0) / 1000,  # 秒
     }
     return Video
 
@@ -202,7 +203,8 @@ async def parse_bilibili_share_link(share_url: str):
         return {
             'bvid': bvid,
             'page': p,
-            'time': t
+            'time': t,
+            'url': share_url,  # 短链展开后的真实地址
         }
         
     except Exception as e:
@@ -232,7 +234,9 @@ async def get_video_public_url(share_url: str):
             'bvid': parsed_info['bvid'],
             'page': parsed_info['page'],
             'public_url': public_url,
-            'time': parsed_info['time']
+            'time': parsed_info['time'],
+            'duration': video_info.get('duration'),
+            'url': parsed_info['url'],
         }
         
         return result
@@ -0,0 +1,22 @@
+"""
+LLM 模型配置与按提供方的限流器
+- 仿写、转录纠错、文本总结共用；只依赖 limiters，不导入 langchain_openai / langgraph，v2t、text_summary 可直接引用
+- 每个模型的 LLM 调用向其提供方的限流器（如 llm:openrouter）申请名额，同一提供方的调用共享在途数与速率上限
+"""
+from limiters import get_limiter
+
+#模型客户端参数；ChatOpenAI（含 openai SDK）导入较慢，首次调用 imitate.get_model 时才创建
+#prompt_cache：提供方支持在消息内容块上标注 cache_control（OpenRouter 的 Gemini/Claude、DashScope 显式缓存）
+MODEL_CONFIGS = {
+    "dashscope": dict(model_name="qwen-plus-latest", temperature=1, api_key_env="DASH_SCOPE_API_KEY",
+                      base_url_env="DASH_SCOPE_BASE_URL", streaming=True, provider="dashscope", prompt_cache=True),
+    "correct": dict(model_name="google/gemini-2.5-flash-lite", temperature=0.5, streaming=False, provider="openrouter", prompt_cache=True),
+    "openrouter1": dict(model_name="google/gemini-2.5-flash-lite", temperature=1, streaming=True, provider="openrouter", prompt_cache=True),
+    "summarize": dict(model_name="google/gemini-2.5-flash-lite", temperature=1, streaming=True, provider="openrouter", prompt_cache=True),
+}
+MODEL_ALIASES = {"v2t": "correct", "imitate": "openrouter1"}
+
+
+def get_model_limiter(name: str):
+    """模型所属提供方的 LLM 限流器（如 llm:openrouter），未单独配置时继承 llm 的限流参数。"""
+    return get_limiter(f"llm:{MODEL_CONFIGS[MODEL_ALIASES.get(name, name)]['provider']}")
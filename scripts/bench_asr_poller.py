@@ -0,0 +1,134 @@
+"""
+转录轮询基准：在假 DashScope 转录服务上检查媒体时长是否从解析阶段传到轮询调度器（asr_engine）
+- 假服务按“媒体时长 × 处理速度”完成任务，统计每个任务被查询（fetch）的次数与完成后多久才被发现
+- 两条流水线（v2t.v2t_stream）转录同一批视频：直链直接转录（时长未知，按轮询次数指数退避）vs
+  B站链接经解析得到直链与时长（解析器为假实现）后转录（按预估处理耗时等待）
+- 校验后者每个任务都带上了时长，且查询次数少于前者
+- 时间按 --scale 缩放：调度器的轮询间隔与假服务的处理耗时同比例缩小，便于快速运行
+
+用法（在仓库根目录执行）：
+    python scripts/bench_asr_poller.py
+    python scripts/bench_asr_poller.py --videos 50 --scale 0.005
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+import uuid
+from http import HTTPStatus
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["V2T_CACHE"] = "0"
+os.environ["V2T_ASR_BATCH_SIZE"] = "1"   # 每个视频单独一个任务，便于按时长比较
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import asr_engine
+import v2t
+from link_parser.BiliLink_main import function
+
+# 基准只测本地开销，关闭 LangSmith 追踪（v2t 导入时会打开）
+for _key in ("LANGSMITH_TRACING_V2", "LANGCHAIN_TRACING_V2", "LANGSMITH_TRACING", "LANGCHAIN_TRACING"):
+    os.environ[_key] = "false"
+
+
+class _Output(dict):
+    """模拟 SDK 的输出对象：既可按属性也可按键取值。"""
+
+    def __getattr__(self, name):
+        return self.get(name)
+
+
+class FakeTranscription:
+    """假 DashScope 转录服务：任务在 提交时间 + 媒体时长 × speed 之后完成。"""
+
+    def __init__(self, durations, speed):
+        self.durations = durations    # 直链 -> 媒体时长（秒）
+        self.speed = speed
+        self.tasks = {}               # task_id -> [完成时间, file_urls, 查询次数, 发现完成的时间]
+
+    def async_call(self, model, file_urls, language_hints=None):
+        task_id = uuid.uuid4().hex
+        seconds = max(self.durations[url] for url in file_urls) * self.speed * random.uniform(0.8, 1.2)
+        self.tasks[task_id] = [time.monotonic() + seconds, file_urls, 0, None]
+        return SimpleNamespace(status_code=HTTPStatus.OK,
+                               output=_Output(task_id=task_id, task_status="PENDING", results=None))
+
+    def fetch(self, task):
+        record = self.tasks[task]
+        record[2] += 1
+        if time.monotonic() < record[0]:
+            return SimpleNamespace(status_code=HTTPStatus.OK, output=_Output(task_id=task, task_status="RUNNING"))
+        record[3] = record[3] or time.monotonic()
+        results = [{"file_url": url, "subtask_status": "SUCCEEDED", "transcription_url": "", "text": f"{url} 的转录文本"}
+                   for url in record[1]]
+        return SimpleNamespace(status_code=HTTPStatus.OK,
+                               output=_Output(task_id=task, task_status="SUCCEEDED", results=results))
+
+
+class RecordingPoller(asr_engine.TranscriptionPoller):
+    """记录每个任务提交时收到的媒体时长。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.durations = []
+
+    async def transcribe(self, file_urls, duration=None, label=""):
+        self.durations.append(duration)
+        return await super().transcribe(file_urls, duration=duration, label=label)
+
+
+async def _run_pipeline(fake, urls, resolve, scale):
+    poller = RecordingPoller(min_interval=1.0 * scale, max_interval=20.0 * scale, realtime_factor=0.1 * scale)
+    loop = asyncio.get_running_loop()
+    asr_engine._pollers[loop] = poller
+    asr_engine._submitters.pop(loop, None)     # 攒批提交器按事件循环缓存，换用新的调度器
+    fake.tasks.clear()
+    llm = GenericFakeChatModel(messages=itertools.cycle([AIMessage(content="纠错后的文本")]))
+    results = [r async for r in v2t.v2t_stream(llm, urls, resolve=resolve)]
+    tasks = list(fake.tasks.values())
+    fetches = sum(t[2] for t in tasks)
+    lag = sum(t[3] - t[0] for t in tasks) / len(tasks) / scale
+    return len(results), fetches, lag, poller.durations
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="转录轮询基准")
+    parser.add_argument("--videos", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.01, help="时间缩放比例（1 为真实时间）")
+    args = parser.parse_args()
+
+    random.seed(0)
+    durations = {f"https://upos-sz-mirrorcos.bilivideo.com/video{i}.m4s": random.uniform(120, 1800)
+                 for i in range(args.videos)}
+    direct_urls = list(durations)
+    share_urls = [f"https://www.bilibili.com/video/BV{i:010d}" for i in range(args.videos)]
+    resolved = dict(zip(share_urls, direct_urls))
+    fake = FakeTranscription(durations, speed=0.1 * args.scale)
+    asr_engine._transcription = lambda: fake
+
+    async def fake_public_url(share_url):
+        return {"public_url": resolved[share_url], "duration": durations[resolved[share_url]]}
+
+    function.get_video_public_url = fake_public_url
+
+    unknown = await _run_pipeline(fake, direct_urls, False, args.scale)
+    known = await _run_pipeline(fake, share_urls, True, args.scale)
+
+    print(f"\n{args.videos} 个视频（时长 2~30 分钟），时间缩放 {args.scale}")
+    print(f"{'方式':<18} {'完成数':>6} {'查询次数':>8} {'完成后平均发现延迟(折算秒)':>14}")
+    for name, (done, fetches, lag, _) in (("直链（时长未知）", unknown), ("解析得到时长", known)):
+        print(f"{name:<18} {done:>6} {fetches:>8} {lag:>14.1f}")
+    all_known = len(known[3]) == args.videos and all(d for d in known[3])
+    print(f"解析得到时长的任务都带上了时长: {all_known}，查询次数减少: {unknown[1] - known[1]}")
+    ok = unknown[0] == known[0] == args.videos and all_known and known[1] < unknown[1]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
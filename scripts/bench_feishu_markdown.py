@@ -0,0 +1,100 @@
+"""
+Markdown → 飞书块 转换基准：测量 feishu_markdown.markdown_to_blocks 单遍编译
+- 生成接近真实角色输出的 Markdown（标题、含空行的松散列表、表格、代码块、引用、行内粗体/斜体/链接），
+  默认约 100 KB，并按 1x/2x/4x 体积测量，检查耗时随输入线性增长
+- 同时统计块数、原生列表块数与带样式的文本片段数
+
+用法（在仓库根目录执行）：
+    python scripts/bench_feishu_markdown.py
+    python scripts/bench_feishu_markdown.py --kb 200 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feishu_markdown import BLOCK_BULLET, BLOCK_ORDERED, markdown_to_blocks
+
+
+def sample_markdown(kb: int) -> str:
+    """约 kb KB（UTF-8）的角色输出样例。"""
+    sections, i = [], 0
+    while sum(len(s.encode("utf-8")) for s in sections) < kb * 1024:
+        sections.append("\n".join([
+            f"## 第{i}节：市场情绪与个人财富",
+            "",
+            f"这一节先说结论：**长期持有**比*频繁交易*更重要，数据见 [报告{i}](https://example.com/r/{i}?a=1&b=2)。",
+            "很多人忽略了 `复利` 的力量，也忽略了 ~~短期波动~~ 背后的噪音。",
+            "",
+            "1. 第一点：控制仓位",
+            "",
+            "2. 第二点：**分散**配置，避免单一资产",
+            "",
+            "3. 第三点：定期复盘",
+            "",
+            "| 资产 | 年化收益 | 波动 |",
+            "| --- | --- | --- |",
+            f"| 股票 | {i % 9 + 3}% | **高** |",
+            "| 债券 | 3% | 低 |",
+            "",
+            "```python",
+            "def rebalance(portfolio):",
+            "",
+            "    return {k: v / sum(portfolio.values()) for k, v in portfolio.items()}",
+            "```",
+            "",
+            "> 引用：市场短期是投票机，长期是称重机。",
+            "",
+            "- 要点一，*斜体*补充",
+            "- 要点二",
+            "",
+            "最后一段，语气轻松，结合具体案例展开，把上面的观点串起来。" * 3,
+        ]))
+        i += 1
+    return "\n\n".join(sections)
+
+
+def styled_runs(blocks: list) -> int:
+    count = 0
+    for block in blocks:
+        payload = next((v for v in block.values() if isinstance(v, dict) and "elements" in v), {})
+        for element in payload.get("elements", []):
+            style = element.get("text_run", {}).get("text_element_style", {})
+            count += any(style.get(k) for k in ("italic", "strikethrough", "inline_code", "link"))
+    return count
+
+
+def best_of(repeat: int, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown → 飞书块 转换基准")
+    parser.add_argument("--kb", type=int, default=100, help="单个角色输出的大小（KB）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项取最好成绩的重复次数")
+    args = parser.parse_args()
+
+    print(f"{'体积':>8} {'单遍编译':>10} {'块数':>8} {'ms/KB':>9}")
+    per_kb = []
+    for scale in (1, 2, 4):
+        text = sample_markdown(args.kb * scale)
+        size_kb = len(text.encode("utf-8")) / 1024
+        new_time, new_blocks = best_of(args.repeat, lambda t: list(markdown_to_blocks(t)), text)
+        per_kb.append(new_time * 1000 / size_kb)
+        print(f"{size_kb:7.0f}K {new_time * 1000:8.1f}ms {len(new_blocks):8} {per_kb[-1]:9.3f}")
+
+    new_blocks = list(markdown_to_blocks(sample_markdown(args.kb)))
+    list_items = sum(1 for b in new_blocks if b["block_type"] in (BLOCK_BULLET, BLOCK_ORDERED))
+    print(f"\n{args.kb}KB 样例：列表项 {list_items} 个（原生列表块），带斜体/删除线/行内代码/链接样式的片段 {styled_runs(new_blocks)} 个")
+    print(f"单遍编译每 KB 耗时随体积变化: {' → '.join(f'{v:.3f}' for v in per_kb)} ms（接近常数即线性）")
+
+
+if __name__ == "__main__":
+    main()
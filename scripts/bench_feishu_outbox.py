@@ -0,0 +1,179 @@
+"""
+飞书上传发件箱基准：在本地假飞书文档服务（见 bench_feishu_upload.py）上检查 feishu_outbox
+- 关键路径：保存节点写入发件箱的耗时 vs 原先在图内等待整篇上传的耗时
+- 进程重启：worker 上传到一半被停止（正在上传的任务交还队列），另一条记录被领取后进程“崩溃”（租约未释放），
+  新的 worker 启动后在租约过期时接手，最终每条记录恰好对应一篇文档
+- 失败重试：写入正文的请求被拒绝后按退避重新排队，重试在已创建的同一篇文档上续传，不产生重复文档
+- 并发：worker 同时上传的任务数不超过 --concurrency
+- 同步模式（sync_run）：首次同步写入正文失败、之后对同一篇文档的增量修补再失败一次，重试都在同一篇文档上
+  从同步记录继续，不产生孤立文档，结果与整篇上传一致
+- 中途被杀：每请求块数上限调小使一篇文档分多次写入，确认写入 --kill-after 次后 worker 被停止 / 进程崩溃，
+  重试从已落盘的进度继续，所有写请求加起来与一次完整上传相同（没有块被写两次）
+
+用法（在仓库根目录执行）：
+    python scripts/bench_feishu_outbox.py
+    python scripts/bench_feishu_outbox.py --jobs 10 --concurrency 3 --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from bench_feishu_upload import FakeFeishuDocx, sample_contents
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="飞书上传发件箱基准")
+    parser.add_argument("--jobs", type=int, default=6, help="排队的上传任务数")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="假服务每个请求的往返延迟（秒）")
+    parser.add_argument("--port", type=int, default=18092)
+    parser.add_argument("--kill-after", type=int, default=3, help="中途被杀前已确认的写请求数")
+    args = parser.parse_args()
+    os.environ["MAS_FEISHU_SYNC_DB"] = os.path.join(tempfile.mkdtemp(), "feishu_sync.sqlite")
+
+    server = FakeFeishuDocx(args.latency, 0)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    base_url = f"http://127.0.0.1:{args.port}/open-apis"
+
+    import feishu_outbox
+    import feishu_uploader
+    from feishu_outbox import FeishuOutbox, OutboxWorker
+    feishu_outbox.OUTBOX_RETRY_BASE = 0.2
+
+    class StaticWorker(OutboxWorker):
+        def auth(self):
+            return "token"
+
+    outbox = FeishuOutbox(os.path.join(tempfile.mkdtemp(), "feishu_outbox.sqlite"))
+    article, roles, contents = sample_contents(5, 30)
+    payloads = [{"folder_token": "folder", "theme": f"基准{i}", "origin_article": article, "roles": roles,
+                 "contents": contents, "sync_run": ""} for i in range(args.jobs)]
+
+    # 关键路径：写入发件箱 vs 图内直接上传
+    start = time.perf_counter()
+    outbox.enqueue("app", payloads[0], "job0")
+    enqueue_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    direct = await feishu_uploader.AsyncFeishuUploader("token", base_url=base_url).upload_imitate(
+        "folder", "基准", article, roles, contents)
+    direct_ms = (time.perf_counter() - start) * 1000
+    expected = server.outline(direct["document_id"])
+    del server.docs[direct["document_id"]]
+    for i, payload in enumerate(payloads[1:], 1):
+        outbox.enqueue("app", payload, f"job{i}")
+    outbox.enqueue("app", payloads[0], "job0")   # 同一任务键重复排队只保留一条
+
+    # 第一个进程：上传到一半被停止
+    first = StaticWorker("app", "", outbox, concurrency=args.concurrency, poll_interval=0.05, lease=1.0,
+                         base_url=base_url).start()
+    while first.uploaded < 1:
+        await asyncio.sleep(0.01)
+    await first.stop()
+    # 模拟崩溃：领取一条后进程直接退出，租约留在队列中
+    crashed = outbox.claim("app", 1, lease=1.0)
+    # 写入正文失败一次：重新排队，重试时在同一篇文档上续传
+    server.fail_descendants = 1
+
+    in_flight, peak = 0, 0
+    original_request = feishu_uploader.AsyncFeishuUploader.request
+
+    async def counting_request(self, *a, **kw):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await original_request(self, *a, **kw)
+        finally:
+            in_flight -= 1
+
+    feishu_uploader.AsyncFeishuUploader.request = counting_request
+    second = StaticWorker("app", "", outbox, concurrency=args.concurrency, poll_interval=0.05, lease=1.0,
+                          base_url=base_url)
+
+    async def drain(done: int):
+        start = time.perf_counter()
+        await second.run(until_idle=True)
+        while outbox.stats().get("done", 0) < done and time.perf_counter() - start < 30:
+            await asyncio.sleep(0.2)            # 等待崩溃记录的租约与失败记录的退避到期
+            await second.run(until_idle=True)
+        return time.perf_counter() - start
+
+    drain_time = await drain(args.jobs)
+    feishu_uploader.AsyncFeishuUploader.request = original_request
+    stats, uploaded, docs = outbox.stats(), second.uploaded, len(server.docs)
+    one_doc_each = docs == args.jobs
+    all_same = all(server.outline(document_id) == expected for document_id in server.docs)
+
+    # 同步模式：首次同步写入正文失败一次，随后多一个角色的修补再失败一次
+    sync_docs, sync_same = [], True
+    for i, (sync_roles, sync_contents) in enumerate([(roles[:-1], contents[:-1]), (roles, contents)]):
+        before = set(server.docs)
+        server.fail_descendants = 1
+        outbox.enqueue("app", {"folder_token": "folder", "theme": "同步", "origin_article": article,
+                               "roles": sync_roles, "contents": sync_contents, "sync_run": "bench"}, f"sync{i}")
+        await drain(args.jobs + i + 1)
+        sync_docs.extend(set(server.docs) - before)
+        fresh = await feishu_uploader.AsyncFeishuUploader("token", base_url=base_url).upload_imitate(
+            "folder", "同步", article, sync_roles, sync_contents)
+        sync_same = sync_same and len(sync_docs) == 1 and server.outline(sync_docs[0]) == server.outline(fresh["document_id"])
+        del server.docs[fresh["document_id"]]
+    sync_stats = outbox.stats()
+
+    # 中途被杀：一篇文档分多次写入（含超过上限、需要分批追加子块的段），写入若干次后停止或崩溃
+    feishu_uploader.MAX_DESCENDANTS_PER_REQUEST = 20
+    writes = server.descendant_writes
+    fresh = await feishu_uploader.AsyncFeishuUploader("token", base_url=base_url).upload_imitate(
+        "folder", "中途", article, roles, contents)
+    full_writes, kill_expected = server.descendant_writes - writes, server.outline(fresh["document_id"])
+    del server.docs[fresh["document_id"]]
+    kill_ok = True
+    for i, crash in enumerate((False, True)):
+        before, writes = set(server.docs), server.descendant_writes
+        server.hold_after, server.held = writes + args.kill_after, 0
+        server.release_held.clear()
+        outbox.enqueue("app", {"folder_token": "folder", "theme": "中途", "origin_article": article, "roles": roles,
+                               "contents": contents, "sync_run": ""}, f"kill{i}")
+        # 崩溃的进程用自己的连接；崩溃时它不会再交还任务或写入进度，只有此前每次写入后落盘的进度
+        victim_outbox = FeishuOutbox(outbox.path) if crash else outbox
+        victim = StaticWorker("app", "", victim_outbox, concurrency=1, poll_interval=0.05, lease=1.0,
+                              base_url=base_url).start()
+        while not server.held:
+            await asyncio.sleep(0.01)
+        if crash:
+            victim_outbox.release = victim_outbox.save_progress = lambda *a: None
+        await victim.stop()
+        server.hold_after = None
+        server.release_held.set()
+        await drain(args.jobs + 2 + i + 1)
+        new_docs = set(server.docs) - before
+        kill_ok = (kill_ok and len(new_docs) == 1 and server.outline(new_docs.pop()) == kill_expected
+                   and server.descendant_writes - writes == full_writes)
+    kill_stats = outbox.stats()
+    await feishu_uploader.aclose_http_client()
+    await runner.cleanup()
+
+    print(f"\n{args.jobs} 个上传任务，并发 {args.concurrency}，延迟 {args.latency * 1000:.0f}ms")
+    print(f"保存节点写入发件箱 {enqueue_ms:.2f}ms，图内直接上传 {direct_ms:.0f}ms")
+    print(f"第一个进程停止前上传 {first.uploaded} 个；崩溃遗留 {len(crashed)} 个；注入 1 次正文写入失败")
+    print(f"新进程排空用时 {drain_time:.2f}s，上传 {uploaded} 个，放弃 {second.failed} 个，队列状态 {stats}")
+    print(f"每个任务恰好一篇文档: {one_doc_each}（共 {docs} 篇），内容均与直接上传一致: {all_same}，"
+          f"同时在途请求峰值 {peak}（上限 {args.concurrency}）")
+    print(f"同步模式两次注入失败后: 共 {len(sync_docs)} 篇文档，内容与整篇上传一致: {sync_same}，队列状态 {sync_stats}")
+    print(f"写入 {args.kill_after} 次后被停止 / 崩溃（完整上传需 {full_writes} 次写入）: 重试后各一篇文档、"
+          f"内容一致且没有重复写入: {kill_ok}，队列状态 {kill_stats}")
+    ok = (stats == {"done": args.jobs} and one_doc_each and all_same and peak <= args.concurrency
+          and sync_same and sync_stats == {"done": args.jobs + 2} and kill_ok and kill_stats == {"done": args.jobs + 4})
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
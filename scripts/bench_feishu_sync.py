@@ -0,0 +1,90 @@
+"""
+飞书增量同步基准：在本地假飞书文档服务（见 bench_feishu_upload.py）上检查 feishu_sync 的请求数与结果
+- 依次同步同一篇原文（同一运行名）的多个版本：首次创建 → 原样重跑 → 多一个角色 → 改一段话 →
+  中间插入一段 → 把一段换成不同类型的块 → 去掉一个角色 → 调整角色顺序 → 文档被删除后重跑
+- 每一步输出本次请求数，并校验同步后的文档与“新建文档整篇上传”的结果完全一致、始终只对应一篇文档
+
+用法（在仓库根目录执行）：
+    python scripts/bench_feishu_sync.py
+    python scripts/bench_feishu_sync.py --roles 7 --paragraphs 60
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from bench_feishu_upload import FakeFeishuDocx, sample_contents
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="飞书增量同步基准")
+    parser.add_argument("--roles", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=30, help="每个角色正文的段落数")
+    parser.add_argument("--latency", type=float, default=0.01, help="假服务每个请求的往返延迟（秒）")
+    parser.add_argument("--port", type=int, default=18091)
+    args = parser.parse_args()
+
+    server = FakeFeishuDocx(args.latency, 0)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    base_url = f"http://127.0.0.1:{args.port}/open-apis"
+
+    import feishu_uploader
+    from feishu_sync import FeishuSyncStore, sync_imitate_document
+
+    store = FeishuSyncStore(os.path.join(tempfile.mkdtemp(), "feishu_sync.sqlite"))
+    article, roles, contents = sample_contents(args.roles + 1, args.paragraphs)
+    extra_role, extra_content = roles.pop(), contents.pop()
+
+    def edited(index, old, new):
+        changed = list(contents)
+        changed[index] = changed[index].replace(old, new, 1)
+        return changed
+
+    steps = [
+        ("首次同步（新建文档）", roles, contents),
+        ("原样重跑", roles, contents),
+        ("多一个角色", roles + [extra_role], contents + [extra_content]),
+        ("改一段话", roles + [extra_role], edited(1, "第2段仿写正文", "第2段改写后的正文") + [extra_content]),
+        ("中间插入一段", roles + [extra_role], edited(1, "第3段仿写正文", "新插入的一段。\n\n第3段仿写正文") + [extra_content]),
+        ("段落换成列表", roles + [extra_role], edited(1, "第3段仿写正文", "- 换成列表项\n\n第3段仿写正文") + [extra_content]),
+        ("去掉一个角色", roles[1:] + [extra_role], contents[1:] + [extra_content]),
+        ("调整角色顺序", [extra_role] + roles[1:], [extra_content] + contents[1:]),
+    ]
+
+    ok, document_ids = True, set()
+    print(f"{args.roles} 个角色，每个 {args.paragraphs} 段")
+    print(f"{'步骤':<14} {'方式':<10} {'请求数':>6} {'与整篇上传一致':>8}")
+    for name, step_roles, step_contents in steps:
+        uploader = feishu_uploader.AsyncFeishuUploader("token", base_url=base_url)
+        result = await sync_imitate_document(uploader, "bench", "folder", "基准", article, step_roles, step_contents, store)
+        fresh = await feishu_uploader.AsyncFeishuUploader("token", base_url=base_url).upload_imitate(
+            "folder", "基准", article, step_roles, step_contents)
+        same = result["success"] and server.outline(result["document_id"]) == server.outline(fresh["document_id"])
+        del server.docs[fresh["document_id"]]
+        document_ids.add(result.get("document_id"))
+        ok = ok and same
+        print(f"{name:<14} {result.get('mode', '失败'):<10} {result.get('requests', 0):>6} {str(same):>8}")
+
+    # 记录中的文档已被删除：下次有内容变化的同步重新创建文档并更新记录
+    del server.docs[result["document_id"]]
+    uploader = feishu_uploader.AsyncFeishuUploader("token", base_url=base_url)
+    result = await sync_imitate_document(uploader, "bench", "folder", "基准", article,
+                                         roles[1:] + [extra_role], contents[1:] + [extra_content], store)
+    recreated = result["success"] and result["mode"] == "created" and result["document_id"] in server.docs
+    print(f"{'文档被删除后重跑':<14} {result.get('mode', '失败'):<10} {result.get('requests', 0):>6} {str(recreated):>8}")
+    await feishu_uploader.aclose_http_client()
+    await runner.cleanup()
+
+    print(f"各步骤始终同步到同一篇文档: {len(document_ids) == 1}")
+    sys.exit(0 if ok and recreated and len(document_ids) == 1 else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,329 @@
+"""
+飞书上传基准：在本地假飞书文档服务上测量上传核心（feishu_uploader）
+- 假服务实现获取 tenant_access_token、创建文档、获取文档信息、创建子块、创建嵌套块（支持 index 插入位置）、删除子块、批量更新块
+  等接口，按 --latency 模拟网络往返，超过 --qps 时返回 429 + 频控错误码；--revoke-after N 表示接受 N 个写请求后拒绝所有 tenant 令牌（401 + 令牌无效错误码）
+- 场景一：同步封装（feishu4MAS_copy_tenant.FeishuImitateUploaderSimple，在线程中运行）与异步上传器各写入一篇同样的
+  原文 + N 个角色 内容，输出耗时、请求数并校验两份文档一致
+- 场景二：上传中途应用身份失效，AuthChain 刷新一次仍被拒后切换为用户身份，在同一篇文档上继续；
+  校验只产生一篇文档、内容与场景一一致，并与“换身份后从头重建文档”的旧流程比较请求数
+- 场景三：写入已在服务端生效但响应丢失（503），上传器带同一 client_token 重发，校验文档中没有重复的块
+
+用法（在仓库根目录执行）：
+    python scripts/bench_feishu_upload.py
+    python scripts/bench_feishu_upload.py --roles 7 --paragraphs 300 --latency 0.08 --qps 3 --revoke-after 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+
+class FakeFeishuDocx:
+    """内存中的假飞书文档服务：每篇文档是 block_id -> {block, children} 的树。"""
+
+    def __init__(self, latency: float, qps: float):
+        self.latency = latency
+        self.qps = qps
+        self.docs = {}
+        self.requests = 0
+        self.throttled = 0
+        self.token_requests = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.revoke_after = None
+        self.fail_descendants = 0   # 接下来的这么多次创建嵌套块请求返回不可重试的错误
+        self.lose_responses = 0     # 接下来的这么多次写块请求在写入生效后返回 503（模拟响应丢失）
+        self.hold_after = None      # 已生效的创建嵌套块请求达到该数后，之后的请求挂起不生效（模拟上传中途进程被杀）
+        self.held = 0
+        self.release_held = asyncio.Event()
+        self.descendant_writes = 0
+        self._replies = {}          # client_token -> 已生效写请求的响应（飞书按 client_token 去重）
+        self._recent = deque()
+
+    def _gate(self, request):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token.startswith("t-") and self.revoke_after is not None and self.accepted >= self.revoke_after:
+            self.rejected += 1
+            return web.json_response({"code": 99991663, "msg": "invalid access token"}, status=401)
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if self.qps and len(self._recent) >= self.qps:
+            self.throttled += 1
+            return web.json_response({"code": 99991400, "msg": "request trigger frequency limit"}, status=429,
+                                     headers={"x-ogw-ratelimit-reset": "1"})
+        self._recent.append(now)
+        self.accepted += 1
+        return None
+
+    def _replay(self, request):
+        token = request.query.get("client_token")
+        if token and token in self._replies:
+            return web.json_response(self._replies[token])
+        return None
+
+    def _applied(self, request, body):
+        token = request.query.get("client_token")
+        if token:
+            self._replies[token] = body
+        if self.lose_responses > 0:
+            self.lose_responses -= 1
+            return web.json_response({"code": 1, "msg": "upstream timeout"}, status=503)
+        return web.json_response(body)
+
+    async def issue_tenant_token(self, request):
+        self.token_requests += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response({"code": 0, "tenant_access_token": f"t-{uuid.uuid4().hex[:8]}", "expire": 7200})
+
+    async def create_document(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        throttled = self._gate(request)
+        if throttled is not None:
+            return throttled
+        body = await request.json()
+        document_id = "doc" + uuid.uuid4().hex[:12]
+        self.docs[document_id] = {document_id: {"block": {"block_type": 1}, "children": []}}
+        return web.json_response({"code": 0, "data": {"document": {"document_id": document_id, "title": body.get("title")}}})
+
+    async def get_document(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        throttled = self._gate(request)
+        if throttled is not None:
+            return throttled
+        document_id = request.match_info["document_id"]
+        if document_id not in self.docs:
+            return web.json_response({"code": 1770002, "msg": "not found"}, status=404)
+        return web.json_response({"code": 0, "data": {"document": {"document_id": document_id}}})
+
+    async def create_children(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        throttled = self._gate(request)
+        if throttled is not None:
+            return throttled
+        replayed = self._replay(request)
+        if replayed is not None:
+            return replayed
+        doc = self.docs[request.match_info["document_id"]]
+        parent = doc[request.match_info["block_id"]]
+        body = await request.json()
+        created = []
+        for block in body["children"]:
+            block_id = "blk" + uuid.uuid4().hex[:12]
+            doc[block_id] = {"block": block, "children": []}
+            parent["children"].append(block_id)
+            created.append({**block, "block_id": block_id})
+        return self._applied(request, {"code": 0, "data": {"children": created}})
+
+    async def create_descendants(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        throttled = self._gate(request)
+        if throttled is not None:
+            return throttled
+        replayed = self._replay(request)
+        if replayed is not None:
+            return replayed
+        doc = self.docs.get(request.match_info["document_id"])
+        if doc is None:
+            return web.json_response({"code": 1770002, "msg": "not found"}, status=404)
+        if self.fail_descendants > 0:
+            self.fail_descendants -= 1
+            return web.json_response({"code": 1770040, "msg": "injected failure"}, status=400)
+        if self.hold_after is not None and self.descendant_writes >= self.hold_after:
+            self.held += 1
+            await self.release_held.wait()
+            return web.json_response({"code": 1, "msg": "held"}, status=503)
+        body = await request.json()
+        if len(body["descendants"]) > 1000:
+            return web.json_response({"code": 1770001, "msg": "too many descendants"}, status=400)
+        by_temp = {block["block_id"]: block for block in body["descendants"]}
+        relations = []
+
+        def create(temp_id, parent_id, index=-1):
+            block = dict(by_temp[temp_id])
+            block_id = "blk" + uuid.uuid4().hex[:12]
+            relations.append({"temporary_block_id": temp_id, "block_id": block_id})
+            child_temp_ids = block.pop("children", [])
+            block.pop("block_id")
+            doc[block_id] = {"block": block, "children": []}
+            siblings = doc[parent_id]["children"]
+            siblings.insert(index if index >= 0 else len(siblings), block_id)
+            for child in child_temp_ids:
+                create(child, block_id)
+
+        index = body.get("index", -1)
+        for i, temp_id in enumerate(body["children_id"]):
+            create(temp_id, request.match_info["block_id"], index + i if index >= 0 else -1)
+        self.descendant_writes += 1
+        return self._applied(request, {"code": 0, "data": {"block_id_relations": relations}})
+
+    async def batch_delete(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        throttled = self._gate(request)
+        if throttled is not None:
+            return throttled
+        replayed = self._replay(request)
+        if replayed is not None:
+            return replayed
+        doc = self.docs.get(request.match_info["document_id"])
+        if doc is None:
+            return web.json_response({"code": 1770002, "msg": "not found"}, status=404)
+        body = await request.json()
+        del doc[request.match_info["block_id"]]["children"][body["start_index"]:body["end_index"]]
+        return self._applied(request, {"code": 0, "data": {}})
+
+    async def batch_update(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        throttled = self._gate(request)
+        if throttled is not None:
+            return throttled
+        replayed = self._replay(request)
+        if replayed is not None:
+            return replayed
+        doc = self.docs.get(request.match_info["document_id"])
+        if doc is None:
+            return web.json_response({"code": 1770002, "msg": "not found"}, status=404)
+        body = await request.json()
+        if len(body["requests"]) > 200:
+            return web.json_response({"code": 1770001, "msg": "too many requests"}, status=400)
+        for update in body["requests"]:
+            block = doc[update["block_id"]]["block"]
+            payload = next(v for v in block.values() if isinstance(v, dict) and "elements" in v)
+            payload["elements"] = update["update_text_elements"]["elements"]
+        return self._applied(request, {"code": 0, "data": {}})
+
+    def outline(self, document_id: str) -> list:
+        """按文档顺序展开的 (层级, 块类型, 文本) 列表，用于比较两份文档。"""
+        doc, rows = self.docs[document_id], []
+
+        def walk(block_id, depth):
+            for child_id in doc[block_id]["children"]:
+                block = doc[child_id]["block"]
+                payload = next((v for k, v in block.items() if isinstance(v, dict) and "elements" in v), {})
+                text = "".join(e.get("text_run", {}).get("content", "") for e in payload.get("elements", []))
+                rows.append((depth, block["block_type"], text))
+                walk(child_id, depth + 1)
+
+        walk(document_id, 0)
+        return rows
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/open-apis/auth/v3/tenant_access_token/internal", self.issue_tenant_token)
+        app.router.add_post("/open-apis/docx/v1/documents", self.create_document)
+        app.router.add_get("/open-apis/docx/v1/documents/{document_id}", self.get_document)
+        app.router.add_post("/open-apis/docx/v1/documents/{document_id}/blocks/{block_id}/children", self.create_children)
+        app.router.add_post("/open-apis/docx/v1/documents/{document_id}/blocks/{block_id}/descendant", self.create_descendants)
+        app.router.add_delete("/open-apis/docx/v1/documents/{document_id}/blocks/{block_id}/children/batch_delete",
+                              self.batch_delete)
+        app.router.add_patch("/open-apis/docx/v1/documents/{document_id}/blocks/batch_update", self.batch_update)
+        return app
+
+
+def sample_contents(roles: int, paragraphs: int):
+    article = "\n\n".join(f"原文第{i}段，讲述市场与个人财富的关系。" for i in range(paragraphs))
+    contents = []
+    for r in range(roles):
+        parts = []
+        for i in range(paragraphs):
+            if i % 5 == 0:
+                parts.append(f"## 角色{r} 小节{i}")
+            elif i % 5 == 1:
+                parts.append(f"- 要点一，**加粗**说明\n- 要点二\n- 要点三")
+            else:
+                parts.append(f"角色{r}的第{i}段仿写正文，语气轻松，结合具体数据与案例展开。")
+        contents.append("\n\n".join(parts))
+    return article, [f"角色{r}" for r in range(roles)], contents
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="飞书上传核心基准")
+    parser.add_argument("--roles", type=int, default=7)
+    parser.add_argument("--paragraphs", type=int, default=30, help="每个角色正文的段落数")
+    parser.add_argument("--latency", type=float, default=0.05, help="假服务每个请求的往返延迟（秒）")
+    parser.add_argument("--qps", type=float, default=3, help="假服务的频率限制，0 表示不限")
+    parser.add_argument("--revoke-after", type=int, default=1, help="场景二中接受多少个写请求后拒绝 tenant 令牌")
+    parser.add_argument("--port", type=int, default=18090)
+    args = parser.parse_args()
+
+    server = FakeFeishuDocx(args.latency, args.qps)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    base_url = f"http://127.0.0.1:{args.port}/open-apis"
+    article, roles, contents = sample_contents(args.roles, args.paragraphs)
+
+    from feishu4MAS_copy_tenant import FeishuImitateUploaderSimple
+    import feishu_uploader
+    from feishu_token import AuthChain, TenantAuth, TokenManager, UserAuth
+    from limiters import registry
+    registry.configure("feishu", rps=args.qps or None)
+
+    # 场景一：同步封装 vs 异步上传器
+    sync = FeishuImitateUploaderSimple("", "", "token")   # 不传应用凭据：直接使用给定令牌
+    sync.base_url = base_url
+    start, before = time.perf_counter(), server.requests
+    sync_result = await asyncio.to_thread(sync.create_imitate_document, "folder", "基准", article, roles, contents)
+    sync_time, sync_requests = time.perf_counter() - start, server.requests - before
+
+    await asyncio.sleep(1.0)   # 让假服务的频控窗口清空
+    new = feishu_uploader.AsyncFeishuUploader("token", base_url=base_url)
+    start, before = time.perf_counter(), server.requests
+    new_result = await new.upload_imitate("folder", "基准", article, roles, contents)
+    new_time, new_requests = time.perf_counter() - start, server.requests - before
+    expected = server.outline(new_result["document_id"])
+    same = server.outline(sync_result["document_id"]) == expected
+
+    # 场景二：上传中途 tenant 令牌失效，切换为用户身份在同一文档上继续
+    await asyncio.sleep(1.0)
+    tokens = TokenManager("app", "secret", base_url=base_url)
+    tokens.seed_user_token("u-static")
+    docs_before, before = len(server.docs), server.requests
+    server.accepted, server.revoke_after = 0, args.revoke_after
+    chained = feishu_uploader.AsyncFeishuUploader(AuthChain(TenantAuth(tokens), UserAuth(tokens)), base_url=base_url)
+    start = time.perf_counter()
+    chained_result = await chained.upload_imitate("folder", "基准", article, roles, contents)
+    chained_time, chained_requests = time.perf_counter() - start, server.requests - before
+    server.revoke_after = None
+    tokens.close()
+    one_doc = len(server.docs) - docs_before == 1
+    resumed_same = chained_result.get("success") and server.outline(chained_result["document_id"]) == expected
+    # 旧流程：失败前已发出的写请求白费，换身份后重新创建文档并写入全部内容
+    restart_requests = args.revoke_after + server.rejected + new_requests
+
+    # 场景三：写入嵌套块已生效但响应丢失（503），带同一 client_token 重发，不重复写入
+    await asyncio.sleep(1.0)
+    server.lose_responses = 1
+    lossy = feishu_uploader.AsyncFeishuUploader("token", base_url=base_url)
+    lossy_result = await lossy.upload_imitate("folder", "基准", article, roles, contents)
+    no_duplicate = lossy_result.get("success") and server.outline(lossy_result["document_id"]) == expected
+    await feishu_uploader.aclose_http_client()
+    await runner.cleanup()
+
+    print(f"\n{args.roles} 个角色，每个 {args.paragraphs} 段，延迟 {args.latency * 1000:.0f}ms，频控 {args.qps} QPS")
+    print(f"同步封装:   {sync_time:6.2f}s  请求 {sync_requests} 次  成功 {sync_result.get('success')}")
+    print(f"异步上传器: {new_time:6.2f}s  请求 {new_requests} 次（重试 {new.retries}）  成功 {new_result.get('success')}")
+    print(f"两份文档内容与顺序一致: {same}，被限流 {server.throttled} 次")
+    print(f"中途鉴权失效（接受 {args.revoke_after} 个写请求后拒绝 tenant 令牌）: {chained_time:6.2f}s  "
+          f"请求 {chained_requests} 次（被拒 {server.rejected}，鉴权刷新/切换 {chained.reauths}，最终身份 {chained.auth.name}）")
+    print(f"  只创建一篇文档: {one_doc}，内容与场景一一致: {resumed_same}；旧流程（换身份重建文档）约需 {restart_requests} 次请求")
+    print(f"写入生效但响应丢失后重发（重试 {lossy.retries} 次）: 内容无重复且与场景一一致: {no_duplicate}")
+    ok = same and new_result.get("success") and one_doc and resumed_same and no_duplicate
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+仿写单步延迟基准：对比“每次调用 create_react_agent”与“预构建 prompt | llm 链”两种执行方式
+- 使用无网络的假聊天模型（固定输出、可设置每个 token 的延迟），只测框架本身的开销
+- 每种方式各执行 --iterations 次，输出 p50 / p95 / 平均延迟（毫秒）
+
+用法（在仓库根目录执行）：
+    python scripts/bench_imitate_step.py
+    python scripts/bench_imitate_step.py --iterations 200 --token-delay 0
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 基准只测本地开销，关闭 LangSmith 追踪（.env 中的设置不会覆盖这里的值）
+for _key in ("LANGSMITH_TRACING_V2", "LANGCHAIN_TRACING_V2", "LANGSMITH_TRACING", "LANGCHAIN_TRACING"):
+    os.environ[_key] = "false"
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+import imitate
+from template_list import role_list
+
+
+class FakeChatModel(GenericFakeChatModel):
+    """流式输出固定文本的假模型；bind_tools 直接返回自身，便于 create_react_agent 使用。"""
+
+    token_delay: float = 0.0
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    async def _astream(self, *args, **kwargs):
+        async for chunk in super()._astream(*args, **kwargs):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield chunk
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def _collect_agent_stream(agent, state):
+    """旧实现的流式收集（已从 imitate.py 移除，保留在这里作对比基线）：逐个 token 拼接代理的输出。"""
+    buf = []
+    async for kind, payload in agent.astream(state, stream_mode=["messages"]):
+        if kind == "messages" and payload[0].content:
+            buf.append(payload[0].content)
+    text = "".join(buf)
+    return state["messages"] + ([AIMessage(content=text)] if buf else []), text
+
+
+async def _react_agent_step(model, template_value, state):
+    """旧实现：每次执行都新建并编译一个无工具的 ReAct 代理。"""
+    from langgraph.prebuilt import create_react_agent
+    prompt = ChatPromptTemplate.from_messages([
+        MessagesPlaceholder("messages"),
+        ("user", template_value)])
+    agent = create_react_agent(model=model, tools=[], prompt=prompt)
+    return await _collect_agent_stream(agent, state)
+
+
+async def _cached_chain_step(step_chain, state):
+    """新实现：直接流式调用预构建的 prompt | llm 链。"""
+    return await imitate.stream_imitate_step(step_chain, state)
+
+
+async def _measure(name, step, iterations):
+    await step()   # 预热
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await step()
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"{name:<22} p50 {_percentile(latencies, 0.5):8.2f} ms   p95 {_percentile(latencies, 0.95):8.2f} ms"
+          f"   mean {statistics.mean(latencies):8.2f} ms")
+    return statistics.median(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="仿写单步延迟基准")
+    parser.add_argument("--iterations", type=int, default=100, help="每种方式的执行次数")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="假模型每个输出片段的延迟（秒）")
+    args = parser.parse_args()
+
+    reply = "这是一段用于基准测试的仿写输出，" * 20
+    model = FakeChatModel(messages=itertools.cycle([AIMessage(content=reply)]), token_delay=args.token_delay)
+    imitate._models["openrouter1"] = model
+    template_value = role_list[0]["template"][-1]
+    state = {"messages": [AIMessage(content="上一步的仿写结果")], "article": "原始文案" * 200, "final_text": ""}
+    step_chain = imitate.build_step_chain(template_value, 1)
+
+    print(f"迭代次数: {args.iterations}，每片段延迟: {args.token_delay}s")
+    old = await _measure("create_react_agent", lambda: _react_agent_step(model, template_value, state), args.iterations)
+    new = await _measure("cached prompt | llm", lambda: _cached_chain_step(step_chain, state), args.iterations)
+    print(f"p50 加速: {old / new:.2f}x（每步节省 {old - new:.2f} ms）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+冷启动导入耗时基准（基于 python -X importtime）
+- 每个模块在全新的子进程中导入若干次，取自身累计导入耗时的中位数
+- 列出耗时最多的若干个依赖，便于定位新引入的重量级导入
+- 检查纯文本仿写路径没有提前加载 pandas / dashscope / 飞书 SDK / yt-dlp / langgraph / langsmith 等按需导入的依赖
+- 目标：import imitate 低于 1 秒（--budget 默认 1.0）；langgraph 与 langsmith 在编译主图、执行节点时才导入，
+  命令行在等待输入期间于后台编译主图
+
+用法（在仓库根目录执行）：
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --modules imitate v2t --runs 5 --budget 0.8
+超出 --budget（秒）或按需导入的依赖被提前加载时以非零状态码退出。
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 纯文本仿写（import imitate）时不应加载的模块
+LAZY_MODULES = ["pandas", "dashscope", "lark_oapi", "yt_dlp", "lxml", "langchain_openai",
+                "v2t", "feishu4MAS_copy_tenant", "feishu4MAS_copy_user", "link_parser", "langgraph", "langsmith"]
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def import_profile(module: str) -> list:
+    """在新进程中导入 module，返回 [(模块名, 自身耗时us, 累计耗时us, 层级)]。"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def bench(module: str, runs: int, top: int):
+    totals, last = [], []
+    for _ in range(runs):
+        last = import_profile(module)
+        totals.append(next(cum for name, _, cum, _ in reversed(last) if name == module) / 1e6)
+    median = statistics.median(totals)
+    print(f"\n== import {module}: 中位数 {median:.3f}s（{runs} 次: {', '.join(f'{t:.3f}' for t in totals)}）")
+    print(f"   累计耗时最多的 {top} 个依赖:")
+    for name, _, cum, level in sorted((r for r in last if r[0] != module), key=lambda r: -r[2])[:top]:
+        print(f"   {cum / 1e3:9.1f} ms  {'  ' * (level - 1)}{name}")
+    loaded = {name.split(".")[0] for name, _, _, _ in last} | {name for name, _, _, _ in last}
+    return median, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计模块冷启动导入耗时")
+    parser.add_argument("--modules", nargs="+", default=["imitate"], help="要测量的模块")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的测量次数")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的依赖个数")
+    parser.add_argument("--budget", type=float, default=1.0, help="imitate 导入耗时上限（秒），0 表示不检查")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        median, loaded = bench(module, args.runs, args.top)
+        if module == "imitate":
+            eager = [m for m in LAZY_MODULES if m in loaded]
+            if eager:
+                print(f"   !! 以下按需导入的模块被提前加载: {', '.join(eager)}")
+                failed = True
+            if args.budget and median > args.budget:
+                print(f"   !! 导入耗时 {median:.3f}s 超出预算 {args.budget:.3f}s")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
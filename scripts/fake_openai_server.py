@@ -0,0 +1,89 @@
+"""
+本地假 OpenAI 兼容服务：POST /v1/chat/completions 返回固定文本，用于不消耗额度地联调仿写服务
+- 支持流式（SSE，逐片段输出，可设置片段间隔）与非流式两种响应
+- usage 中带 prompt_tokens_details.cached_tokens，可验证前缀缓存统计链路
+- 收到的请求数、各模型调用次数可通过 GET /stats 查看
+
+用法（在仓库根目录执行）：
+    python scripts/fake_openai_server.py --port 18080 --delay 0.01
+    OPENROUTER_BASE_URL=http://127.0.0.1:18080/v1 OPENROUTER_API_KEY=fake python imitate_service.py
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from aiohttp import web
+
+DEFAULT_REPLY = "这是一段来自本地假模型的仿写输出，用于联调流式输出、结果接口与用量统计。"
+
+
+class FakeOpenAI:
+    def __init__(self, reply: str = DEFAULT_REPLY, chunk_chars: int = 4, delay: float = 0.0):
+        self.reply = reply
+        self.chunk_chars = chunk_chars
+        self.delay = delay
+        self.requests = 0
+        self.by_model = {}
+
+    def _usage(self, body: dict) -> dict:
+        prompt_chars = sum(len(json.dumps(m.get("content", ""), ensure_ascii=False)) for m in body.get("messages", []))
+        prompt_tokens = max(1, prompt_chars // 2)
+        completion_tokens = max(1, len(self.reply) // 2)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": prompt_tokens // 2}}
+
+    async def handle_completions(self, request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        self.requests += 1
+        self.by_model[model] = self.by_model.get(model, 0) + 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}],
+                "usage": self._usage(body)})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(payload: dict):
+            await response.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        for i in range(0, len(self.reply), self.chunk_chars):
+            delta = {"content": self.reply[i:i + self.chunk_chars]}
+            if i == 0:
+                delta["role"] = "assistant"
+            await send({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        await send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send({**base, "choices": [], "usage": self._usage(body)})
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def handle_stats(self, request):
+        return web.json_response({"requests": self.requests, "by_model": self.by_model})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_completions)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地假 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="固定返回的文本")
+    parser.add_argument("--chunk-chars", type=int, default=4, help="流式输出每个片段的字符数")
+    parser.add_argument("--delay", type=float, default=0.0, help="流式片段之间的间隔（秒）")
+    args = parser.parse_args()
+    web.run_app(FakeOpenAI(args.reply, args.chunk_chars, args.delay).app(), host=args.host, port=args.port)
@@ -0,0 +1,214 @@
+"""
+仿写输出的本地流式分发（SSE）
+- StreamHub：进程内的发布/订阅中心，各角色子图把 token 以 (角色, 步骤) 为标签发布进来
+- publish 只做内存追加、从不等待，LLM 消费者不会被慢速的订阅端拖慢
+- 后台协程每隔 flush_interval 秒把累积的 token 按 (角色, 步骤) 合并成一帧分发，替代逐 token 写入 + drain
+  （有订阅者且有 token 时才启动，最后一个订阅者退订时停止）
+- 每个订阅者一个有界队列，积压超过上限时丢弃最旧的帧并记录 dropped，订阅端可据此感知丢帧
+- StreamServer：基于 aiohttp 的 SSE 服务，GET /stream（可选 ?role=角色名、?run=任务ID 过滤），GET /health 查看订阅与丢帧情况
+- current_run：当前任务 ID 的上下文变量，服务模式下同一进程内多个任务并发时用于区分各自的帧
+
+SSE 事件：
+    event: token     data: {"role": "小A", "step": 1, "text": "合并后的文本片段", "seq": 12, "run": "可选"}
+    event: step_end  data: {"role": "小A", "step": 1, "seq": 13, "run": "可选"}
+"""
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+
+current_run: ContextVar[Optional[str]] = ContextVar("mas_stream_run", default=None)
+
+
+class _Subscriber:
+    def __init__(self, role: Optional[str], max_frames: int, run: Optional[str] = None):
+        self.role = role
+        self.run = run
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_frames)
+        self.dropped = 0
+
+    def offer(self, frame: Tuple[str, dict]):
+        if self.role is not None and frame[1].get("role") != self.role:
+            return
+        if self.run is not None and frame[1].get("run") != self.run:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()   # 丢弃最旧的帧，不对发布方施加背压
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class StreamHub:
+    """按 (角色, 步骤) 合并 token 并分发给所有订阅者。
+
+    Args:
+        flush_interval: 合并窗口（秒），窗口内同一 (角色, 步骤) 的 token 合成一帧
+        max_frames: 每个订阅者最多积压的帧数
+    """
+
+    def __init__(self, flush_interval: float = 0.05, max_frames: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_frames = max_frames
+        self._buffers: Dict[Tuple[Optional[str], str, int], List[str]] = {}
+        self._ended: List[Tuple[Optional[str], str, int]] = []
+        self._subscribers: List[_Subscriber] = []
+        self._seq = 0
+        self._pending = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def publish(self, role: str, step: int, text: str):
+        """追加一个 token（无订阅者时直接丢弃）。"""
+        if not self._subscribers or not text:
+            return
+        self._buffers.setdefault((current_run.get(), role, step), []).append(text)
+        self._schedule()
+
+    def end_step(self, role: str, step: int):
+        if not self._subscribers:
+            return
+        self._ended.append((current_run.get(), role, step))
+        self._schedule()
+
+    def _schedule(self):
+        self._pending.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+
+    def _frame(self, run: Optional[str], role: str, step: int, **fields) -> dict:
+        self._seq += 1
+        frame = {"role": role, "step": step, **fields, "seq": self._seq}
+        if run is not None:
+            frame["run"] = run
+        return frame
+
+    def flush(self):
+        """把当前累积的 token 合并成帧并分发。"""
+        buffers, self._buffers = self._buffers, {}
+        ended, self._ended = self._ended, []
+        frames = [("token", self._frame(run, role, step, text="".join(parts))) for (run, role, step), parts in buffers.items()]
+        frames += [("step_end", self._frame(run, role, step)) for run, role, step in ended]
+        for frame in frames:
+            for subscriber in self._subscribers:
+                subscriber.offer(frame)
+
+    async def _run(self):
+        while self._subscribers:
+            await self._pending.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._pending.clear()
+            self.flush()
+
+    def subscribe(self, role: Optional[str] = None, run: Optional[str] = None) -> _Subscriber:
+        subscriber = _Subscriber(role, self.max_frames, run)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+        if not self._subscribers:
+            self._stop_flusher()
+
+    def _stop_flusher(self):
+        """最后一个订阅者离开时停止后台合并协程并丢弃未分发的 token；之后有订阅者且再次发布时由 _schedule 重新启动。"""
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+        self._flusher = None
+        self._buffers.clear()
+        self._ended.clear()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "seq": self._seq,
+                "dropped": sum(s.dropped for s in self._subscribers)}
+
+
+def _encode_sse(frames: List[Tuple[str, dict]]) -> bytes:
+    return "".join(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                   for event, data in frames).encode("utf-8")
+
+
+async def sse_response(request, hub: StreamHub, role: Optional[str] = None, run: Optional[str] = None,
+                       heartbeat: float = 15.0):
+    """把 hub 中匹配 role/run 的帧以 SSE 推给一个 aiohttp 请求，直到客户端断开；每次写出时把已积压的帧一并写出。"""
+    from aiohttp import web
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "Access-Control-Allow-Origin": "*",
+    })
+    await response.prepare(request)
+    subscriber = hub.subscribe(role, run)
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                await response.write(b": keep-alive\n\n")
+                continue
+            frames = [frame]
+            while not subscriber.queue.empty():
+                frames.append(subscriber.queue.get_nowait())
+            await response.write(_encode_sse(frames))
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        hub.unsubscribe(subscriber)
+    return response
+
+
+class StreamServer:
+    """独立的 SSE 服务：把 StreamHub 的帧推给浏览器/编辑器。"""
+
+    def __init__(self, hub: StreamHub, host: str = "127.0.0.1", port: int = 8765, heartbeat: float = 15.0):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self._runner = None
+
+    async def _handle_stream(self, request):
+        return await sse_response(request, self.hub, role=request.query.get("role") or None,
+                                  run=request.query.get("run") or None, heartbeat=self.heartbeat)
+
+    async def _handle_health(self, request):
+        from aiohttp import web
+        return web.json_response({"ok": True, "time": time.time(), **self.hub.stats()})
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/stream", self._handle_stream)
+        app.router.add_get("/health", self._handle_health)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"流式输出服务已启动: http://{self.host}:{self.port}/stream", flush=True)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+_hub: Optional[StreamHub] = None
+
+
+def get_stream_hub() -> StreamHub:
+    """进程内共享的 StreamHub。"""
+    global _hub
+    if _hub is None:
+        _hub = StreamHub()
+    return _hub
+
+
+async def start_stream_server(host: str = "127.0.0.1", port: int = 8765) -> StreamServer:
+    server = StreamServer(get_stream_hub(), host=host, port=port)
+    await server.start()
+    return server
@@ -5,12 +5,11 @@ from os import getenv
 from dotenv import load_dotenv
 load_dotenv()
 import asyncio
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from datetime import datetime
 from typing import Optional
-llm_sem = asyncio.Semaphore(8)
+from model_configs import get_model_limiter
 
 # Configure stdout/stderr to safely handle any non-UTF-8 encodable characters during printing
 try:
@@ -55,8 +54,9 @@ def read_multiline(prompt="可输入多篇文章进行总结\n每一篇均需完
 
 async def summarize_one_text(llm,dict_item:dict)->dict:
     try:
-        async with llm_sem:
-            text = dict_item["text"]
+        text = dict_item["text"]
+        # 与仿写、纠错共用提供方限流器（llm:openrouter），按 输入 + 大纲输出 ≈ 1.5 倍字数 预估 token 消耗
+        async with get_model_limiter("summarize").slot(tokens=1.5 * len(str(text))):
             print(f"开始总结文本")
             summarize_prompt = ChatPromptTemplate.from_messages([
                 ("system", """你是一名资深信息架构师与领域分析员。请从输入文本中，产出一份结构化大纲，要求深度理解、客观克制、证据配对、可追踪。
@@ -170,6 +170,7 @@ async def main_summarize(llm,text:Optional[str]=None):
     save_to_local(time_now,result)
 
 if __name__ == "__main__":
+    from langchain_openai import ChatOpenAI
     summarize_llm = ChatOpenAI(
     model_name="google/gemini-2.5-flash",
     temperature=0.5,
@@ -0,0 +1,184 @@
+"""
+转录结果的持久化缓存（SQLite）
+- 以“平台 + 规范化ID”为键：B站 BV 号(含分P)、抖音视频ID、小红书笔记ID、YouTube 视频ID；其余链接使用 URL 的 sha1
+- 分别存储解析得到的直链、ASR 原始文本、LLM 纠错后的文本，三者各自有独立的 TTL
+- 维护 直链 → 缓存键 的别名表，使只拿到直链的转录/纠错阶段也能命中同一条缓存；
+  短链（b23.tv、v.douyin.com、xhslink.com 等）在解析器展开后也登记为别名，之后同一短链直接命中
+
+环境变量：
+- V2T_CACHE：设为 0 关闭缓存（默认开启）
+- V2T_CACHE_PATH：缓存数据库路径（默认 result/cache/transcript_cache.sqlite3）
+- V2T_CACHE_TTL_RESOLVED / V2T_CACHE_TTL_RAW / V2T_CACHE_TTL_CORRECTED：各类缓存的有效期（秒）
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from os import getenv
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+KIND_RESOLVED = "resolved"
+KIND_RAW = "raw"
+KIND_CORRECTED = "corrected"
+
+_BILIBILI_BV = re.compile(r"(BV[0-9A-Za-z]{10})")
+_DOUYIN_ID = re.compile(r"(?:/video/|/note/|modal_id=)(\d{8,})")
+_XHS_ID = re.compile(r"xiaohongshu\.com/(?:explore|discovery/item)/([0-9a-zA-Z]+)")
+_YOUTUBE_ID = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/)([\w-]{11})")
+
+
+def canonical_key(url: str) -> str:
+    """把原始链接规范化为“平台:ID”形式的缓存键，短链等无法离线识别的链接退化为 URL 哈希。"""
+    url = (url or "").strip()
+    if "bilibili.com" in url:
+        m = _BILIBILI_BV.search(url)
+        if m:
+            page = parse_qs(urlparse(url).query).get("p", ["1"])[0]
+            return f"bilibili:{m.group(1)}:p{page}"
+    if "douyin.com" in url:
+        m = _DOUYIN_ID.search(url)
+        if m:
+            return f"douyin:{m.group(1)}"
+    m = _XHS_ID.search(url)
+    if m:
+        return f"xhs:{m.group(1)}"
+    if "youtube.com" in url or "youtu.be" in url:
+        m = _YOUTUBE_ID.search(url)
+        if m:
+            return f"youtube:{m.group(1)}"
+    return "url:" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """按缓存键存取直链、原始文本与纠错文本；path 为 None 时所有操作均为空操作。"""
+
+    def __init__(self, path: Optional[str], ttl_resolved: float = 6 * 3600,
+                 ttl_raw: float = 30 * 86400, ttl_corrected: float = 30 * 86400):
+        self.path = path
+        self.ttl = {KIND_RESOLVED: ttl_resolved, KIND_RAW: ttl_raw, KIND_CORRECTED: ttl_corrected}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT NOT NULL, kind TEXT NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL,
+                PRIMARY KEY (key, kind))""")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS aliases (
+                direct_url TEXT PRIMARY KEY, key TEXT NOT NULL, created_at REAL NOT NULL)""")
+            self._conn.commit()
+        return self._conn
+
+    def _get(self, key: str, kind: str, ignore_ttl: bool = False) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, created_at FROM entries WHERE key=? AND kind=?", (key, kind)).fetchone()
+        if row is None:
+            return None
+        if not ignore_ttl and time.time() - row[1] > self.ttl[kind]:
+            return None
+        return row[0]
+
+    def _put(self, key: str, kind: str, value: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO entries (key, kind, value, created_at) VALUES (?, ?, ?, ?)",
+                         (key, kind, value, time.time()))
+            conn.commit()
+
+    def key_for_url(self, direct_url: str) -> str:
+        """直链（或短链）对应的缓存键：优先使用解析阶段登记的别名，否则按链接本身规范化。"""
+        if self.enabled:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT key FROM aliases WHERE direct_url=?", (direct_url,)).fetchone()
+            if row is not None:
+                return row[0]
+        return canonical_key(direct_url)
+
+    def put_alias(self, url: str, key: str):
+        """登记 链接 → 缓存键 的别名，用于离线无法识别平台ID的短链在展开后指向规范化的缓存键。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO aliases (direct_url, key, created_at) VALUES (?, ?, ?)",
+                         (url, key, time.time()))
+            conn.commit()
+
+    @staticmethod
+    def _item_keys(key: str, direct_urls: List[str]) -> List[str]:
+        # 一个来源解析出多个直链（如小红书多段视频）时，每个直链各占一个子键
+        if len(direct_urls) <= 1:
+            return [key]
+        return [f"{key}#{i}" for i in range(len(direct_urls))]
+
+    def get_resolved(self, key: str) -> Optional[List[str]]:
+        """返回缓存的直链列表。
+
+        直链未过期时直接返回；直链已过期但每个直链的原始文本仍在有效期内时也返回，
+        此时直链只作为别名使用，后续转录阶段会直接命中原始文本而不会真正访问它。
+        """
+        value = self._get(key, KIND_RESOLVED)
+        if value is not None:
+            return json.loads(value)
+        stale = self._get(key, KIND_RESOLVED, ignore_ttl=True)
+        if stale is None:
+            return None
+        direct_urls = json.loads(stale)
+        if direct_urls and all(self._get(k, KIND_RAW) is not None for k in self._item_keys(key, direct_urls)):
+            return direct_urls
+        return None
+
+    def put_resolved(self, key: str, direct_urls: List[str]):
+        if not self.enabled or not direct_urls:
+            return
+        self._put(key, KIND_RESOLVED, json.dumps(direct_urls, ensure_ascii=False))
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO aliases (direct_url, key, created_at) VALUES (?, ?, ?)",
+                             [(u, k, now) for u, k in zip(direct_urls, self._item_keys(key, direct_urls))])
+            conn.commit()
+
+    def get_text(self, key: str, kind: str) -> Optional[str]:
+        return self._get(key, kind)
+
+    def put_text(self, key: str, kind: str, text: str):
+        if text:
+            self._put(key, kind, text)
+
+
+_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    """进程内共享的缓存实例，按环境变量配置。"""
+    global _cache
+    if _cache is None:
+        path = None
+        if getenv("V2T_CACHE", "1") != "0":
+            default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result", "cache", "transcript_cache.sqlite3")
+            path = getenv("V2T_CACHE_PATH") or default_path
+        _cache = TranscriptCache(
+            path,
+            ttl_resolved=float(getenv("V2T_CACHE_TTL_RESOLVED", 6 * 3600)),
+            ttl_raw=float(getenv("V2T_CACHE_TTL_RAW", 30 * 86400)),
+            ttl_corrected=float(getenv("V2T_CACHE_TTL_CORRECTED", 30 * 86400)),
+        )
+    return _cache
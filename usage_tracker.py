@@ -0,0 +1,126 @@
+"""
+单次运行的 token 用量与延迟统计
+- RunUsageTracker 作为 LangChain 回调挂在每次运行自己的 RunnableConfig 上（见 imitate.new_run_config），
+  并发运行、批量任务之间的用量互不混淆
+- 继承 UsageMetadataCallbackHandler：usage_metadata 仍按模型汇总，与 imitate.cache_usage_report 兼容
+- 另外逐次记录每个 LLM 调用：角色、步骤、模型、输入/输出/缓存 token、首 token 延迟（ttft）与总耗时
+- 角色与步骤取自调用时 config 的 metadata（mas_role / mas_step，由 imitate.stream_imitate_step 传入），
+  其余调用（总结、转写纠错等）按 LangGraph 节点名归类
+- report() 返回可直接 json.dump 的结构：总计、按模型、按（角色, 步骤）汇总以及逐次调用明细
+"""
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+
+def _usage_numbers(usage: Optional[dict]) -> Dict[str, int]:
+    usage = usage or {}
+    details = usage.get("input_token_details") or {}
+    return {"input_tokens": usage.get("input_tokens", 0) or 0,
+            "output_tokens": usage.get("output_tokens", 0) or 0,
+            "cache_read": details.get("cache_read", 0) or 0,
+            "cache_creation": details.get("cache_creation", 0) or 0}
+
+
+class RunUsageTracker(UsageMetadataCallbackHandler):
+    """单次运行的用量与延迟回调。
+
+    Args:
+        run_id: 运行标识（一般为 thread_id），写入报告便于与输出文件对应
+    """
+
+    # 回调只做字典更新，直接在事件循环中执行，避免每个 token 都切换到线程池
+    run_inline = True
+
+    def __init__(self, run_id: Optional[str] = None):
+        super().__init__()
+        self.run_id = run_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.calls: List[Dict[str, Any]] = []
+        self._pending: Dict[UUID, Dict[str, Any]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        metadata = metadata or {}
+        self._pending[run_id] = {"role": metadata.get("mas_role"), "step": metadata.get("mas_step"),
+                                 "node": metadata.get("langgraph_node"), "start": time.perf_counter(),
+                                 "first_token": None}
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        pending = self._pending.get(run_id)
+        if pending is not None and pending["first_token"] is None and token:
+            pending["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        super().on_llm_end(response, run_id=run_id, **kwargs)
+        usage, model_name = None, None
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        if isinstance(generation, ChatGeneration) and isinstance(generation.message, AIMessage):
+            usage = generation.message.usage_metadata
+            model_name = generation.message.response_metadata.get("model_name")
+        self._finish(run_id, model=model_name, **_usage_numbers(usage))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error=str(error) or type(error).__name__)
+
+    def _finish(self, run_id: UUID, **fields):
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        end = time.perf_counter()
+        first_token = pending["first_token"]
+        record = {"role": pending["role"], "step": pending["step"], "node": pending["node"],
+                  "ttft_ms": round((first_token - pending["start"]) * 1000, 1) if first_token else None,
+                  "duration_ms": round((end - pending["start"]) * 1000, 1), **fields}
+        with self._lock:
+            self.calls.append(record)
+
+    def by_step(self) -> List[Dict[str, Any]]:
+        """按（角色, 步骤）汇总；没有角色的调用以节点名作为角色。"""
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for call in self.calls:
+            key = (call["role"] or call["node"] or "other", call["step"])
+            group = groups.setdefault(key, {"role": key[0], "step": key[1], "calls": 0, "errors": 0,
+                                            "input_tokens": 0, "output_tokens": 0, "cache_read": 0,
+                                            "duration_ms": 0.0, "_ttft": []})
+            group["calls"] += 1
+            group["errors"] += 1 if call.get("error") else 0
+            for field in ("input_tokens", "output_tokens", "cache_read"):
+                group[field] += call.get(field, 0)
+            group["duration_ms"] = round(group["duration_ms"] + call["duration_ms"], 1)
+            if call["ttft_ms"] is not None:
+                group["_ttft"].append(call["ttft_ms"])
+        rows = []
+        for group in groups.values():
+            ttft = group.pop("_ttft")
+            group["ttft_ms"] = round(sum(ttft) / len(ttft), 1) if ttft else None
+            rows.append(group)
+        return rows
+
+    def report(self, include_calls: bool = True) -> Dict[str, Any]:
+        """可直接 json.dump 的用量与延迟报告。"""
+        totals = {"calls": len(self.calls), "errors": sum(1 for c in self.calls if c.get("error"))}
+        for field in ("input_tokens", "output_tokens", "cache_read", "cache_creation"):
+            totals[field] = sum(c.get(field, 0) for c in self.calls)
+        report = {"run_id": self.run_id, "started_at": self.started_at,
+                  "duration_s": round(time.perf_counter() - self._started, 3),
+                  "totals": totals, "by_model": self.usage_metadata, "by_step": self.by_step()}
+        if include_calls:
+            report["calls"] = list(self.calls)
+        return report
+
+
+def format_by_step(report: Dict[str, Any]) -> List[str]:
+    """把报告中的按步骤汇总格式化为便于打印的多行文本，按总耗时降序。"""
+    lines = []
+    for row in sorted(report["by_step"], key=lambda r: -r["duration_ms"]):
+        step = f"步骤{row['step']}" if row["step"] is not None else "-"
+        ttft = f"{row['ttft_ms']:.0f}ms" if row["ttft_ms"] is not None else "-"
+        lines.append(f"{row['role']:<12} {step:<6} 调用 {row['calls']:>2} 次  输入 {row['input_tokens']:>7}"
+                     f"（缓存 {row['cache_read']:>6}）  输出 {row['output_tokens']:>6}  首token {ttft:>7}"
+                     f"  耗时 {row['duration_ms'] / 1000:.2f}s")
+    return lines
@@ -3,12 +3,18 @@
 """
 #必须使用公网链接，否则无法转录
 import json
+import re
+import codecs
+import weakref
+from difflib import SequenceMatcher
 from http import HTTPStatus
-import requests
-from typing import List
-import dashscope
+import httpx
+from typing import List, Optional, Tuple
 import asyncio
-from dashscope.audio.asr import Transcription
+from asr_engine import get_batching_submitter
+from transcript_cache import get_transcript_cache, canonical_key, KIND_RAW, KIND_CORRECTED
+from limiters import get_limiter, add_limiter_arguments, configure_from_args
+from model_configs import get_model_limiter
 import os
 from os import getenv
 from dotenv import load_dotenv
@@ -18,52 +24,155 @@ os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
 os.environ["LANGSMITH_PROJECT"] = "imitate_v2t"
 from  typing import Dict
 from langsmith import traceable
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from link_parser.douyin_parse import parse_share_url
-from link_parser.xhs_extract_links import extract_xhs_links
-from link_parser.youtube_url_extract_single_url import youtube_extract_main
-import pandas as pd
 from datetime import datetime
-from link_parser.BiliLink_main.quick_convert import quick_convert
+# 各平台解析器、pandas、dashscope SDK 体积较大，统一在首次使用时再导入，纯文本流程无需加载
 load_dotenv()
-dashscope.api_key = getenv("DASH_SCOPE_API_KEY")
-sem = asyncio.Semaphore(5)
+_http_clients = weakref.WeakKeyDictionary()
+try:
+    import h2  # noqa: F401  安装了 h2 才能启用 HTTP/2
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """当前事件循环共享的 HTTP 连接池（keep-alive、HTTP/2、有界连接数）。"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=httpx.Timeout(60, connect=10),
+            limits=httpx.Limits(
+                max_connections=int(getenv("V2T_HTTP_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(getenv("V2T_HTTP_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=30,
+            ),
+            follow_redirects=True,
+        )
+        _http_clients[loop] = client
+    return client
+
+
+async def aclose_http_client():
+    """关闭当前事件循环的共享连接池（在事件循环结束前调用）。"""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class _TranscriptJsonScanner:
+    """增量扫描转录结果 JSON，只取出顶层 file_url 与 transcripts[0].text。
+
+    转录 JSON 中体积最大的是逐句的 sentences 数组，而 text 位于其之前，
+    拿到两个字段后即可停止读取，无需缓冲整份多小时的转录结果。
+    """
+    _STRUCT = re.compile(r'["{}\[\]:,]')
+    _STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+    def __init__(self):
+        self.buf = ""
+        self.stack = []          # 每层容器: [类型 "{" 或 "[", 打开该容器的键, 是否为 transcripts[0]]
+        self.expect_key = False
+        self.last_key = None
+        self.file_url = None
+        self.text = None
+        self._seen_transcript = False
+
+    @property
+    def done(self) -> bool:
+        return self.file_url is not None and self.text is not None
+
+    def feed(self, chunk: str) -> bool:
+        buf = self.buf + chunk
+        pos = 0
+        while not self.done:
+            m = self._STRUCT.search(buf, pos)
+            if m is None:
+                pos = len(buf)
+                break
+            ch, i = m.group(), m.start()
+            if ch == '"':
+                sm = self._STRING.match(buf, i)
+                if sm is None:       # 字符串被分块截断，等待后续数据
+                    pos = i
+                    break
+                pos = sm.end()
+                if self.stack and self.stack[-1][0] == "{" and self.expect_key:
+                    self.last_key = json.loads(sm.group())
+                    self.expect_key = False
+                else:
+                    self._on_string_value(sm.group())
+                continue
+            pos = i + 1
+            if ch in "{[":
+                key = self.last_key if self.stack and self.stack[-1][0] == "{" else None
+                is_target = (ch == "{" and not self._seen_transcript and len(self.stack) == 2
+                             and self.stack[-1][0] == "[" and self.stack[-1][1] == "transcripts")
+                self._seen_transcript = self._seen_transcript or is_target
+                self.stack.append([ch, key, is_target])
+                self.expect_key = ch == "{"
+                self.last_key = None
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                self.expect_key = False
+            elif ch == ",":
+                self.expect_key = bool(self.stack) and self.stack[-1][0] == "{"
+        self.buf = buf[pos:]
+        return self.done
+
+    def _on_string_value(self, token: str):
+        depth = len(self.stack)
+        if depth == 1 and self.last_key == "file_url":
+            self.file_url = json.loads(token)
+        elif depth == 3 and self.stack[-1][2] and self.last_key == "text":
+            self.text = json.loads(token)
+
+
+# 解析阶段得到的媒体时长（秒）：直链 → 时长，转录时传给轮询调度器估算首轮等待
+# 只在进程内记录；命中解析缓存时通常也命中转录缓存，不需要时长
+_media_durations: Dict[str, float] = {}
+
+
+def _remember_duration(direct_url: str, duration) -> None:
+    if direct_url and duration:
+        _media_durations[direct_url] = float(duration)
+
 
 @traceable(name="v2t(1)bilibili解析链接")
-async def transform_bilibili_url(url:str)->str:
-    bilibili_url = await quick_convert(url)
-    return bilibili_url
-#使用dashscope的paraformer-v2模型进行转录，返回包含所有子任务的结果列表，包含源文件url和转录文字结果url
+async def transform_bilibili_url(url:str)->Optional[Dict]:
+    """解析B站链接，返回解析器结果（public_url 为直链，url 为短链展开后的视频页地址），失败返回 None"""
+    from link_parser.BiliLink_main import function
+    try:
+        result = await function.get_video_public_url(url)
+    except Exception:
+        return None
+    if not (result and result.get('public_url')):
+        return None
+    _remember_duration(result['public_url'], result.get('duration'))
+    return result
+#使用dashscope的paraformer-v2模型进行转录，返回该链接对应的子任务结果列表，包含源文件url和转录文字结果url
 @traceable(name="v2t(2)转录文字")
-async def get_one_text_url(url:str)->list:
+async def get_one_text_url(url:str, duration:Optional[float]=None)->list:
     task_id = f"task_{id(url)}"  # 为每个任务生成唯一ID
     print(f"[{task_id}] 开始处理视频: {url[:50]}...", flush=True)
-    
-    # ✅ 修复：每个任务独立使用信号量，实现真正的并发控制
-    async with sem:  # 控制单个任务的并发数
-        print(f"[{task_id}] 获得信号量，开始API调用", flush=True)
-        transcribe_response = Transcription.async_call(
-            model='paraformer-v2',
-            file_urls=[url],
-            language_hints=['zh', 'en']  # "language_hints"只支持paraformer-v2模型
-        )
-
-        while True:
-            if transcribe_response.output.task_status == 'SUCCEEDED' or transcribe_response.output.task_status == 'FAILED':
-                break
-            transcribe_response = Transcription.fetch(task=transcribe_response.output.task_id)
-            print(f"[{task_id}] 转录任务状态: {transcribe_response.output.task_status}", flush=True)
-            await asyncio.sleep(0.5)  # 添加短暂等待，避免过度轮询
-
-        if transcribe_response.status_code == HTTPStatus.OK:
-            results = transcribe_response.output["results"]
-            print(f'[{task_id}] transcription done!')
-            return results        #返回包含所有子任务的结果列表，包含源文件url和转录文字结果url
-        else:
-            print(f"[{task_id}] 转录任务失败: {transcribe_response.output}", flush=True)
-            return None
+    # 命中缓存的原始转录文本时直接返回，跳过 ASR
+    cache = get_transcript_cache()
+    cached_text = await asyncio.to_thread(lambda: cache.get_text(cache.key_for_url(url), KIND_RAW))
+    if cached_text is not None:
+        print(f"[{task_id}] 命中转录缓存，跳过ASR", flush=True)
+        return [{"file_url": url, "subtask_status": "SUCCEEDED", "transcription_url": "", "text": cached_text}]
+    # 并发到达的链接会被合并为一个多文件任务提交；信号量限制同时在途的任务数
+    # duration(秒)用于自适应轮询间隔
+    results = await get_batching_submitter(job_limiter=get_limiter("asr")).transcribe(url, duration=duration)
+    if results:
+        print(f'[{task_id}] transcription done!')
+        return results        #返回该链接对应的子任务结果列表，包含源文件url和转录文字结果url
+    print(f"[{task_id}] 转录任务失败或无结果", flush=True)
+    return None
 
 #提取转录文字结果JSON url中的文字 - 修复为真正的异步并行
 
@@ -90,44 +199,146 @@ async def get_text_url(url_list:list)->list:
 #提取转录文字结果url中的文字
 @traceable(name="v2t(3)提取转录JSON格式结果url中的文字")
 async def extract_text(transcrip_url)->Dict:
-    timeout = 60
     try:
-        response = requests.get(transcrip_url, timeout=timeout)
-        response.raise_for_status()  # 如果不是 200，会抛异常
-        data =response.json()
-        file_url=data["file_url"]
-        text = data["transcripts"][0]["text"]
+        # 共享连接池流式下载，边读边扫描，取到 file_url 与 text 后即停止读取
+        scanner = _TranscriptJsonScanner()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        async with _get_http_client().stream("GET", transcrip_url) as response:
+            response.raise_for_status()  # 如果不是 200，会抛异常
+            async for chunk in response.aiter_bytes():
+                if scanner.feed(decoder.decode(chunk)):
+                    break
+            else:
+                scanner.feed(decoder.decode(b"", final=True))
+        if not scanner.done:
+            raise ValueError(f"转录结果中缺少 file_url 或 transcripts[0].text: {transcrip_url}")
+        file_url=scanner.file_url
+        text = scanner.text
         result={"file_url":file_url,"text":text}
+        cache = get_transcript_cache()
+        await asyncio.to_thread(lambda: cache.put_text(cache.key_for_url(file_url), KIND_RAW, text))
         print(f"提取转录文字结果url中的文字：\n{text}")
         return result         #返回包含源文件url和转录文字结果的字典
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"请求出错: {e}")
         return None 
 
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]*[。！？!?；;\n]+|[^。！？!?；;\n]+$")
+
+
+def _split_transcript(text:str, window_chars:int, overlap_chars:int)->List[tuple]:
+    """按句子边界把长转录切分为相互重叠的窗口，每个窗口开头重复上一窗口末尾不超过 overlap_chars 的句子。
+
+    返回 [(窗口文本, 与上一窗口重叠的字符数), ...]
+    """
+    sentences = []
+    for sentence in _SENTENCE_PATTERN.findall(text):
+        # 超长且无标点的句子按窗口长度硬切
+        while len(sentence) > window_chars:
+            sentences.append(sentence[:window_chars])
+            sentence = sentence[window_chars:]
+        if sentence:
+            sentences.append(sentence)
+    windows = []
+    current, current_len, current_overlap = [], 0, 0
+    for sentence in sentences:
+        if current and current_len + len(sentence) > window_chars:
+            windows.append(("".join(current), current_overlap))
+            overlap, overlap_len = [], 0
+            for prev in reversed(current):
+                if overlap_len + len(prev) > overlap_chars:
+                    break
+                overlap.insert(0, prev)
+                overlap_len += len(prev)
+            current, current_len, current_overlap = overlap, overlap_len, overlap_len
+        current.append(sentence)
+        current_len += len(sentence)
+    if current:
+        windows.append(("".join(current), current_overlap))
+    return windows
+
+
+def _stitch_windows(parts:List[str], overlaps:List[int])->str:
+    """拼接各窗口的纠错结果：在相邻窗口的重叠区域内找最长公共片段，以此为缝合点去掉重复部分。"""
+    merged = parts[0] if parts else ""
+    for part, overlap in zip(parts[1:], overlaps[1:]):
+        if overlap <= 0:
+            merged += part
+            continue
+        tail = merged[-overlap * 2:]
+        head = part[:overlap * 2]
+        min_match = max(4, overlap // 10)
+        m = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+        if m.size >= min_match:
+            merged = merged[:len(merged) - len(tail) + m.a + m.size] + part[m.b + m.size:]
+        else:
+            merged += part
+    return merged
+
+
+_correct_prompt = ChatPromptTemplate.from_messages([
+    ("system", """The following is a speech to text transcription of a video. 
+    The text is primarily in Chinese, although it may also contain English. 
+    Correct the transcription of any errors. Make sure to output the FULL transcript. 
+    Output just the corrected transcript in your response and nothing else."""),
+    ("user", """the following is the transcription of a video:\n
+    -------------------------------------------------------------------
+    {input}
+    -------------------------------------------------------------------"""),
+])
+
+
+async def _correct_chunk(llm, text:str, task_id:str)->str:
+    limiter = get_model_limiter("v2t")
+    # 纠错输出与输入等长，按 输入+输出 ≈ 2 倍字数 预估 token 消耗
+    async with limiter.slot(tokens=2 * len(text)):  # 控制LLM调用的并发数与速率
+        print(f"[{task_id}] 获得LLM配额，开始纠错，长度: {len(text)}，排队中: {limiter.waiting}", flush=True)
+        correct_chain = _correct_prompt | llm | StrOutputParser()
+        return await correct_chain.ainvoke({"input": text})
+
+
 @traceable(name="v2t(4)文本纠错")
-async def correct_text(llm, text_dict:Dict):
+async def correct_text(llm, text_dict:Dict, window_chars:Optional[int]=None, overlap_chars:Optional[int]=None):
+    """全文纠错；超过 window_chars 的长转录按句子切成重叠窗口并行纠错，再去重缝合。
+
+    窗口长度与重叠长度默认读取 V2T_CORRECT_WINDOW_CHARS（4000）与 V2T_CORRECT_OVERLAP_CHARS（200）。
+    单个窗口失败时该窗口保留原文，其余窗口的纠错结果不受影响。
+    """
     text = text_dict["text"]
     task_id = f"llm_{id(text)}"  # 为每个LLM任务生成唯一ID
+    window_chars = window_chars or int(getenv("V2T_CORRECT_WINDOW_CHARS", "4000"))
+    overlap_chars = overlap_chars if overlap_chars is not None else int(getenv("V2T_CORRECT_OVERLAP_CHARS", "200"))
     print(f"[{task_id}] 开始文本纠错，文本长度: {len(text)}", flush=True)
+    cache = get_transcript_cache()
+    cache_key = await asyncio.to_thread(cache.key_for_url, text_dict["file_url"]) if text_dict.get("file_url") else None
+    cached_text = await asyncio.to_thread(cache.get_text, cache_key, KIND_CORRECTED) if cache_key else None
+    if cached_text is not None:
+        print(f"[{task_id}] 命中纠错缓存，跳过LLM纠错", flush=True)
+        text_dict.update({"text":cached_text})
+        return text_dict
     try:
-        async with sem:  # 控制LLM调用的并发数
-            print(f"[{task_id}] 获得LLM信号量，开始纠错", flush=True)
-            correct_prompt = ChatPromptTemplate.from_messages([
-                ("system", """The following is a speech to text transcription of a video. 
-                The text is primarily in Chinese, although it may also contain English. 
-                Correct the transcription of any errors. Make sure to output the FULL transcript. 
-                Output just the corrected transcript in your response and nothing else."""),
-                ("user", """the following is the transcription of a video:\n
-                -------------------------------------------------------------------
-                {input}
-                -------------------------------------------------------------------"""),
-            ])
-            correct_chain = correct_prompt | llm | StrOutputParser()
-            corrected_text = await correct_chain.ainvoke({"input": text})
-            print(f"[{task_id}] 文本纠错完成\n原文本长度：{len(text)}\n纠错后文本长度：{len(corrected_text)}", flush=True)
-            print(corrected_text)
-            text_dict.update({"text":corrected_text})
-            return text_dict
+        failed_windows = 0
+        if len(text) > window_chars:
+            windows = _split_transcript(text, window_chars, overlap_chars)
+            print(f"[{task_id}] 长文本切分为{len(windows)}个窗口并行纠错", flush=True)
+            results = await asyncio.gather(*(_correct_chunk(llm, w, f"{task_id}_{i+1}") for i, (w, _) in enumerate(windows)), return_exceptions=True)
+            parts = []
+            for i, ((window, _), result) in enumerate(zip(windows, results)):
+                if isinstance(result, Exception):
+                    failed_windows += 1
+                    print(f"[{task_id}] 第{i+1}个窗口纠错失败，保留该窗口原文: {result}", flush=True)
+                    parts.append(window)
+                else:
+                    parts.append(result)
+            corrected_text = _stitch_windows(parts, [overlap for _, overlap in windows])
+        else:
+            corrected_text = await _correct_chunk(llm, text, task_id)
+        print(f"[{task_id}] 文本纠错完成\n原文本长度：{len(text)}\n纠错后文本长度：{len(corrected_text)}", flush=True)
+        print(corrected_text)
+        if cache_key and not failed_windows:
+            await asyncio.to_thread(cache.put_text, cache_key, KIND_CORRECTED, corrected_text)
+        text_dict.update({"text":corrected_text})
+        return text_dict
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -137,93 +348,77 @@ async def correct_text(llm, text_dict:Dict):
 
 
 async def v2t(llm,url_list:list)->List:
+    """对已是公网直链的列表执行 转录 → 提取 → 纠错 流水线，返回纠错后的文本列表（按完成顺序）。"""
     print("开始转录")
-    results_list = await get_text_url(url_list)
-    print(f"results_list：{results_list}")
-    print("提取转录文字结果url中的文字")
-    
-    # 过滤出成功的结果，并确保有transcription_url字段
-    valid_results = []
-    fail_list = []
-    for result in results_list:
-        if result["subtask_status"] == "SUCCEEDED" and result["transcription_url"] !="":
-            valid_results.append(result)
-        elif result["subtask_status"] == "FAILED":
-            fail_list.append(result)
-            print(f"跳过失败或无效的结果: {result}")
-    
-    if not valid_results:
-        print("没有有效的转录结果")
-        return []
-    
-    # 提取文本
-    tasks = [extract_text(result["transcription_url"]) for result in valid_results]
-    second_results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # 过滤出成功的文本提取结果
-    second_result_list = []
-    for _, result in enumerate(second_results):
-        if isinstance(result, Exception):
-            print(f"文本提取失败: {result}")
-        elif result is not None:
-            second_result_list.append(result)
-    
-    if not second_result_list:
-        print("没有成功提取的文本")
-        return []
-    
-    # 文本纠错
-    tasks = [correct_text(llm, result) for result in second_result_list]
-    final_results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    final_result_list = []
-    for result in final_results:
-        if isinstance(result, Exception):
-            print(f"文本纠错失败: {result}")
-        elif result is not None:
-            final_result_list.append(result)
-    if len(fail_list) > 0:
-        print(f"失败链接：{fail_list}")
-    return final_result_list
+    return [result async for result in v2t_stream(llm, url_list, resolve=False)]
 
 async def _resolve_one_url(url: str) -> List[str]:
-    """将原始链接解析成可直接转录的公网直链（并发友好，不阻塞事件循环）。"""
+    """将原始链接解析成可直接转录的公网直链，优先使用按“平台+视频ID”缓存的解析结果。
+
+    短链离线无法识别平台ID，先查别名表；首次解析后把短链登记为展开后页面地址的缓存键的别名。
+    缓存读写是同步 SQLite 调用，放入线程池执行，不阻塞事件循环。
+    """
+    cache = get_transcript_cache()
+    key = await asyncio.to_thread(cache.key_for_url, url)
+    cached_urls = await asyncio.to_thread(cache.get_resolved, key)
+    if cached_urls:
+        print(f"命中链接解析缓存: {key}")
+        return cached_urls
+    direct_urls, page_url = await _resolve_platform_url(url)
+    if page_url and canonical_key(page_url) != key:
+        key = canonical_key(page_url)
+        await asyncio.to_thread(cache.put_alias, url, key)
+    await asyncio.to_thread(cache.put_resolved, key, direct_urls)
+    return direct_urls
+
+
+async def _resolve_platform_url(url: str) -> Tuple[List[str], Optional[str]]:
+    """将原始链接解析成可直接转录的公网直链（并发友好，不阻塞事件循环）。
+
+    返回 (直链列表, 页面地址)：页面地址为解析器展开短链后得到的作品页，可规范化为缓存键，未知时为 None。
+    """
     try:
         # 已经是公网直链，直接返回
         if url.startswith("https://finder.video.qq.com/") or url.startswith("http://wxapp.tc.qq.com/") or url.startswith("https://ppwtoss01.oss") or url.startswith("https://v5-small.douyinvod.com/"):
-            return [url]
+            return [url], None
 
         # B站：异步转换
         if ("https://www.bilibili.com/video/" in url) or ("https://b23.tv/" in url) or ("https://bili2233.cn/" in url):
-            bilibili_url = await transform_bilibili_url(url)
-            return [bilibili_url] if bilibili_url else []
+            bilibili = await transform_bilibili_url(url)
+            return ([bilibili["public_url"]], bilibili.get("url")) if bilibili else ([], None)
 
         # 抖音：同步解析，放入线程池避免阻塞
         if "douyin.com" in url:
-            douyin_url = await asyncio.to_thread(parse_share_url, url)
-            return [douyin_url] if douyin_url else []
+            from link_parser.douyin_parse import parse_share_url_with_meta
+            douyin = await asyncio.to_thread(parse_share_url_with_meta, url)
+            return ([douyin["direct_url"]], douyin.get("page_url")) if douyin.get("direct_url") else ([], None)
 
         # 小红书：同步解析，放入线程池避免阻塞
         if "xiaohongshu.com" in url or "xhslink.com" in url:
+            from link_parser.xhs_extract_links import extract_xhs_links
             xhs = await asyncio.to_thread(extract_xhs_links, url)
             if xhs and xhs.get("ok"):
-                return list(xhs.get("download_urls") or [])
+                page_url = f"https://www.xiaohongshu.com/explore/{xhs['note_id']}" if xhs.get("note_id") else None
+                return list(xhs.get("download_urls") or []), page_url
             print(f"小红书链接解析失败: {xhs}")
-            return []
+            return [], None
 
         # YouTube：同步解析，放入线程池避免阻塞
         if "youtube.com" in url or "youtu.be" in url:
-            yt = await asyncio.to_thread(youtube_extract_main, url)
+            from link_parser.youtube_url_extract_single_url import get_youtube_urls_with_fallbacks
+            found = await asyncio.to_thread(get_youtube_urls_with_fallbacks, url)
+            info, yt = found or (None, None)
             if yt :
-                return [yt]
+                _remember_duration(yt, info.get("duration"))
+                return [yt], None
             print(f"Youtube链接解析失败: {yt}")
-            return []
+            return [], None
 
         # 其他：直接返回原URL
-        return [url]
+        return [url], None
     except Exception as e:
         print(f"解析链接出错: {url} -> {e}")
-        return []
+        return [], None
 
 
 async def _resolve_all_urls(url_list: List[str]) -> List[str]:
@@ -240,22 +435,100 @@ async def _resolve_all_urls(url_list: List[str]) -> List[str]:
     return direct_urls
 
 
+# 各阶段默认并发 worker 数；转录阶段需不小于攒批大小，才能让并发到达的直链合并为一个任务
+STAGE_WORKERS = {"resolve": 8, "transcribe": 20, "extract": 10, "correct": 5}
+_STAGE_DONE = object()
+
+
+async def _run_stage(name:str, handler, in_queue:asyncio.Queue, out_queue:asyncio.Queue, workers:int):
+    """流水线的一个阶段：workers 个协程从 in_queue 取数据，handler(异步生成器)产出的结果放入 out_queue。"""
+    async def worker():
+        while True:
+            item = await in_queue.get()
+            if item is _STAGE_DONE:
+                await in_queue.put(_STAGE_DONE)  # 让同阶段其余 worker 也能退出
+                return
+            try:
+                async for output in handler(item):
+                    await out_queue.put(output)
+            except Exception as e:
+                print(f"[{name}] 处理失败: {e}", flush=True)
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    await out_queue.put(_STAGE_DONE)
+
+
+async def v2t_stream(llm, url_list:list, resolve:bool=True, stage_workers:Optional[Dict[str,int]]=None):
+    """流式流水线：解析 → 转录 → 提取 → 纠错，阶段之间以有界队列衔接。
+
+    每条数据在上一阶段完成后立即进入下一阶段，单个慢视频不会阻塞其他视频的纠错；
+    以异步迭代器的形式按完成顺序产出纠错后的 {"file_url","text"}。
+    resolve=False 时 url_list 视为已解析好的公网直链，跳过解析阶段。
+    """
+    workers = {**STAGE_WORKERS, **(stage_workers or {})}
+    fail_list = []
+
+    async def resolve_handler(url):
+        for direct_url in await _resolve_one_url(url):
+            if isinstance(direct_url, str) and direct_url:
+                yield direct_url
+
+    async def transcribe_handler(direct_url):
+        for result in await get_one_text_url(direct_url, duration=_media_durations.get(direct_url)) or []:
+            if result["subtask_status"] == "SUCCEEDED" and result.get("text") is not None:
+                yield {"file_url":result["file_url"],"text":result["text"]}   # 命中缓存，已带有text
+            elif result["subtask_status"] == "SUCCEEDED" and result["transcription_url"] !="":
+                yield result
+            elif result["subtask_status"] == "FAILED":
+                fail_list.append(result)
+                print(f"跳过失败或无效的结果: {result}")
+
+    async def extract_handler(item):
+        if "transcription_url" not in item:
+            yield item
+            return
+        result = await extract_text(item["transcription_url"])
+        if result is not None:
+            yield result
+
+    async def correct_handler(item):
+        yield await correct_text(llm, item)
+
+    stages = [("transcribe", transcribe_handler), ("extract", extract_handler), ("correct", correct_handler)]
+    if resolve:
+        stages.insert(0, ("resolve", resolve_handler))
+    queues = [asyncio.Queue(maxsize=2 * workers[name]) for name, _ in stages] + [asyncio.Queue()]
+
+    async def feed():
+        for url in url_list:
+            await queues[0].put(url)
+        await queues[0].put(_STAGE_DONE)
+
+    tasks = [asyncio.create_task(feed())]
+    for i, (name, handler) in enumerate(stages):
+        tasks.append(asyncio.create_task(_run_stage(name, handler, queues[i], queues[i + 1], workers[name])))
+    try:
+        while True:
+            result = await queues[-1].get()
+            if result is _STAGE_DONE:
+                break
+            if result is not None:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if fail_list:
+            print(f"失败链接：{fail_list}")
+
+
 async def main_v2t_no_summary(llm,url_list:list):
-    # 1) 并发解析每个链接（判断是否公网/需要解析），确保不阻塞
-    direct_url_list = await _resolve_all_urls(url_list)
-
-    # 2) 并发进行转录、提取文本与纠错（各子任务内部已使用并发控制）
-    if direct_url_list:
-        direct_final_result_list = await v2t(llm, direct_url_list)
-        print(f"公网链接转录结果：{len(direct_final_result_list)}个成功")
-    else:
-        direct_final_result_list = []
-
-    # 3) 返回最终结果
-    final_result_list = direct_final_result_list
+    # 解析、转录、提取文本与纠错以流水线方式重叠执行，每条结果完成即收集
+    final_result_list = [result async for result in v2t_stream(llm, url_list)]
+    print(f"公网链接转录结果：{len(final_result_list)}个成功")
     return final_result_list
 
 def save_to_local(final_result_list:list):
+    import pandas as pd
     current_path = os.path.dirname(os.path.abspath(__file__))
     output_path = os.path.join(current_path,"result","v2t_result")   # 视频链接转文字结果保存文件夹路径
     if not os.path.exists(output_path):
@@ -270,6 +543,10 @@ def save_to_local(final_result_list:list):
     df.to_excel(os.path.join(output_path,f"v2t_result_{time_now}.xlsx"), index=False)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="视频链接转文字并纠错")
+    configure_from_args(add_limiter_arguments(parser).parse_args())
+    from langchain_openai import ChatOpenAI
     correct_llm = ChatOpenAI(
     model="google/gemini-2.5-flash",
     max_tokens=64000,
@@ -286,7 +563,12 @@ if __name__ == "__main__":
         url_list.append(url)
     # url_list = ["https://www.xiaohongshu.com/discovery/item/6895a4e3000000002501a26e?source=webshare&xhsshare=pc_web&xsec_token=ABgYkBkMvPzSYLMTYRRV2fwV5g3icoj6RmC3txDOTi70s=&xsec_source=pc_share",
     # "https://www.xiaohongshu.com/explore/684980030000000021007bb5?app_platform=ios&app_version=8.94.2&share_from_user_hidden=true&xsec_source=app_share&type=video&xsec_token=CBEjRSsYktwgn-4FmYmAXWlQcs_XHeDkZO0anJl1vGyEI=&author_share=1&xhsshare=WeixinSession&shareRedId=NztHODZISk08PkdFPz0zN0w5OTlKPjhK&apptime=1754356150&share_id=1dba6c6c1ec44a82a0b0217e5c8ff21c"]
-    final_result_list = asyncio.run(main_v2t_no_summary(correct_llm,url_list))
+    async def _run():
+        try:
+            return await main_v2t_no_summary(correct_llm,url_list)
+        finally:
+            await aclose_http_client()
+    final_result_list = asyncio.run(_run())
     save_to_local(final_result_list)
 
 